@@ -1,21 +1,33 @@
 import os
+import threading
 from dotenv import load_dotenv
 
-from src.new_embeddings import doEmbeddings
+from src.jobs import get_ingestion_jobs
+from src.utils.save_file import saveFile
 
 from src.ticket_rag.analyze_rules import getDiscordRules
 from src.ticket_rag.answer_to_user import llmJsonParser, answerToUser
-from src.search_from_internet.search import searchToUser
+from src.search_from_internet.search import searchToUser, streamToUser
 
 load_dotenv()
 
-from flask import Flask, request, jsonify
-from src.embed import allowedPdfReaders, embed
-from src.get_vector_db import get_vector_db, allowedModels, embeddingSizes, allowedEmbeddingsModels
-
-import nltk
-nltk.download('punkt_tab')
-nltk.download('averaged_perceptron_tagger_eng')
+import json
+from flask import Flask, Response, request, jsonify, stream_with_context
+from werkzeug.utils import secure_filename
+from src.embed import allowedPdfReaders, allowed_file, save_file, embed_file
+from src.get_vector_db import get_vector_db, embeddingSizes
+from src.utils.llm import LLMProvider
+from src.utils.model_catalog import model_catalog
+from src.utils.lazy import warmup
+from src.utils.advanced_chroma import chroma_registry, model_embedding
+from src.utils.embedding_cache import get_embedding_cache
+from src.utils.llm_cache import get_llm_cache
+from src.utils.bm25_index import get_bm25_index
+from src.utils.embedding_policy import get_embedding_failure_policy, start_repair_worker
+from src.config import MODEL_EMBEDDINGS, SERVE_MODE, SERVE_SYNC_WAIT, SERVE_MAX_PENDING, SERVE_DEBUG, WARMUP
+from src.task_queue import task_queue, QueueFullError
+from src.utils.llm_scheduler import llm_scheduler, llm_priority, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from src.ingestion_pipeline import get_ingestion_progress
 
 import pytesseract
 pytesseract.pytesseract.tesseract_cmd = os.getenv('TESSERACT_PATH', 'C:\\Program Files\\Tesseract-OCR')
@@ -26,10 +38,74 @@ os.makedirs(TEMP_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
 
+_workers_started = False
+_workers_lock = threading.Lock()
+
+def start_background_workers():
+    """
+    Raz na proces uruchamia pracę w tle: odświeżanie katalogu modeli, naprawę wektorów zastępczych,
+    wznawianie zadań ingestii i (przy WARMUP) warmup. Wywoływane przed pierwszym zapytaniem, więc działa
+    tak samo pod serwerem WSGI, przy `flask run` i `python app.py`. Dane NLTK są sprawdzane przy
+    pierwszym wczytaniu dokumentu.
+    """
+    global _workers_started
+    if _workers_started:
+        return
+    with _workers_lock:
+        if _workers_started:
+            return
+        _workers_started = True
+        model_catalog.start_refresher()
+        if WARMUP:
+            print(f"Warmup: {warmup()}")
+        start_repair_worker(MODEL_EMBEDDINGS, model_embedding, chroma_registry.find_collection)
+        get_ingestion_jobs().start()
+
+@app.before_request
+def ensure_background_workers():
+    start_background_workers()
+
+def serve(name, work, *args, priority = PRIORITY_INTERACTIVE):
+    """
+    Wykonuje pracę trasy (funkcja zwracająca (payload, status)) z danym priorytetem zapytań do LLM.
+    W trybie SERVE_MODE='queue' praca trafia do ograniczonej kolejki: jeśli skończy się w ciągu
+    SERVE_SYNC_WAIT sekund, odpowiedź jest zwykła, w przeciwnym razie 202 z adresem /tasks/<id>;
+    przy pełnej kolejce 429.
+    """
+    if SERVE_MODE != 'queue':
+        with llm_priority(priority):
+            payload, status = work(*args)
+        return jsonify(payload), status
+
+    try:
+        with llm_priority(priority):
+            task = task_queue.submit(name, work, *args)
+    except QueueFullError:
+        return jsonify({'error': 'Server is busy, try again later'}), 429, {'Retry-After': '10'}
+
+    if task.wait(SERVE_SYNC_WAIT) and task.status == 'done':
+        payload, status = task.result
+        return jsonify(payload), status
+    if task.status == 'failed':
+        return jsonify({'error': task.error}), 500
+
+    return jsonify({'task_id': task.id, 'status_url': f'/tasks/{task.id}'}), 202
+
+@app.route('/tasks/<task_id>', methods=['GET'])
+def get_task(task_id):
+    task = task_queue.get(task_id)
+    if task is None:
+        return jsonify({"error": "Task not found"}), 404
+
+    if task.status == 'done':
+        payload, status = task.result
+        return jsonify({'task_id': task.id, 'status': task.status, 'status_code': status, 'result': payload}), 200
+    return jsonify(task.to_dict()), 200
+
 @app.route('/summarize_and_embed', methods=['GET'])
 def get_summarize_and_embed():
     return jsonify({
-        'embeddings': allowedEmbeddingsModels,
+        'embeddings': LLMProvider.available_models(),
         'description': 'Endpoint do summaryzacji i embedowania dokumentów do lokalnej bazy danych'
     })
 
@@ -44,6 +120,7 @@ def post_summarize_and_embed():
     data = request.form
 
     model = data['model']
+    allowedEmbeddingsModels = LLMProvider.available_models()
     if model not in allowedEmbeddingsModels and (model + ':latest') not in allowedEmbeddingsModels:
         return jsonify({"error": "No embedding model", "allowed": allowedEmbeddingsModels}), 400
 
@@ -53,20 +130,32 @@ def post_summarize_and_embed():
 
     namespace:str = os.getenv('NAMESPACE', 'user_files')
 
-    embedded = doEmbeddings(file, model, pdfReader, namespace)
-    #print(embedded)
+    if SERVE_MODE == 'queue' and get_ingestion_jobs().pending() >= SERVE_MAX_PENDING:
+        return jsonify({'error': 'Too many files waiting for embedding, try again later'}), 429, {'Retry-After': '60'}
 
-    if isinstance(embedded, str):
-        return jsonify({"error": embedded}), 400
-    if embedded:
-        return jsonify({"message": "File embedded successfully"}), 200
+    # Plik jest przetwarzany w tle; postęp pod /jobs/<job_id>
+    file_path = saveFile(file, [model, namespace])
+    job_id = get_ingestion_jobs().submit(file_path, model, pdfReader, namespace, secure_filename(file.filename))
+
+    return jsonify({"message": "File queued for embedding", "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
 
-    return jsonify({"error": f"File embedded unsuccessfully or nothing returned\n Embedded: {embedded}"}), 400
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_ingestion_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    if not get_ingestion_jobs().retry(job_id):
+        return jsonify({"error": "Job not found or not failed"}), 404
+    return jsonify({"message": "Job queued for retry", "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
 
 @app.route('/embed', methods=['GET'])
 def get__route_embed():
     return jsonify({
-        'embeddings': allowedEmbeddingsModels,
+        'embeddings': LLMProvider.available_models(),
         'sizes': embeddingSizes,
     })
 
@@ -81,6 +170,7 @@ def post__route_embed():
     data = request.form
 
     model = data['model']
+    allowedEmbeddingsModels = LLMProvider.available_models()
     if model not in allowedEmbeddingsModels and (model + ':latest') not in allowedEmbeddingsModels:
         return jsonify({"error": "No embedding model", "allowed": allowedEmbeddingsModels}), 400
 
@@ -97,15 +187,24 @@ def post__route_embed():
         query = data.get('query')
 
     print(file, model, pdfReader, namespace)
-    embedded = embed(file, model, pdfReader, namespace, query)
+    if not allowed_file(file.filename):
+        return jsonify({"error": "File embedded unsuccessfully"}), 400
+
+    # Plik musi być zapisany w trakcie żądania - potem strumień uploadu jest zamknięty
+    file_path = save_file(file, model, pdfReader, namespace)
+    return serve('embed', embedFile, file_path, secure_filename(file.filename), model, pdfReader, namespace,
+                 priority = PRIORITY_BACKGROUND)
+
+def embedFile(file_path, source_file, model, pdfReader, namespace):
+    embedded = embed_file(file_path, source_file, model, pdfReader, namespace)
     print(embedded)
 
     if isinstance(embedded, str):
-        return jsonify({"error": embedded}), 400
+        return {"error": embedded}, 400
     if embedded:
-        return jsonify({"message": "File embedded successfully"}), 200
+        return {"message": "File embedded successfully"}, 200
 
-    return jsonify({"error": "File embedded unsuccessfully"}), 400
+    return {"error": "File embedded unsuccessfully"}, 400
 
 @app.route('/chat', methods = ['POST'])
 def routeChat():
@@ -120,11 +219,47 @@ def routeChat():
     
     max_iterations:int = data['max_iterations'] if data['max_iterations'] is not None else 10
 
+    return serve('chat', chat, query, max_iterations)
+
+def chat(query, max_iterations):
     response = searchToUser(query, max_iterations)
 
     if response:
-        return jsonify({'message': response}), 200
-    return jsonify({'message': 'No search from internet'}), 400
+        return {'message': response}, 200
+    return {'message': 'No search from internet'}, 400
+
+@app.route('/chat/stream', methods = ['POST'])
+def routeChatStream():
+    """
+    Strumieniowa wersja /chat: Server-Sent Events (domyślnie) albo linie JSON (format=jsonl).
+    Zdarzenia: thought, tool_start, tool_end, token (fragment odpowiedzi), answer, error.
+    """
+    try:
+        data = request.get_json()
+    except:
+        data = request.form
+
+    query:str = data['query']
+    if query == "":
+        return jsonify({'message': 'No query specified'}), 400
+
+    max_iterations:int = data.get('max_iterations') or 10
+    as_jsonl = (data.get('format') or request.args.get('format')) == 'jsonl'
+
+    def events():
+        with llm_priority(PRIORITY_INTERACTIVE):
+            for event in streamToUser(query, max_iterations):
+                payload = json.dumps(event, ensure_ascii=False, default=str)
+                if as_jsonl:
+                    yield payload + "\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {payload}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype = 'application/x-ndjson' if as_jsonl else 'text/event-stream',
+        headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/report_user', methods = ['POST'])
 def routeReportUser():
@@ -136,7 +271,8 @@ def routeReportUser():
     model = data['model']
     if model is None:
         return jsonify({'error': 'No model specified'}), 400
-    elif model not in allowedModels:
+    allowedModels = LLMProvider.available_models()
+    if model not in allowedModels:
         return jsonify({'error': f'Model not allowed\n Allowed models: {allowedModels}'}), 400
     
     context:str = data['context']
@@ -159,6 +295,9 @@ def routeReportUser():
     if reportedUser == affectedUser:
         return jsonify({'error': 'Reported user and affected user are the same'}), 400
 
+    return serve('report_user', reportUser, context, reason, reportedUser, affectedUser)
+
+def reportUser(context, reason, reportedUser, affectedUser):
     discordRules = getDiscordRules()
 
     answer = answerToUser(discordRules, context, reason, reportedUser, affectedUser)
@@ -166,12 +305,12 @@ def routeReportUser():
     jsonAnswer = llmJsonParser(answer)
 
     if jsonAnswer and jsonAnswer.get("response_from_llm"):
-        return jsonify(jsonAnswer.get("response_from_llm"))
+        return jsonAnswer.get("response_from_llm"), 200
 
     if jsonAnswer:
-        return jsonify(jsonAnswer)
+        return jsonAnswer, 200
     
-    return jsonify({'message': 'Something went wrong'}), 400
+    return {'message': 'Something went wrong'}, 400
 
 @app.route('/delete', methods=['DELETE'])
 def route_delete():
@@ -180,6 +319,26 @@ def route_delete():
 
     return jsonify({"message": "Collection deleted successfully"}), 200
 
+@app.route('/stats', methods=['GET'])
+def route_stats():
+    return jsonify({
+        'chroma': chroma_registry.stats(),
+        'embedding_cache': get_embedding_cache().stats(),
+        'llm_cache': get_llm_cache().stats(),
+        'bm25': get_bm25_index().stats(),
+        'embedding_failures': get_embedding_failure_policy().stats(),
+        'ingestion': get_ingestion_progress(),
+        'tasks': task_queue.stats(),
+        'models': model_catalog.stats(),
+        'llm_clients': LLMProvider.pool_stats(),
+        'llm_scheduler': llm_scheduler.stats(),
+    }), 200
+
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8080, debug=True)
+    debug = SERVE_DEBUG
+    # Przy debug=True reloader uruchamia aplikację w procesie potomnym - wątki w tle startujemy tylko tam
+    # (pod serwerem WSGI wystartują przy pierwszym zapytaniu - ensure_background_workers)
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
+    app.run(host="0.0.0.0", port=8080, debug=debug, threaded=True)
 
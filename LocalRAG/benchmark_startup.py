@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+# Ustawienie kodowania stdout na UTF-8
+sys.stdout.reconfigure(encoding='utf-8')
+
+PROJECT_DIR = Path(__file__).parent
+
+# Import aplikacji mierzony w osobnym procesie - za każdym razem "zimny" start interpretera
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app; "
+    "print(time.perf_counter() - start)"
+)
+
+def measure_import(python: str) -> float:
+    result = subprocess.run(
+        [python, "-c", IMPORT_SNIPPET],
+        cwd = PROJECT_DIR,
+        capture_output = True,
+        text = True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import app failed:\n{result.stderr}")
+    # Ostatnia linia to czas - wcześniejsze mogą pochodzić z printów modułów
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark czasu importu app.py')
+    parser.add_argument('--runs', type=int, default=5, help='Liczba pomiarów')
+    parser.add_argument('--budget', type=float, default=float(os.getenv('STARTUP_IMPORT_BUDGET', '3.0')),
+                        help='Maksymalny dopuszczalny czas importu (mediana, w sekundach)')
+    parser.add_argument('--python', type=str, default=sys.executable, help='Interpreter do pomiaru')
+    args = parser.parse_args()
+
+    timings = [measure_import(args.python) for _ in range(args.runs)]
+    median = statistics.median(timings)
+
+    print(json.dumps({
+        'runs': args.runs,
+        'min': round(min(timings), 3),
+        'median': round(median, 3),
+        'max': round(max(timings), 3),
+        'budget': args.budget,
+        'within_budget': median <= args.budget,
+    }, indent = 2))
+
+    if median > args.budget:
+        print(f"Import app.py takes {median:.2f}s, budget is {args.budget:.2f}s")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import chromadb
+from chromadb.config import Settings
+
+# Ustawienie kodowania stdout na UTF-8
+sys.stdout.reconfigure(encoding='utf-8')
+# Dodaj ścieżkę do projektu
+sys.path.append(str(Path(__file__).parent))
+
+from src.utils.collection_spec import spec_for_path, migrate_collection
+
+def find_persist_dirs(root: str) -> list:
+    """Katalogi persist Chroma (zawierające chroma.sqlite3) pod root."""
+    return sorted(dirpath for dirpath, _, filenames in os.walk(root) if 'chroma.sqlite3' in filenames)
+
+def main():
+    parser = argparse.ArgumentParser(description='Przebudowa kolekcji Chroma zgodnie z CollectionSpec (cosine, parametry HNSW)')
+    parser.add_argument('--root', type=str, default=os.getenv('CHROMA_PATH', 'chroma'), help='Katalog z bazami Chroma')
+    parser.add_argument('--batch-size', type=int, default=500, help='Liczba rekordów kopiowanych naraz')
+    parser.add_argument('--dry-run', action='store_true', help='Tylko pokaż, które kolekcje wymagają migracji')
+    args = parser.parse_args()
+
+    # Serwer (app.py) nie powinien działać w trakcie migracji - trzyma otwarte indeksy tych samych kolekcji
+    migrated = 0
+    for path in find_persist_dirs(args.root):
+        spec = spec_for_path(path)
+        client = chromadb.PersistentClient(path = path, settings = Settings(anonymized_telemetry = False))
+
+        for collection in client.list_collections():
+            # Starsze wersje chromadb zwracają same nazwy kolekcji
+            if isinstance(collection, str):
+                collection = client.get_collection(collection)
+            if collection.name.endswith('-migrating'):
+                continue
+
+            differences = spec.differences(collection.metadata)
+            if not differences:
+                continue
+
+            print(f"{path} / {collection.name} ({collection.count()} rekordów): {differences}")
+            if args.dry_run:
+                continue
+
+            copied = migrate_collection(client, collection, spec, args.batch_size)
+            migrated += 1
+            print(f"  -> przebudowano, skopiowano {copied} rekordów")
+
+    print(f"Zmigrowano kolekcji: {migrated}" if not args.dry_run else "Dry run - nic nie zmieniono")
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,29 @@ from .utils.advanced_chroma import (
     CachedChromaDB
 )
 
+class RetrievalCoordinator:
+    """
+    Wyszukiwanie dla wszystkich wariantów zapytania naraz: warianty są embeddowane jednym wywołaniem,
+    Chroma dostaje jedno zapytanie z listą wektorów (równolegle z BM25), wyniki są łączone i
+    deduplikowane po id chunka, a reranking sumy kandydatów odbywa się raz - względem oryginalnego zapytania.
+    """
+    def __init__(self, chunking_db: DynamicChunkingChromaDB, reranking_db: RerankingChromaDB):
+        self.chunking_db = chunking_db
+        self.reranking_db = reranking_db
+
+    def retrieve(self, queries: list, n_results: int = 10) -> list:
+        """Kandydaci (dict z 'id', 'text', 'embedding', ...) dla wszystkich wariantów, bez duplikatów."""
+        queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        if not queries:
+            return []
+        query_embeddings = self.chunking_db.ef(queries)
+        return self.chunking_db.hybrid_query(queries, n_results=n_results, query_embeddings=query_embeddings)
+
+    def search(self, query: str, queries: list, n_results: int = 10, top_k: int = 5) -> list:
+        """Teksty top_k chunków po rerankingu."""
+        candidates = self.retrieve(queries or [query], n_results)
+        return self.reranking_db.rerank_results(query, candidates, top_k=top_k)
+
 class AdvancedRAG:
     def __init__(self, collection_name: str, embedding_model: str):
         self.reranking_db = RerankingChromaDB(collection_name, embedding_model)
@@ -15,20 +38,17 @@ class AdvancedRAG:
         self.chain_of_thought_db = ChainOfThoughtChromaDB(collection_name, embedding_model)
         self.feedback_db = FeedbackChromaDB(collection_name, embedding_model)
         self.cached_db = CachedChromaDB(collection_name, embedding_model)
+        self.retrieval = RetrievalCoordinator(self.dynamic_chunking_db, self.reranking_db)
 
-    def advanced_search(self, query: str):
+    def advanced_search(self, query: str, stream: bool = False):
         # Rozszerzanie zapytania
         expanded_queries = self.query_expansion_db.expand_query(query)
         
-        # Wyszukiwanie wyników
-        all_results = []
-        for q in expanded_queries:
-            results = self.dynamic_chunking_db.collection.query(query_texts=[q])['documents']
-            ranked_results = self.reranking_db.rerank_results(q, results)
-            all_results.extend(ranked_results)
+        # Wyszukiwanie wyników - wszystkie warianty jednym zapytaniem, jeden reranking
+        all_results = self.retrieval.search(query, expanded_queries)
         
-        # Generowanie odpowiedzi z Chain of Thought
-        final_response = self.chain_of_thought_db.generate_with_cot(query, all_results)
+        # Generowanie odpowiedzi z Chain of Thought (przy stream=True - generator fragmentów odpowiedzi)
+        final_response = self.chain_of_thought_db.generate_with_cot(query, all_results, stream=stream)
         
         return final_response
 
@@ -10,9 +10,131 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--model', type=str, help='Override for MODEL')
 parser.add_argument('--embeddings', type=str, help='Override for EMBEDINGS MODEL')
 parser.add_argument('--dir', type=str, help='Override for DIR_ID')
-args = parser.parse_args()
+parser.add_argument('--warmup', action='store_true', help='Create models and collections at startup instead of on first use')
+# parse_known_args - moduł jest importowany także przez skrypty z własnymi argumentami
+args, _ = parser.parse_known_args()
 
 OPENAI_API_KEY:str = os.getenv('OPENAI_API_KEY' ,'')
 MODEL:str = args.model or os.getenv('model', 'llama3.1')
 MODEL_EMBEDDINGS:str = args.embeddings or os.getenv('embeddings', 'nomic-embed-text')
-DIR_ID: str = args.dir or os.getenv('DIR_ID', random.random())
\ No newline at end of file
+DIR_ID: str = args.dir or os.getenv('DIR_ID', random.random())
+# Katalog modeli: adresy dostawców, co ile sekund odświeżać listy, timeout zapytań (s)
+# i plik z ostatnimi poprawnymi listami (używanymi, gdy dostawca jest niedostępny)
+OLLAMA_BASE_URL: str = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
+OPENAI_API_BASE: str = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+MODEL_CATALOG_TTL: float = float(os.getenv('MODEL_CATALOG_TTL', '300'))
+MODEL_CATALOG_TIMEOUT: float = float(os.getenv('MODEL_CATALOG_TIMEOUT', '3'))
+MODEL_CATALOG_PATH: str = os.getenv('MODEL_CATALOG_PATH', 'chroma/model_catalog.json')
+
+# Klienci LLM: timeout zapytań (s), jak długo Ollama trzyma model w pamięci,
+# maksymalna liczba połączeń HTTP na dostawcę i liczba ponowień po stronie klienta OpenAI
+LLM_REQUEST_TIMEOUT: float = float(os.getenv('LLM_REQUEST_TIMEOUT', '120'))
+LLM_KEEP_ALIVE: str = os.getenv('LLM_KEEP_ALIVE', '5m')
+LLM_MAX_CONNECTIONS: int = int(os.getenv('LLM_MAX_CONNECTIONS', '10'))
+LLM_MAX_RETRIES: int = int(os.getenv('LLM_MAX_RETRIES', '2'))
+
+# Cache odpowiedzi LLM dla deterministycznych wywołań pomocniczych: włączony/wyłączony,
+# plik SQLite, czas życia wpisu (s) i maksymalna liczba wpisów
+LLM_CACHE_ENABLED: bool = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_PATH: str = os.getenv('LLM_CACHE_PATH', 'chroma/llm_cache.sqlite3')
+LLM_CACHE_TTL: float = float(os.getenv('LLM_CACHE_TTL', '604800'))
+LLM_CACHE_MAX_ENTRIES: int = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+
+# Harmonogram wywołań LLM: maksymalna liczba równoczesnych zapytań na backend
+# (format "backend=limit,..."), limit dla pozostałych i co ile sekund oczekiwania
+# zapytanie zyskuje jeden poziom priorytetu
+LLM_SCHEDULER_LIMITS: dict = {
+    name.strip(): int(limit)
+    for name, limit in (item.split('=') for item in os.getenv('LLM_SCHEDULER_LIMITS', 'ollama=2,openai=16').split(',') if '=' in item)
+}
+LLM_SCHEDULER_DEFAULT_LIMIT: int = int(os.getenv('LLM_SCHEDULER_DEFAULT_LIMIT', '4'))
+LLM_SCHEDULER_AGING: float = float(os.getenv('LLM_SCHEDULER_AGING', '30'))
+
+# Semantyczny cache odpowiedzi (CachedChromaDB): limit wpisów, czas życia wpisu (s), sposób usuwania
+# nadmiarowych ('lru' albo 'lfu'), co ile sekund sprzątać, krótszy czas życia dla wyników wyszukiwania
+# w internecie oraz rozmiar i czas życia cache w pamięci
+SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '5000'))
+SEMANTIC_CACHE_TTL: float = float(os.getenv('SEMANTIC_CACHE_TTL', '604800'))
+SEMANTIC_CACHE_EVICTION: str = os.getenv('SEMANTIC_CACHE_EVICTION', 'lru')
+SEMANTIC_CACHE_SWEEP_INTERVAL: float = float(os.getenv('SEMANTIC_CACHE_SWEEP_INTERVAL', '600'))
+SEARCH_CACHE_TTL: float = float(os.getenv('SEARCH_CACHE_TTL', '21600'))
+SEMANTIC_CACHE_MEMORY_ITEMS: int = int(os.getenv('SEMANTIC_CACHE_MEMORY_ITEMS', '256'))
+SEMANTIC_CACHE_MEMORY_TTL: float = float(os.getenv('SEMANTIC_CACHE_MEMORY_TTL', '300'))
+
+# Parametry indeksów HNSW według rodzaju bazy (JSON), nadpisują domyślne z utils/collection_spec.py,
+# np. '{"documents": {"search_ef": 200}, "default": {"M": 24}}'
+CHROMA_COLLECTION_SPECS: str = os.getenv('CHROMA_COLLECTION_SPECS', '')
+
+# Wyszukiwanie hybrydowe (DynamicChunkingChromaDB): indeks BM25 w SQLite obok wektorowego,
+# parametry BM25 (k1, b), stała k fuzji RRF i liczba kandydatów pobieranych z każdego indeksu
+HYBRID_SEARCH_ENABLED: bool = os.getenv('HYBRID_SEARCH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+BM25_INDEX_PATH: str = os.getenv('BM25_INDEX_PATH', 'chroma/bm25.sqlite3')
+BM25_K1: float = float(os.getenv('BM25_K1', '1.2'))
+BM25_B: float = float(os.getenv('BM25_B', '0.75'))
+RRF_K: int = int(os.getenv('RRF_K', '60'))
+HYBRID_CANDIDATES: int = int(os.getenv('HYBRID_CANDIDATES', '10'))
+
+# Tokenizer do liczenia tokenów w promptach (kodowanie tiktoken; bez niego - szacowanie z długości tekstu)
+TOKENIZER_ENCODING: str = os.getenv('TOKENIZER_ENCODING', 'cl100k_base')
+
+# Chain of Thought (ChainOfThoughtChromaDB): liczba równoległych wywołań "myśli" dla dokumentów,
+# limit tokenów kontekstu jednego dokumentu i liczba dokumentów łączonych w jedno wywołanie
+COT_MAX_WORKERS: int = int(os.getenv('COT_MAX_WORKERS', '4'))
+COT_DOC_TOKENS: int = int(os.getenv('COT_DOC_TOKENS', '800'))
+COT_DOCS_PER_THOUGHT: int = int(os.getenv('COT_DOCS_PER_THOUGHT', '1'))
+
+# Budżet tokenów promptu LLMQueryEngine (prompt systemowy, feedback, chunki, historia, pytanie)
+# i największa część pozostałego budżetu dla feedbacku i historii rozmowy
+PROMPT_TOKEN_BUDGET: int = int(os.getenv('PROMPT_TOKEN_BUDGET', '3072'))
+PROMPT_FEEDBACK_SHARE: float = float(os.getenv('PROMPT_FEEDBACK_SHARE', '0.15'))
+PROMPT_HISTORY_SHARE: float = float(os.getenv('PROMPT_HISTORY_SHARE', '0.3'))
+
+# Warmup: modele, kolekcje i dane NLTK tworzone przy starcie serwera, a nie przy pierwszym żądaniu
+WARMUP: bool = args.warmup or os.getenv('WARMUP', 'false').lower() in ('1', 'true', 'yes')
+
+# Reranking: tryb filtra LLM ('batch', 'parallel', 'off'), próg podobieństwa kosinusowego,
+# powyżej którego kandydat nie wymaga oceny LLM, i limit równoległych zapytań w trybie 'parallel'
+RERANK_LLM_FILTER: str = os.getenv('RERANK_LLM_FILTER', 'batch')
+RERANK_DECISIVE_SIMILARITY: float = float(os.getenv('RERANK_DECISIVE_SIMILARITY', '0.85'))
+RERANK_MAX_WORKERS: int = int(os.getenv('RERANK_MAX_WORKERS', '4'))
+
+# Cache embeddingów: trwały magazyn SQLite i liczba wektorów trzymanych w LRU w pamięci
+EMBEDDING_CACHE_PATH: str = os.getenv('EMBEDDING_CACHE_PATH', 'chroma/embedding_cache.sqlite3')
+EMBEDDING_CACHE_MEMORY_ITEMS: int = int(os.getenv('EMBEDDING_CACHE_MEMORY_ITEMS', '10000'))
+
+# Embeddingi wysyłane partiami: rozmiar partii i liczba partii wysyłanych równolegle
+EMBEDDING_BATCH_SIZE: int = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+EMBEDDING_MAX_WORKERS: int = int(os.getenv('EMBEDDING_MAX_WORKERS', '4'))
+
+# Polityka błędów embeddingu: liczba prób, bazowe opóźnienie backoffu (s), kolejka tekstów
+# z wektorami zastępczymi i co ile sekund wątek w tle próbuje je ponownie embeddować
+EMBEDDING_RETRIES: int = int(os.getenv('EMBEDDING_RETRIES', '3'))
+EMBEDDING_RETRY_BACKOFF: float = float(os.getenv('EMBEDDING_RETRY_BACKOFF', '1.0'))
+EMBEDDING_PENDING_PATH: str = os.getenv('EMBEDDING_PENDING_PATH', 'chroma/embedding_pending.sqlite3')
+EMBEDDING_REPAIR_INTERVAL: float = float(os.getenv('EMBEDDING_REPAIR_INTERVAL', '300'))
+
+# Potok ingestii: liczba wątków summaryzacji i tagowania (warto dopasować do OLLAMA_NUM_PARALLEL),
+# liczba dokumentów zapisywanych do Chroma jedną partią i pojemność kolejek między etapami
+INGEST_SUMMARIZE_WORKERS: int = int(os.getenv('INGEST_SUMMARIZE_WORKERS', '4'))
+INGEST_TAG_WORKERS: int = int(os.getenv('INGEST_TAG_WORKERS', '4'))
+INGEST_WRITE_BATCH_SIZE: int = int(os.getenv('INGEST_WRITE_BATCH_SIZE', '32'))
+INGEST_QUEUE_SIZE: int = int(os.getenv('INGEST_QUEUE_SIZE', '16'))
+
+# Zadania ingestii (/summarize_and_embed): trwały magazyn zadań i checkpointów fragmentów
+INGEST_JOBS_PATH: str = os.getenv('INGEST_JOBS_PATH', 'chroma/ingest_jobs.sqlite3')
+
+# Parsowanie PDF (PyMuPDF, pdfplumber, OCR) w puli procesów: liczba procesów (0 = liczba rdzeni),
+# liczba stron w jednym zadaniu oraz rozdzielczość i język OCR (tesseract)
+PDF_PARSER_WORKERS: int = int(os.getenv('PDF_PARSER_WORKERS', '0'))
+PDF_PARSER_PAGES_PER_TASK: int = int(os.getenv('PDF_PARSER_PAGES_PER_TASK', '4'))
+OCR_DPI: int = int(os.getenv('OCR_DPI', '300'))
+OCR_LANG: str = os.getenv('OCR_LANG', 'eng')
+
+# Tryb obsługi tras wywołujących LLM: 'sync' (w wątku żądania) albo 'queue' (ograniczona kolejka
+# z odpowiedzią 202 + /tasks/<id> dla długich zadań i 429 przy przepełnieniu)
+SERVE_MODE: str = os.getenv('SERVE_MODE', 'sync')
+SERVE_MAX_WORKERS: int = int(os.getenv('SERVE_MAX_WORKERS', '4'))
+SERVE_MAX_PENDING: int = int(os.getenv('SERVE_MAX_PENDING', '8'))
+SERVE_SYNC_WAIT: float = float(os.getenv('SERVE_SYNC_WAIT', '20'))
+SERVE_TASK_TTL: float = float(os.getenv('SERVE_TASK_TTL', '3600'))
+SERVE_DEBUG: bool = os.getenv('SERVE_DEBUG', 'true').lower() in ('1', 'true', 'yes')
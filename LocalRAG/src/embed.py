@@ -1,17 +1,20 @@
 import os
 import bs4
-from datetime import datetime
+import itertools
 
 from llama_index.core import Document
 from werkzeug.utils import secure_filename
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from .get_vector_db import get_vector_db
+from .config import INGEST_WRITE_BATCH_SIZE
+from .pdf_parsers import PARALLEL_PDF_READERS, lazy_parse_pdf
+from .utils.nltk_data import ensure_nltk_data
+from .utils.document_ids import file_hash, tag_chunk, existing_chunk_ids, delete_stale_chunks
+from .utils.save_file import saveFile
 
-TEMP_FOLDER = os.getenv('TEMP_FOLDER', './_temp')
-FILES_FOLDER = os.getenv('TEMP_FOLDER', './_files')
 
-allowedPdfReaders = ['PyPDFLoader']
+allowedPdfReaders = ['PyPDFLoader', *PARALLEL_PDF_READERS]
 
 # Function to check if the uploaded file is allowed (only PDF files)
 def allowed_file(filename):
@@ -20,51 +23,59 @@ def allowed_image_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png', 'jpg'}
 # Function to save the uploaded file to the temporary folder
 def save_file(file, model, readerType, namespace):
-    # Save the uploaded file with a secure filename and return the file path
-    print("Loading file ... " + "__" + model + "__" + readerType + "__" + namespace + "__" + secure_filename(file.filename))
-    ct = datetime.now()
-    ts = ct.timestamp()
-    filename = str(ts) + "__" + model + "__" + readerType + "__" + namespace + "__" + secure_filename(file.filename)
-    file_path = os.path.join(TEMP_FOLDER, filename)
-    file.save(file_path)
+    return saveFile(file, [model, readerType, namespace])
 
-    return file_path
+text_splitter = RecursiveCharacterTextSplitter(chunk_size=4096, chunk_overlap=256)
 
 def splitTextAndImages(data:  list[Document]):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=4096, chunk_overlap=256)
     chunks = text_splitter.split_documents(data)
     return chunks
 
-def load_and_split_data(file_path, pdfReader):
-    loader = None
-    data = None
-
+def lazy_load_pages(file_path, pdfReader):
+    """Generator stron pliku dla wybranego czytnika albo None, jeśli czytnik jest nieznany."""
+    ensure_nltk_data()
     if pdfReader == 'PyPDFLoader':
-        loader = PyPDFLoader(
+        return PyPDFLoader(
             file_path=file_path,
-        )
-
+        ).lazy_load()
+    if pdfReader in PARALLEL_PDF_READERS:
+        return lazy_parse_pdf(file_path, pdfReader)
+    return None
+
+def lazy_load_and_split_data(file_path, pdfReader):
+    """
+    Generator fragmentów: strony są wczytywane pojedynczo i od razu dzielone,
+    więc w pamięci jest tylko bieżąca strona, a nie cały dokument.
+    split_documents i tak dzieli każdą stronę osobno, więc fragmenty są takie same jak przy load().
+    """
+    pages_iter = lazy_load_pages(file_path, pdfReader)
+    if pages_iter is None:
+        print(f"No loader found for pdfReader: {pdfReader}")
+        return
+
+    print("Loading data with loader:", pdfReader)
+    pages = 0
+    chunks = 0
     try:
-        if loader is not None:
-            print("Loading data with loader:", pdfReader)
-            data = loader.load()
-            print(f"Loaded {len(data)} documents")
-            for i, doc in enumerate(data[:3]):  # Show first 3 docs for debugging
-                print(f"Document {i}: {len(doc.page_content)} chars")
-        else:
-            print(f"No loader found for pdfReader: {pdfReader}")
-            return []
+        for page in pages_iter:
+            if pages < 3:  # Show first 3 docs for debugging
+                print(f"Document {pages}: {len(page.page_content)} chars")
+            pages += 1
+            for chunk in text_splitter.split_documents([page]):
+                chunks += 1
+                yield chunk
     except Exception as err:
         print(f"Error loading data: {err}")
         raise err
 
-    if not data:
+    print(f"Loaded {pages} documents, split into {chunks} chunks")
+
+def load_and_split_data(file_path, pdfReader):
+    chunks = list(lazy_load_and_split_data(file_path, pdfReader))
+    if not chunks:
         print("No data loaded from file")
         return []
 
-    chunks = splitTextAndImages(data)
-    print(f"Split into {len(chunks)} chunks")
-
     return chunks
 
 def embed(file, model, pdfReader, namespace, query=None):
@@ -72,15 +83,38 @@ def embed(file, model, pdfReader, namespace, query=None):
         return False
 
     file_path = save_file(file, model, pdfReader, namespace)
-    chunks = load_and_split_data(file_path, pdfReader)
-    if isinstance(chunks, str):
-        return chunks
-    if not chunks and chunks != False:
+    return embed_file(file_path, secure_filename(file.filename), model, pdfReader, namespace)
+
+def embed_file(file_path, source_file, model, pdfReader, namespace):
+    chunks = lazy_load_and_split_data(file_path, pdfReader)
+    first = next(chunks, None)
+    if first is None:
         return False
 
-    if chunks != False:
-        db = get_vector_db(model, f'str_{namespace}')
-        db.add_documents(chunks, metadata={"type": "documents", "file": file})
+    db = get_vector_db(model, f'str_{namespace}')
+
+    # Przyrostowo: dodajemy tylko fragmenty, których jeszcze nie ma; fragmenty starej wersji pliku
+    # usuwamy dopiero po zapisaniu nowej (błąd embeddingu przerywa funkcję przed usunięciem)
+    file_sha = file_hash(file_path)
+    existing = existing_chunk_ids(db, source_file, file_sha, 'embed')
+
+    # Fragmenty są zapisywane partiami w trakcie czytania pliku
+    batch = {}
+    skipped = 0
+    for chunk in itertools.chain([first], chunks):
+        tag_chunk(chunk, namespace, source_file, file_sha, 'embed')
+        if chunk.metadata['chunk_id'] in existing:
+            skipped += 1
+            continue
+        existing.add(chunk.metadata['chunk_id'])
+        batch[chunk.metadata['chunk_id']] = chunk
+        if len(batch) >= INGEST_WRITE_BATCH_SIZE:
+            db.add_documents(list(batch.values()), ids=list(batch))
+            batch = {}
+    if batch:
+        db.add_documents(list(batch.values()), ids=list(batch))
+    print(f"Skipped {skipped} chunks already in the database")
+    delete_stale_chunks(db, source_file, file_sha, 'embed')
 
     print("Loading file ... Chunks Added")
     os.remove(file_path)
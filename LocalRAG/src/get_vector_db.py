@@ -8,13 +8,14 @@ from .utils.advanced_chroma import (
     DynamicChunkingChromaDB,
     ChainOfThoughtChromaDB,
     FeedbackChromaDB,
-    CachedChromaDB
+    CachedChromaDB,
+    chroma_registry,
+    chroma_path
 )
+from .utils.collection_spec import spec_for_path
 from .utils.llm import LLMProvider
 from .config import MODEL, MODEL_EMBEDDINGS
 
-allowedEmbeddingsModels = LLMProvider.list_ollama_models() + LLMProvider.list_openai_models()
-allowedModels = LLMProvider.list_ollama_models() + LLMProvider.list_openai_models()
 embeddingSizes = [1024, 768, 1024]
 
 def auto_embed_default_pdf(db, embedding_model, collection_name):
@@ -69,8 +70,9 @@ def get_vector_db(embedding_model, collection_name):
 
     db = Chroma(
         collection_name=collection_name,
-        persist_directory=f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/documents',
+        client=chroma_registry.open(chroma_path('documents')),
         embedding_function=embedding,
+        collection_metadata=spec_for_path(chroma_path('documents')).metadata(),
     )
 
     # Sprawdź czy baza danych jest pusta i zaembedduj licencjat.pdf jeśli trzeba
@@ -0,0 +1,323 @@
+import re
+import queue
+import datetime
+import threading
+from collections import OrderedDict
+
+from langchain.docstore.document import Document
+
+from .config import INGEST_SUMMARIZE_WORKERS, INGEST_TAG_WORKERS, INGEST_WRITE_BATCH_SIZE, INGEST_QUEUE_SIZE
+from .utils.llm_get_tags import llmGetTags
+from .utils.llm_summarize_text import llmSummarizeText, llmCheckSummarizeText
+from .utils.llm_scheduler import llm_priority, PRIORITY_BACKGROUND
+
+SUMMARIZE_ATTEMPTS = 3
+
+# Znacznik końca pracy dla wątków etapu
+_DONE = object()
+
+
+def parse_chapters(chapters: str) -> list:
+    """Dzieli odpowiedź LLM "Chunk (X of Y): Z ..." na listę {'title', 'body'}."""
+    chapterChunks = []
+    for chapter in chapters.split('\n'):
+        found = re.match(r"((\s?)+?\d+\. Chunk \(?\d+ of \d+\)?:?\s+?)", chapter) #delete chunks
+        if found is None:
+            found = re.match(r"((\s?)+?\d+\. Chunk \(?\d+ of \d+\)?=?>?\s+?)", chapter)  # delete chunks
+        if found is None:
+            found = re.match(r"((\s?)+?Chunk \(?\d+ of \d+\)?:?\s+?)", chapter)  # delete chunks
+        if found is None:
+            found = re.match(r"((\s?)+?Chunk \d+:?\s+?)", chapter)  # delete chunks
+        if found is None:
+            found = re.match(r"((\s?)+?\d+\. Chunk \d+:?\s+)", chapter)
+        if found is None:
+            found = re.match(r"((\s?)+?\d+\.\s+)", chapter)
+
+        if found is None:
+            if len(chapterChunks) == 0: continue # ignore first summary stupid idea of llm after changes?
+            if chapterChunks[len(chapterChunks) -1]['body'] ==  '':
+                chapterChunks[len(chapterChunks) -1]['body'] = chapterChunks[len(chapterChunks) -1]['body'] + chapter.replace('SUMMARY:', '').strip().lstrip("- ")
+            else:
+                chapterChunks[len(chapterChunks) - 1]['body'] = chapterChunks[len(chapterChunks) - 1]['body'] + chapter.strip()
+        else:
+            chapterChunks.append({"title": chapter.replace(found.group(), '').strip(), 'body': ''})
+
+    return chapterChunks
+
+
+def strip_final_summary(summary: str) -> str:
+    found = re.match(r"((\s?)+Final Summary:\s+?)", summary)
+    if found is None:
+        return summary
+    return summary.replace(found.group(), '').strip()
+
+
+# Metadane fragmentu (z document_ids.tag_chunk) przenoszone do dokumentów
+CHUNK_METADATA_KEYS = ('source_file', 'file_hash', 'chunk_hash', 'chunk_id', 'pipeline')
+
+def build_documents(chunk, chapters: str, summary: str, chapterTags, file_path: str) -> list:
+    """
+    Tworzy dokumenty (po jednym na rozdział) dla jednego fragmentu pliku.
+    Jeśli fragment ma chunk_id, dokumenty dostają deterministyczne id "<chunk_id>-<nr rozdziału>".
+    """
+    chapterChunks = parse_chapters(chapters)
+    summary = strip_final_summary(summary)
+    chunkMetadata = {key: chunk.metadata[key] for key in CHUNK_METADATA_KEYS if key in chunk.metadata}
+
+    documents = []
+    for i, chapter in enumerate(chapterChunks):
+        try:
+            chunkTags = chapterTags[i]['tags']
+            chunkTagsString = ",".join(chunkTags)
+            title = chapter['title']
+            chunkSummary = chapter['body']
+
+            document = Document(page_content=chunk.page_content, metadata={'title': title,'summary': chunkSummary, 'tags': chunkTagsString, 'file': file_path, 'finalSummary': summary, **chunkMetadata})
+            if 'chunk_id' in chunkMetadata:
+                document.id = f"{chunkMetadata['chunk_id']}-{i}"
+            documents.append(document)
+        except Exception as e:
+            print('=>>>>', i, chapter, chapterTags, chapterChunks)
+            print(chapters, summary, "2\n\n")
+            print(e)
+    return documents
+
+
+class IngestionProgress:
+    """Postęp przetwarzania jednego pliku, aktualizowany przez wątki potoku."""
+    def __init__(self, file_path: str, total: int = None):
+        self.file_path = file_path
+        self.total = total
+        self.queued = 0
+        self.summarized = 0
+        self.tagged = 0
+        self.written = 0
+        self.documents = 0
+        self.failed = 0
+        self.skipped = 0
+        self.status = 'running'
+        self.started_at = datetime.datetime.now()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def advance(self, stage: str, count: int = 1):
+        with self._lock:
+            setattr(self, stage, getattr(self, stage) + count)
+
+    def finish(self):
+        with self._lock:
+            # 'partial' - część fragmentów zapisana, a część nie (brakuje ich w kolekcji)
+            if self.failed:
+                self.status = 'partial' if self.written else 'failed'
+            else:
+                self.status = 'done'
+            self.finished_at = datetime.datetime.now()
+
+    def to_dict(self):
+        with self._lock:
+            end = self.finished_at or datetime.datetime.now()
+            return {
+                'file': self.file_path,
+                'status': self.status,
+                'total': self.total if self.total is not None else self.queued,
+                'summarized': self.summarized,
+                'tagged': self.tagged,
+                'written': self.written,
+                'documents': self.documents,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'elapsed': (end - self.started_at).total_seconds(),
+            }
+
+
+# Postęp ostatnich plików (najstarsze są usuwane)
+_recent_progress = OrderedDict()
+_recent_progress_lock = threading.Lock()
+_RECENT_PROGRESS_LIMIT = 50
+
+def _track(progress: IngestionProgress):
+    with _recent_progress_lock:
+        _recent_progress[progress.file_path] = progress
+        _recent_progress.move_to_end(progress.file_path)
+        while len(_recent_progress) > _RECENT_PROGRESS_LIMIT:
+            _recent_progress.popitem(last=False)
+
+def get_ingestion_progress() -> list:
+    with _recent_progress_lock:
+        return [progress.to_dict() for progress in _recent_progress.values()]
+
+
+class IngestionPipeline:
+    """
+    Potokowe przetwarzanie fragmentów pliku: summaryzacja z walidacją -> tagowanie -> zapis do Chroma.
+    Każdy etap ma własną (ograniczoną) kolejkę i pulę wątków, więc zapytania do LLM dla różnych
+    fragmentów idą równolegle, a dokumenty są zapisywane partiami po write_batch_size.
+
+    Opcjonalny checkpoint (np. JobCheckpoint z jobs.py) zapamiętuje wynik każdego etapu dla fragmentu:
+    get(i) -> {'chapters', 'summary', 'tags', 'written'} lub None, save_summary, save_tags, mark_written.
+    Fragmenty już zapisane są pomijane, a wcześniej przygotowane wchodzą od razu do dalszego etapu.
+
+    Zapytania do LLM z wątków potoku mają priorytet priority (domyślnie tło), więc nie wyprzedzają /chat.
+    """
+    def __init__(self, db, file_path: str,
+                 summarize_workers: int = INGEST_SUMMARIZE_WORKERS,
+                 tag_workers: int = INGEST_TAG_WORKERS,
+                 write_batch_size: int = INGEST_WRITE_BATCH_SIZE,
+                 queue_size: int = INGEST_QUEUE_SIZE,
+                 on_progress = None,
+                 checkpoint = None,
+                 priority: int = PRIORITY_BACKGROUND):
+        self.db = db
+        self.file_path = file_path
+        self.summarize_workers = max(1, summarize_workers)
+        self.tag_workers = max(1, tag_workers)
+        self.write_batch_size = max(1, write_batch_size)
+        self.on_progress = on_progress
+        self.checkpoint = checkpoint
+        self.priority = priority
+
+        self._summarize_queue = queue.Queue(maxsize=queue_size)
+        self._tag_queue = queue.Queue(maxsize=queue_size)
+        self._write_queue = queue.Queue()
+        self.progress = None
+
+    def _summarize(self, item):
+        i, chunk = item
+        count = 0
+        while True:
+            count = count + 1
+            # Ponowienia po odrzuconej walidacji muszą zapytać model - z cache wróciłoby to samo streszczenie i ta sama ocena
+            retry = count > 1
+            chapters, summary = llmSummarizeText(chunk.page_content, refresh=retry)
+            isOk = llmCheckSummarizeText(chapters, summary, refresh=retry)
+            if isOk == 'yes' or count == SUMMARIZE_ATTEMPTS:
+                if self.checkpoint is not None:
+                    self.checkpoint.save_summary(i, chapters, summary)
+                return (i, chunk, chapters, summary)
+
+    def _tag(self, item):
+        i, chunk, chapters, summary = item
+        chapterTags = llmGetTags(chapters)
+        if self.checkpoint is not None:
+            self.checkpoint.save_tags(i, chapterTags)
+        return (i, build_documents(chunk, chapters, summary, chapterTags, self.file_path))
+
+    def _report(self):
+        print(f"--- {self.file_path}: {self.progress.to_dict()} ---")
+        if self.on_progress is not None:
+            try:
+                self.on_progress(self.progress)
+            except Exception as e:
+                print(f"Error in ingestion progress callback: {e}")
+
+    def _stage_worker(self, func, inbox: queue.Queue, outbox: queue.Queue, stage: str):
+        with llm_priority(self.priority):
+            self._stage_loop(func, inbox, outbox, stage)
+
+    def _stage_loop(self, func, inbox: queue.Queue, outbox: queue.Queue, stage: str):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            try:
+                result = func(item)
+            except Exception as e:
+                print(f"Error in ingestion stage '{stage}' for chunk {item[0]}: {e}")
+                self.progress.advance('failed')
+                self._report()
+                continue
+            self.progress.advance(stage)
+            outbox.put(result)
+
+    def _flush(self, documents: list, indices: list):
+        try:
+            if documents:
+                ids = [document.id for document in documents]
+                # Chroma z langchain robi upsert, więc ponowny zapis tych samych id nie tworzy duplikatów
+                self.db.add_documents(documents, ids=ids if all(ids) else None)
+        except Exception as e:
+            print(f"Error writing {len(documents)} documents for {self.file_path}: {e}")
+            self.progress.advance('failed', len(indices))
+            return
+
+        if self.checkpoint is not None and indices:
+            self.checkpoint.mark_written(indices)
+        self.progress.advance('written', len(indices))
+        self.progress.advance('documents', len(documents))
+
+    def _writer(self):
+        buffer = []
+        indices = []
+        while True:
+            item = self._write_queue.get()
+            if item is _DONE:
+                break
+            i, documents = item
+            buffer.extend(documents)
+            indices.append(i)
+            if len(buffer) >= self.write_batch_size:
+                self._flush(buffer, indices)
+                buffer, indices = [], []
+                self._report()
+        self._flush(buffer, indices)
+
+    def _enqueue(self, i: int, chunk):
+        """Kieruje fragment do pierwszego etapu, którego wyniku nie ma jeszcze w checkpoincie."""
+        state = self.checkpoint.get(i) if self.checkpoint is not None else None
+        if state is None or state.get('summary') is None:
+            self._summarize_queue.put((i, chunk))
+            return
+
+        self.progress.advance('summarized')
+        if state.get('written'):
+            self.progress.advance('tagged')
+            self.progress.advance('written')
+        elif state.get('tags') is None:
+            self._tag_queue.put((i, chunk, state['chapters'], state['summary']))
+        else:
+            self.progress.advance('tagged')
+            self._write_queue.put((i, build_documents(chunk, state['chapters'], state['summary'], state['tags'], self.file_path)))
+
+    def run(self, chunks, skip = None) -> IngestionProgress:
+        """Przetwarza fragmenty; skip(chunk) -> True pomija fragment (np. już zapisany w kolekcji)."""
+        total = len(chunks) if hasattr(chunks, '__len__') else None
+        self.progress = IngestionProgress(self.file_path, total)
+        _track(self.progress)
+
+        summarizers = [
+            threading.Thread(target=self._stage_worker, args=(self._summarize, self._summarize_queue, self._tag_queue, 'summarized'),
+                             name=f"ingest-summarize-{n}", daemon=True)
+            for n in range(self.summarize_workers)
+        ]
+        taggers = [
+            threading.Thread(target=self._stage_worker, args=(self._tag, self._tag_queue, self._write_queue, 'tagged'),
+                             name=f"ingest-tag-{n}", daemon=True)
+            for n in range(self.tag_workers)
+        ]
+        writer = threading.Thread(target=self._writer, name="ingest-write", daemon=True)
+        for thread in [*summarizers, *taggers, writer]:
+            thread.start()
+
+        try:
+            # Ograniczona kolejka blokuje tutaj, gdy LLM nie nadąża - fragmenty nie gromadzą się w pamięci
+            for i, chunk in enumerate(chunks):
+                self.progress.advance('queued')
+                if skip is not None and skip(chunk):
+                    self.progress.advance('skipped')
+                    continue
+                self._enqueue(i, chunk)
+        finally:
+            for _ in summarizers:
+                self._summarize_queue.put(_DONE)
+            for thread in summarizers:
+                thread.join()
+            for _ in taggers:
+                self._tag_queue.put(_DONE)
+            for thread in taggers:
+                thread.join()
+            self._write_queue.put(_DONE)
+            writer.join()
+
+        self.progress.finish()
+        self._report()
+        return self.progress
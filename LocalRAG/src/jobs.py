@@ -0,0 +1,309 @@
+import os
+import json
+import uuid
+import queue
+import sqlite3
+import datetime
+import threading
+
+from .config import INGEST_JOBS_PATH
+from .new_embeddings import ingestFile
+from .utils.document_ids import file_hash
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class JobStore:
+    """
+    Trwały (SQLite) magazyn zadań ingestii i checkpointów fragmentów.
+    Checkpoint fragmentu trzyma wynik summaryzacji, tagi i informację, czy dokumenty trafiły już do Chroma.
+    """
+    def __init__(self, path: str = INGEST_JOBS_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                file_path TEXT NOT NULL,
+                source_file TEXT,
+                file_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                pdf_reader TEXT NOT NULL,
+                namespace TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_checkpoints (
+                job_id TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                chapters TEXT,
+                summary TEXT,
+                tags TEXT,
+                written INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, chunk_index)
+            )
+        """)
+        # Magazyny utworzone przed dodaniem kolumny source_file
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)").fetchall()}
+        if 'source_file' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN source_file TEXT")
+        self._conn.commit()
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.datetime.now().isoformat()
+
+    def create(self, file_path: str, model: str, pdf_reader: str, namespace: str, source_file: str = None) -> str:
+        job_id = str(uuid.uuid4())
+        now = self._now()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, file_path, source_file, file_hash, model, pdf_reader, namespace, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, file_path, source_file, file_hash(file_path), model, pdf_reader, namespace, JOB_QUEUED, now, now)
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            checkpoints = self._conn.execute(
+                "SELECT COUNT(summary), COUNT(tags), SUM(written) FROM chunk_checkpoints WHERE job_id = ?", (job_id,)
+            ).fetchone()
+
+        job = dict(row)
+        job['progress'] = json.loads(job['progress']) if job['progress'] else None
+        job['checkpoints'] = {
+            'summarized': checkpoints[0],
+            'tagged': checkpoints[1],
+            'written': checkpoints[2] or 0,
+        }
+        return job
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+        return [row['id'] for row in rows]
+
+    def update(self, job_id: str, status: str = None, progress: dict = None, error: str = None):
+        fields, values = ['updated_at = ?'], [self._now()]
+        if status is not None:
+            fields.append('status = ?')
+            values.append(status)
+        if progress is not None:
+            fields.append('progress = ?')
+            values.append(json.dumps(progress))
+        if error is not None:
+            fields.append('error = ?')
+            values.append(error)
+
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {', '.join(fields)} WHERE id = ?", (*values, job_id))
+            self._conn.commit()
+
+    def missing_chunks(self, job_id: str) -> int:
+        """
+        Liczba fragmentów ostatniego przebiegu, które nie trafiły do kolekcji (ani nie były już w niej
+        wcześniej) - według postępu zapisanego przez potok.
+        """
+        job = self.get(job_id)
+        progress = (job or {}).get('progress') or {}
+        if not progress:
+            return 0
+        return max(0, progress.get('total', 0) - progress.get('written', 0) - progress.get('skipped', 0))
+
+    def file_in_use(self, file_path: str, exclude_job_id: str = None) -> bool:
+        """Czy plik jest potrzebny innemu zadaniu (czekającemu, trwającemu albo nieudanemu - do retry)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE file_path = ? AND id != ? AND status IN (?, ?, ?) LIMIT 1",
+                (file_path, exclude_job_id or '', JOB_QUEUED, JOB_RUNNING, JOB_FAILED)
+            ).fetchone()
+        return row is not None
+
+    def get_checkpoint(self, job_id: str, chunk_index: int):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chapters, summary, tags, written FROM chunk_checkpoints WHERE job_id = ? AND chunk_index = ?",
+                (job_id, chunk_index)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'chapters': row['chapters'],
+            'summary': row['summary'],
+            'tags': json.loads(row['tags']) if row['tags'] is not None else None,
+            'written': bool(row['written']),
+        }
+
+    def save_summary(self, job_id: str, file_hash: str, chunk_index: int, chapters: str, summary: str):
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO chunk_checkpoints (job_id, file_hash, chunk_index, chapters, summary) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (job_id, chunk_index) DO UPDATE SET chapters = excluded.chapters, summary = excluded.summary
+            """, (job_id, file_hash, chunk_index, chapters, summary))
+            self._conn.commit()
+
+    def save_tags(self, job_id: str, chunk_index: int, tags):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE chunk_checkpoints SET tags = ? WHERE job_id = ? AND chunk_index = ?",
+                (json.dumps(tags), job_id, chunk_index)
+            )
+            self._conn.commit()
+
+    def mark_written(self, job_id: str, chunk_indices: list):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunk_checkpoints SET written = 1 WHERE job_id = ? AND chunk_index = ?",
+                [(job_id, chunk_index) for chunk_index in chunk_indices]
+            )
+            self._conn.commit()
+
+
+class JobCheckpoint:
+    """Checkpoint jednego zadania w formacie oczekiwanym przez IngestionPipeline."""
+    def __init__(self, store: JobStore, job_id: str, file_hash: str):
+        self.store = store
+        self.job_id = job_id
+        self.file_hash = file_hash
+
+    def get(self, chunk_index: int):
+        return self.store.get_checkpoint(self.job_id, chunk_index)
+
+    def save_summary(self, chunk_index: int, chapters: str, summary: str):
+        self.store.save_summary(self.job_id, self.file_hash, chunk_index, chapters, summary)
+
+    def save_tags(self, chunk_index: int, tags):
+        self.store.save_tags(self.job_id, chunk_index, tags)
+
+    def mark_written(self, chunk_indices: list):
+        self.store.mark_written(self.job_id, chunk_indices)
+
+
+class IngestionJobQueue:
+    """
+    Kolejka zadań ingestii przetwarzana przez wątek w tle.
+    Po restarcie start() wznawia niedokończone zadania od ostatniego zapisanego fragmentu.
+    """
+    def __init__(self, store: JobStore = None):
+        self.store = store or JobStore()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        with self._lock:
+            if self._worker is not None:
+                return
+            for job_id in self.store.unfinished():
+                print(f"Resuming ingestion job {job_id}")
+                self._queue.put(job_id)
+            self._worker = threading.Thread(target=self._run, name="ingestion-jobs", daemon=True)
+            self._worker.start()
+
+    def submit(self, file_path: str, model: str, pdf_reader: str, namespace: str, source_file: str = None) -> str:
+        job_id = self.store.create(file_path, model, pdf_reader, namespace, source_file)
+        self.start()
+        self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def retry(self, job_id: str) -> bool:
+        """
+        Ponownie kolejkuje nieudane zadanie; checkpointy sprawiają, że przetwarzane są tylko
+        brakujące fragmenty. Plik nieudanego zadania zostaje w TEMP_FOLDER właśnie na potrzeby retry.
+        Zwraca False, gdy zadanie nie istnieje albo nie jest nieudane.
+        """
+        job = self.store.get(job_id)
+        if job is None or job['status'] != JOB_FAILED:
+            return False
+        self.store.update(job_id, status=JOB_QUEUED)
+        self.start()
+        self._queue.put(job_id)
+        return True
+
+    def pending(self) -> int:
+        """Liczba zadań czekających na przetworzenie."""
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self._process(job_id)
+            except Exception as e:
+                print(f"Error in ingestion job {job_id}: {e}")
+                self.store.update(job_id, status=JOB_FAILED, error=str(e))
+
+    def _process(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job['status'] not in (JOB_QUEUED, JOB_RUNNING):
+            return
+
+        self.store.update(job_id, status=JOB_RUNNING)
+        checkpoint = JobCheckpoint(self.store, job_id, job['file_hash'])
+        result = ingestFile(
+            job['file_path'], job['model'], job['pdf_reader'], job['namespace'],
+            source_file=job['source_file'],
+            checkpoint=checkpoint,
+            on_progress=lambda progress: self.store.update(job_id, progress=progress.to_dict()),
+        )
+
+        # Zadanie jest gotowe dopiero, gdy każdy fragment został zapisany; w przeciwnym razie
+        # zostaje nieudane z liczbą brakujących fragmentów i można je wznowić przez retry()
+        missing = self.store.missing_chunks(job_id)
+        if isinstance(result, str):
+            self.store.update(job_id, status=JOB_FAILED, error=result)
+        elif result and missing:
+            self.store.update(job_id, status=JOB_FAILED, error=f"{missing} chunks were not written")
+        elif result:
+            self.store.update(job_id, status=JOB_DONE)
+            self._remove_file(job_id, job['file_path'])
+        else:
+            self.store.update(job_id, status=JOB_FAILED, error='File embedded unsuccessfully or nothing returned')
+
+    def _remove_file(self, job_id: str, file_path: str):
+        """Usuwa przesłany plik po udanym zadaniu, chyba że ten sam plik (ta sama treść) czeka w innym zadaniu."""
+        if self.store.file_in_use(file_path, exclude_job_id=job_id):
+            return
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not remove uploaded file {file_path}: {e}")
+
+
+_ingestion_jobs = None
+_ingestion_jobs_lock = threading.Lock()
+
+def get_ingestion_jobs() -> IngestionJobQueue:
+    """Zwraca wspólną dla procesu kolejkę zadań ingestii (magazyn SQLite jest otwierany przy pierwszym użyciu)."""
+    global _ingestion_jobs
+    with _ingestion_jobs_lock:
+        if _ingestion_jobs is None:
+            _ingestion_jobs = IngestionJobQueue()
+        return _ingestion_jobs
@@ -0,0 +1,132 @@
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain.docstore.document import Document
+
+from .utils.nltk_data import ensure_nltk_data
+from .config import PDF_PARSER_WORKERS, PDF_PARSER_PAGES_PER_TASK, OCR_DPI, OCR_LANG
+
+# Czytniki PDF, których strony są przetwarzane w puli procesów
+PARALLEL_PDF_READERS = ['PyMuPDF', 'pdfplumber', 'OCR']
+
+# 0 w konfiguracji oznacza jeden proces na rdzeń
+PARSER_WORKERS = PDF_PARSER_WORKERS or os.cpu_count() or 1
+
+
+def _extract_pymupdf(file_path: str, start: int, end: int) -> list:
+    import fitz
+
+    with fitz.open(file_path) as pdf:
+        return [pdf[page].get_text() for page in range(start, end)]
+
+
+def _extract_pdfplumber(file_path: str, start: int, end: int) -> list:
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        return [pdf.pages[page].extract_text() or '' for page in range(start, end)]
+
+
+def _extract_ocr(file_path: str, start: int, end: int) -> list:
+    import fitz
+    import pytesseract
+    from PIL import Image
+
+    # Procesy potomne nie dziedziczą konfiguracji z app.py (na Windows są uruchamiane od zera)
+    pytesseract.pytesseract.tesseract_cmd = os.getenv('TESSERACT_PATH', 'C:\\Program Files\\Tesseract-OCR')
+
+    texts = []
+    with fitz.open(file_path) as pdf:
+        for page in range(start, end):
+            pixmap = pdf[page].get_pixmap(dpi=OCR_DPI)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+            texts.append(pytesseract.image_to_string(image, lang=OCR_LANG))
+    return texts
+
+
+_EXTRACTORS = {
+    'PyMuPDF': _extract_pymupdf,
+    'pdfplumber': _extract_pdfplumber,
+    'OCR': _extract_ocr,
+}
+
+
+def _count_pymupdf(file_path: str) -> int:
+    import fitz
+
+    with fitz.open(file_path) as pdf:
+        return pdf.page_count
+
+
+def _count_pdfplumber(file_path: str) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+# Liczba stron z tej samej biblioteki, która czyta strony - pdfplumber nie wymaga PyMuPDF
+_PAGE_COUNTERS = {
+    'PyMuPDF': _count_pymupdf,
+    'pdfplumber': _count_pdfplumber,
+    'OCR': _count_pymupdf,
+}
+
+
+def page_count(file_path: str, pdfReader: str = 'PyMuPDF') -> int:
+    return _PAGE_COUNTERS[pdfReader](file_path)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_parser_pool() -> ProcessPoolExecutor:
+    """
+    Wspólna pula procesów do parsowania PDF i OCR. Procesy są uruchamiane metodą spawn: fork
+    z wielowątkowego procesu (Flask, kolejki zadań) kopiowałby zajęte blokady innych wątków.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PARSER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def lazy_parse_pdf(file_path: str, pdfReader: str):
+    """
+    Generator stron PDF (Document na stronę, w kolejności) dla czytników z PARALLEL_PDF_READERS.
+    Zakresy stron są przetwarzane równolegle w puli procesów, ale w locie jest najwyżej
+    dwa razy tyle zadań, ile procesów - pamięć nie rośnie z rozmiarem dokumentu.
+    """
+    ensure_nltk_data()
+    extractor = _EXTRACTORS[pdfReader]
+    pool = get_parser_pool()
+    total = page_count(file_path, pdfReader)
+    ranges = deque(
+        (start, min(start + PDF_PARSER_PAGES_PER_TASK, total))
+        for start in range(0, total, PDF_PARSER_PAGES_PER_TASK)
+    )
+    window = 2 * PARSER_WORKERS
+
+    in_flight = deque()
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < window:
+                start, end = ranges.popleft()
+                in_flight.append((start, pool.submit(extractor, file_path, start, end)))
+
+            start, future = in_flight.popleft()
+            for offset, text in enumerate(future.result()):
+                yield Document(page_content=text, metadata={
+                    'source': file_path,
+                    'page': start + offset,
+                    'total_pages': total,
+                    'reader': pdfReader,
+                })
+    finally:
+        # Przerwane czytanie (błąd, zamknięty generator) - nie przetwarzamy reszty stron
+        for _, future in in_flight:
+            future.cancel()
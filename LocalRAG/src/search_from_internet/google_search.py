@@ -13,6 +13,9 @@ from serpapi.google_search import GoogleSearch
 
 from ..advanced_rag import AdvancedRAG
 from ..utils import LLMProvider
+from ..utils.llm import chat_cached
+from ..utils.nltk_data import ensure_nltk_data
+from ..config import SEARCH_CACHE_TTL
 
 
 class GoogleSearchJsonAPI():
@@ -139,6 +142,7 @@ class GoogleSearchJsonAPI():
             "style",
             "noscript",
         ])
+        ensure_nltk_data()
         documents = loader.load()
         documents[0].page_content = documents[0].page_content.strip()
         return documents[0].page_content if documents else "Nie udało się pobrać treści strony."
@@ -199,7 +203,8 @@ class GoogleSearchJsonAPI():
         if self.isFormatted:
             params['format'] = 'json'
 
-        json_response = self.llm.chat(messages=[ChatMessage(role = MessageRole.SYSTEM, content = f"""
+        # Data bez godziny - inaczej klucz cache zmieniałby się co sekundę
+        json_response = chat_cached(self.llm, [ChatMessage(role = MessageRole.SYSTEM, content = f"""
         You are a JSON generator. Return ONLY a JSON array (no markdown, no extra text) containing objects with this EXACT structure:
             {{
                 "num": number, 
@@ -232,7 +237,7 @@ class GoogleSearchJsonAPI():
             15. The query should be optimised to return relevant results in a way that is natural to the user (e.g. searching for definitions rather than academic pages if the user's intent indicates this).
             16. If the user specifies an unusual query, the LLM should adapt it to the most likely search intent.
                                                         
-            ACTUAL DATE {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            ACTUAL DATE {datetime.datetime.now().strftime("%Y-%m-%d")}
         """),
         ChatMessage(role = MessageRole.USER, content = query)],  **params)
         return json_response.message.content.replace("```json", "").replace("```", "")
@@ -546,6 +551,7 @@ class GoogleSearchWithSerpAPI:
                 ".sistersitebox", ".catlinks", ".mw-jump", ".printfooter",
                 ".portal", ".navbar", "script", "style", "noscript",
             ])
+            ensure_nltk_data()
             documents = loader.load()
             if documents:
                 content = documents[0].page_content.strip()
@@ -633,8 +639,8 @@ class GoogleSearchWithSerpAPI:
                 is_similar, cached_response, similarity = self.advanced_rag.cached_db.check_similarity_cache(query)
                 
                 if is_similar and cached_response:
+                    # check_similarity_cache sam aktualizuje licznik użycia trafionego wpisu
                     print(f"Używam odpowiedzi z cache (podobieństwo: {similarity:.3f})")
-                    self.advanced_rag.cached_db.update_usage_count(query)
                     return cached_response
             except Exception as e:
                 print(f"Błąd podczas sprawdzania cache: {e}")
@@ -721,7 +727,8 @@ class GoogleSearchWithSerpAPI:
             # Zapisz do cache
             if self.advanced_rag.cached_db:
                 try:
-                    self.advanced_rag.cached_db.store_search_query_and_response(query, final_response)
+                    # Wyniki wyszukiwania szybko się dezaktualizują - krótszy czas życia wpisu
+                    self.advanced_rag.cached_db.store_search_query_and_response(query, final_response, ttl=SEARCH_CACHE_TTL)
                 except Exception as e:
                     print(f"Błąd podczas zapisywania do cache: {e}")
             
@@ -4,6 +4,8 @@ from llama_index.core.query_engine import CustomQueryEngine
 from llama_index.core.query_engine.custom import STR_OR_RESPONSE_TYPE
 from typing import ClassVar, Optional
 from ..advanced_rag import AdvancedRAG
+from ..utils.context_packer import ContextPacker
+from ..config import PROMPT_TOKEN_BUDGET
 from datetime import datetime
 from typing_extensions import List, TypedDict, Optional, Union
 import ast
@@ -54,11 +56,13 @@ class LLMQueryEngine(CustomQueryEngine):
     similarity_threshold: float = 0.7
     use_feedback: bool = True
     enable_query_expansion: bool = True
+    context_budget: int = PROMPT_TOKEN_BUDGET
+    last_context_report: dict = {}
 
     def __init__(self, model: LLM, collection_name: str = None, embedding_model: str = None, 
                  history: ChatHistoryType = [], chunk_selection_strategy: str = "llm", 
                  max_chunks: int = 3, similarity_threshold: float = 0.7, use_feedback: bool = True,
-                 enable_query_expansion: bool = True):
+                 enable_query_expansion: bool = True, context_budget: int = PROMPT_TOKEN_BUDGET):
         super().__init__(llm=model)
         self.llm = model
         self.use_feedback = use_feedback
@@ -70,6 +74,7 @@ class LLMQueryEngine(CustomQueryEngine):
         self.chunk_selection_strategy = chunk_selection_strategy
         self.max_chunks = max_chunks
         self.similarity_threshold = similarity_threshold
+        self.context_budget = context_budget
 
     def _select_relevant_chunks(self, query_str: str, chunks: list, max_chunks: int = 3) -> list:
         """Używa LLM do wyboru najbardziej relevantnych chunków dla zapytania."""
@@ -173,14 +178,10 @@ class LLMQueryEngine(CustomQueryEngine):
         if self.advanced_rag and self.use_feedback:
             feedback_context = self.get_feedback_enhanced_context(query_str, include_auto_eval=True)
         
-        # Przygotuj prompt z kontekstem
-        if feedback_context != "":
-            enhanced_prompt = f"{self.system_prompt}\n\nFeedback context:\n{feedback_context}"
-        else:
-            enhanced_prompt = f"{self.system_prompt}"
+        # Prompt systemowy - feedback jest dołączany po ułożeniu kontekstu w budżecie tokenów
+        enhanced_prompt = f"{self.system_prompt}"
 
         # Pobierz odpowiednie chunki z Advanced RAG
-        relevant_chunks = []
         selected_chunks = []
         
         if self.advanced_rag:
@@ -204,76 +205,56 @@ class LLMQueryEngine(CustomQueryEngine):
             except Exception as e:
                 print(f"Error checking collection count: {e}")
             
-            # Zbierz chunki z rozszerzonych zapytań
-            for q in expanded_queries:
-                try:
-                    chunks_result = self.advanced_rag.dynamic_chunking_db.collection.query(
-                        query_texts=[q],
-                        n_results=5  # Zwiększ liczbę wyników
-                    )
-                    # Spłaszcz zagnieżdżone listy dokumentów
-                    if chunks_result['documents'] and len(chunks_result['documents']) > 0:
-                        for doc_list in chunks_result['documents']:
-                            if doc_list:  # Sprawdź czy lista nie jest pusta
-                                relevant_chunks.extend(doc_list)
-                except Exception as e:
-                    print(f"Error querying for '{q}': {e}")
-                    continue
+            # Zbierz chunki ze wszystkich rozszerzonych zapytań naraz (jedno embeddowanie, jedno zapytanie
+            # do Chroma, wyszukiwanie hybrydowe z BM25); kandydaci są już bez duplikatów (po id chunka)
+            try:
+                unique_chunks = self.advanced_rag.retrieval.retrieve(expanded_queries)
+            except Exception as e:
+                print(f"Error querying for {expanded_queries}: {e}")
+                unique_chunks = []
             
-            print(f"Total relevant chunks collected: {len(relevant_chunks)}")
+            print(f"Unique chunks collected: {len(unique_chunks)}")
             
             # Rerankuj chunki tylko jeśli mamy jakieś
-            if relevant_chunks:
-                # Usuń duplikaty
-                unique_chunks = list(set(relevant_chunks))
-                print(f"Unique chunks after deduplication: {len(unique_chunks)}")
+            if unique_chunks:
+                ranked_chunks = self.advanced_rag.reranking_db.rerank_results(query_str, unique_chunks)
                 
-                if unique_chunks:
-                    ranked_chunks = self.advanced_rag.reranking_db.rerank_results(query_str, unique_chunks)
-                    
-                    # Użyj wybranej strategii do selekcji chunków
-                    selected_chunks = self._select_chunks_by_strategy(query_str, ranked_chunks)
-                    
-                    # Loguj informacje o selekcji (opcjonalne - można wyłączyć w produkcji)
-                    # self._log_chunk_selection(query_str, len(ranked_chunks), selected_chunks)
+                # Użyj wybranej strategii do selekcji chunków
+                selected_chunks = self._select_chunks_by_strategy(query_str, ranked_chunks)
+                
+                # Loguj informacje o selekcji (opcjonalne - można wyłączyć w produkcji)
+                # self._log_chunk_selection(query_str, len(ranked_chunks), selected_chunks)
             else:
                 print("No relevant chunks found - proceeding without context")
         
+        # Ułóż prompt w budżecie tokenów: przytnij feedback, najstarszą historię i ostatnie chunki
+        history = []
+        for message in self.history:
+            if isinstance(message, ChatMessage):
+                history.append({'role': message.role, 'content': message.content or ""})
+            elif isinstance(message, dict):
+                history.append({'role': message['role'], 'content': message['content']})
+
+        packed = ContextPacker(self.context_budget).pack(
+            system=enhanced_prompt,
+            query=query_str,
+            chunks=selected_chunks,
+            feedback=feedback_context,
+            history=history
+        )
+        selected_chunks = packed.chunks
+        self.last_context_report = packed.report
+        print("Context tokens: ", packed.report)
+
         # Generuj odpowiedź z użyciem LLM
         if isinstance(self.llm, LLM):
-            messages = [
-                ChatMessage(role=MessageRole.SYSTEM, content=enhanced_prompt),
-            ]
-            
-            # Dodaj tylko wybrane chunki jako kontekst
+            # Prompt systemowy (z feedbackiem), wybrane chunki albo informacja o braku kontekstu,
+            # historia, która zmieściła się w budżecie, i aktualne zapytanie - w postaci policzonej przez packer
             if selected_chunks:
-                context_content = "Use the following relevant context to answer the question:\n\n"
-                for i, chunk in enumerate(selected_chunks, 1):
-                    context_content += f"Context {i}:\n{chunk}\n\n"
-                
-                messages.append(ChatMessage(
-                    role=MessageRole.SYSTEM,
-                    content=context_content
-                ))
-
-                print("Context content: ", context_content)
+                print("Context content: ", packed.context_prompt())
             else:
                 print("No context available - answering based on general knowledge only")
-                # Dodaj informację że odpowiadamy bez kontekstu
-                messages.append(ChatMessage(
-                    role=MessageRole.SYSTEM,
-                    content="Note: No relevant context was found in the knowledge base. Please answer based on your general knowledge."
-                ))
-
-            # Dodaj historię zapytań i odpowiedzi
-            for message in self.history:
-                if isinstance(message, ChatMessage):
-                    messages.append(ChatMessage(role=message.role, content=message.content))
-                elif isinstance(message, dict):
-                    messages.append(ChatMessage(role=message['role'], content=message['content']))
-
-            # Dodaj aktualne zapytanie użytkownika
-            messages.append(ChatMessage(role=MessageRole.USER, content=query_str))
+            messages = [ChatMessage(role=message['role'], content=message['content']) for message in packed.messages(query_str)]
             
             try:
                 # Make the request to the LLM
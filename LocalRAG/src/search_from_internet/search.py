@@ -12,13 +12,15 @@ from ..config import MODEL, MODEL_EMBEDDINGS
 from typing import List
 
 from ..utils import LLMProvider
+from ..utils.llm import lazy_llm
+from ..utils.lazy import Lazy
 from ..utils.local_database_search import search_local_database
 from ..utils.simple_logged_agent import SimpleLoggedAgent
 
-llm, isFormatted = LLMProvider.getLLM(model = MODEL)
-memory = ChatMemoryBuffer.from_defaults(chat_history=[], llm=llm)
+llm = lazy_llm(MODEL)
+memory = Lazy(lambda: ChatMemoryBuffer.from_defaults(chat_history=[], llm=llm.get()), "chat_memory")
 
-advanced_db = get_advanced_vector_db("advanced_search", MODEL_EMBEDDINGS)
+advanced_db = Lazy(lambda: get_advanced_vector_db("advanced_search", MODEL_EMBEDDINGS), "advanced_search")
 
 def google_search(query):
     """Perform a Google search"""
@@ -123,33 +125,33 @@ local_database_search_tool = FunctionTool.from_defaults(search_local_database,
                                                        name = "local_database_search",
                                                        description = "Search for information in the local database")
 
-def searchToUser(query:str, max_iterations: int = 50, history: List[ChatHistoryType] = []):
-    try:
-        agent = SimpleLoggedAgent(
-            tools = [
-                QueryEngineTool(
-                    query_engine = LLMQueryEngine(
-                        model = llm, 
-                        collection_name="generic_llm", 
-                        embedding_model='nomic-embed-text', 
-                        history=history,
-                        use_feedback=True,
-                        enable_query_expansion=False  # Disable for faster performance
-                    ),
-                    metadata = ToolMetadata(
-                        name = "generic_llm",
-                        description = str(LLMQueryEngine.__doc__),
-                    ),
+def buildAgent(max_iterations: int = 50, history: List[ChatHistoryType] = []):
+    model = llm.get()
+    return SimpleLoggedAgent(
+        tools = [
+            QueryEngineTool(
+                query_engine = LLMQueryEngine(
+                    model = model, 
+                    collection_name="generic_llm", 
+                    embedding_model='nomic-embed-text', 
+                    history=history,
+                    use_feedback=True,
+                    enable_query_expansion=False  # Disable for faster performance
+                ),
+                metadata = ToolMetadata(
+                    name = "generic_llm",
+                    description = str(LLMQueryEngine.__doc__),
                 ),
-                internet_search_tool, 
-                wikipedia_search_tool,
-                exchange_search_tool,
-                stock_search_tool,
-                local_database_search_tool
-            ],
-            llm = llm,
-            memory = memory,
-            system_prompt = f"""
+            ),
+            internet_search_tool, 
+            wikipedia_search_tool,
+            exchange_search_tool,
+            stock_search_tool,
+            local_database_search_tool
+        ],
+        llm = model,
+        memory = memory.get(),
+        system_prompt = f"""
             Jesteś inteligentnym asystentem do wyszukiwania informacji, który działa zgodnie z metodą ReAct.
 
             Zawsze postępuj według poniższych zasad:
@@ -208,10 +210,14 @@ def searchToUser(query:str, max_iterations: int = 50, history: List[ChatHistoryT
                 "observation": "Twoja obserwacja", # tylko jeśli używasz Action
                 "final_answer": "Twoja ostateczna odpowiedź"
             }}
-            """,
-            max_iterations = max_iterations,
-            verbose = True
-        )
+        """,
+        max_iterations = max_iterations,
+        verbose = True
+    )
+
+def searchToUser(query:str, max_iterations: int = 50, history: List[ChatHistoryType] = []):
+    try:
+        agent = buildAgent(max_iterations, history)
 
         try:
             print("\n=== Executing Agent Query ===")
@@ -228,3 +234,14 @@ def searchToUser(query:str, max_iterations: int = 50, history: List[ChatHistoryT
         print(f"Error type: {type(e).__name__}")
         print(f"Error message: {str(e)}")
         return e
+
+def streamToUser(query:str, max_iterations: int = 50, history: List[ChatHistoryType] = []):
+    """Wersja searchToUser zwracająca zdarzenia agenta (kroki, tokeny odpowiedzi) w miarę ich powstawania."""
+    try:
+        agent = buildAgent(max_iterations, history)
+    except Exception as e:
+        print(f"Error building agent: {e}")
+        yield {'type': 'error', 'error': str(e)}
+        return
+
+    yield from agent.stream_query(query)
@@ -0,0 +1,112 @@
+import time
+import uuid
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import SERVE_MAX_WORKERS, SERVE_MAX_PENDING, SERVE_TASK_TTL
+
+
+class QueueFullError(Exception):
+    """Kolejka zadań jest pełna - klient powinien spróbować ponownie później (HTTP 429)."""
+    pass
+
+
+class Task:
+    def __init__(self, name: str):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'task_id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class TaskQueue:
+    """
+    Ograniczona kolejka zadań dla tras wywołujących LLM.
+    Najwyżej max_workers zadań wykonuje się naraz, a max_pending czeka w kolejce;
+    kolejne zgłoszenia są odrzucane (QueueFullError), zamiast blokować serwer.
+    Zakończone zadania są trzymane przez ttl sekund, żeby klient mógł odebrać wynik.
+    """
+    def __init__(self, max_workers: int = SERVE_MAX_WORKERS, max_pending: int = SERVE_MAX_PENDING,
+                 ttl: float = SERVE_TASK_TTL):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(0, max_pending)
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task")
+        self._tasks = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._counters = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+
+    def _cleanup(self):
+        now = time.time()
+        for task_id in [task_id for task_id, task in self._tasks.items()
+                        if task.finished_at is not None and now - task.finished_at > self.ttl]:
+            del self._tasks[task_id]
+
+    def submit(self, name: str, func, *args, **kwargs) -> Task:
+        with self._lock:
+            self._cleanup()
+            if self._active >= self.max_workers + self.max_pending:
+                self._counters['rejected'] += 1
+                raise QueueFullError(f"Task queue is full ({self._active} active)")
+            task = Task(name)
+            self._tasks[task.id] = task
+            self._active += 1
+            self._counters['submitted'] += 1
+
+        # Kontekst zgłaszającego (np. priorytet LLM ustawiony w trasie) przechodzi do wątku roboczego
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, task, func, args, kwargs)
+        return task
+
+    def _run(self, task: Task, func, args, kwargs):
+        task.status = 'running'
+        try:
+            task.result = func(*args, **kwargs)
+            task.status = 'done'
+        except Exception as e:
+            print(f"Error in task {task.name} ({task.id}): {e}")
+            task.error = str(e)
+            task.status = 'failed'
+        finally:
+            task.finished_at = time.time()
+            with self._lock:
+                self._active -= 1
+                self._counters['completed' if task.status == 'done' else 'failed'] += 1
+            task._done.set()
+
+    def get(self, task_id: str):
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                'active': self._active,
+                'capacity': self.max_workers + self.max_pending,
+                'tracked': len(self._tasks),
+            }
+
+
+task_queue = TaskQueue()
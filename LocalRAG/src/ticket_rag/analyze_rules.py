@@ -1,33 +1,26 @@
 import os, re
 from langchain_community.document_loaders import PlaywrightURLLoader
 
-from ..utils.llm import LLMProvider
+from ..utils.llm import lazy_llm, chat_cached
+from ..utils.lazy import Lazy
+from ..utils.nltk_data import ensure_nltk_data
 from ..config import MODEL, MODEL_EMBEDDINGS
-from ..utils.advanced_chroma import ChromaDBEmbeddingWrapper
+from ..utils.advanced_chroma import ChromaDBEmbeddingWrapper, chroma_registry, chroma_path
 from llama_index.core.chat_engine.types import ChatMessage
-import chromadb
-from chromadb.config import Settings
 
 # Get LLM and embedding models from LLMProvider
-llm, _ = LLMProvider.getLLM(MODEL)
-embedding_model, _ = LLMProvider.getLLM(MODEL_EMBEDDINGS)
+# Temperatura 0 - analiza regulaminu może pochodzić z cache odpowiedzi
+llm = lazy_llm(MODEL, temperature=0)
+embedding_model = lazy_llm(MODEL_EMBEDDINGS)
 
 # Create wrapped embedding function for ChromaDB
-wrapped_embedding_function = ChromaDBEmbeddingWrapper(embedding_model)
-
-# Initialize ChromaDB client
-client = chromadb.PersistentClient(
-    path=f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/discord_rules',
-    settings=Settings(
-        persist_directory=f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/discord_rules',
-        anonymized_telemetry=False,
-    )
-)
+wrapped_embedding_function = ChromaDBEmbeddingWrapper(embedding_model, MODEL_EMBEDDINGS)
+
+# Initialize ChromaDB client (shared through the process-wide registry)
+RULES_PATH = chroma_path('discord_rules')
+RULES_COLLECTION = "llm_discordRules"
 
-db = client.get_or_create_collection(
-    name="llm_discordRules",
-    embedding_function=wrapped_embedding_function
-)
+db = Lazy(lambda: chroma_registry.get_collection(RULES_PATH, RULES_COLLECTION, wrapped_embedding_function), "discord_rules")
 
 def getDiscordRules():
     try:
@@ -40,11 +33,14 @@ def getDiscordRules():
         return ingestDiscordRules()
 
 def ingestDiscordRules():
-    
+    global db
+
     urls = ["https://discord.com/guidelines"]
 
     loader = PlaywrightURLLoader(urls=urls, headless=True, remove_selectors=['.link-terms', '.link-terms > *', '.menu-numbers', '[data-animation="over-right"]', 'div.dropdown-language-name', '#onetrust-policy-text > *', '#onetrust-consent-sdk > *', '#locale-dropdown > *', '#locale-dropdown', '.locale-container', 'iframe', 'script', '* > .language', 'div.language', '.language > *', '.archived-link', '.footer-black > *', '.link-terms', '#localize-widget', '#localize-widget > *'])
 
+    # PlaywrightURLLoader dzieli HTML przez unstructured, które korzysta z NLTK
+    ensure_nltk_data()
     data = loader.load()
 
     d = data[0].page_content.split('\n\n')
@@ -65,13 +61,10 @@ def ingestDiscordRules():
     
     # Reset collection
     try:
-        client.delete_collection("llm_discordRules")
-        db = client.create_collection(
-            name="llm_discordRules",
-            embedding_function=wrapped_embedding_function
-        )
+        chroma_registry.delete_collection(RULES_PATH, RULES_COLLECTION)
     except:
         pass
+    db = Lazy(lambda: chroma_registry.get_collection(RULES_PATH, RULES_COLLECTION, wrapped_embedding_function), "discord_rules")
 
     expPoint = r"\d+\. "
     expNawias = r"(.*)(\([^\)]+\))$"
@@ -134,7 +127,7 @@ def analyzeRules(rules: str):
     prompt_user = f"Here is your rules:\n{rules}"
     
     try:
-        response = llm.chat(messages=[
+        response = chat_cached(llm, [
             ChatMessage(role="system", content=prompt_system),
             ChatMessage(role="user", content=prompt_user)
         ])
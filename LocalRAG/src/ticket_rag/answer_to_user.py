@@ -1,11 +1,13 @@
 import json
 
-from ..utils.llm import LLMProvider
+from ..utils.llm import lazy_llm, chat_cached, forget_cached
 from ..config import MODEL
 from llama_index.core.chat_engine.types import ChatMessage
 from ..utils.llm_get_tags import clean_json_string
 
-llm, _ = LLMProvider.getLLM(MODEL)
+llm = lazy_llm(MODEL)
+# Parsowanie do JSON z temperaturą 0 - powtarzalne, więc może pochodzić z cache odpowiedzi
+json_llm = lazy_llm(MODEL, temperature=0)
 
 def answerToUser(rules: str, context: str, reason: str, reportedUser: str, affectedUser: str):
     prompt_system = """
@@ -99,11 +101,12 @@ def llmJsonParser(text: str):
     """
     
     prompt_user = f"TEXT TO ANALYZE: \n{text}"
-    
-    response = llm.chat(messages=[
+    messages = [
         ChatMessage(role="system", content=prompt_system),
         ChatMessage(role="user", content=prompt_user)
-    ])
+    ]
+    
+    response = chat_cached(json_llm, messages)
     try:
         # Clean and parse JSON response
         json_text = clean_json_string(response.message.content)
@@ -113,6 +116,7 @@ def llmJsonParser(text: str):
         
     except Exception as e:
         print(f"Error in llmJsonParser: {e}")
+        forget_cached(json_llm, messages)
         return {
             "response_from_llm": response.message.content,
             "summary": "Error parsing response",
@@ -3,9 +3,7 @@ import os
 from ..utils.llm import LLMProvider
 from ..config import MODEL_EMBEDDINGS, MODEL
 from ..utils.advanced_chroma import QueryExpansionChromaDB, RerankingChromaDB, CachedChromaDB
-import chromadb
-from chromadb.config import Settings
-from ..utils.advanced_chroma import ChromaDBEmbeddingWrapper
+from ..utils.advanced_chroma import ChromaDBEmbeddingWrapper, chroma_registry, chroma_path
 
 def retrieveContext(serverId: str, text: str, namespace: str):
     try:
@@ -23,37 +21,30 @@ def retrieveContext(serverId: str, text: str, namespace: str):
         # Expand query for better search results
         expanded_queries = query_expansion_db.expand_query(text, quick_mode=True)
         
-        # Initialize ChromaDB client for basic search
-        client = chromadb.PersistentClient(
-            path=f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/dynamic-chunking',
-            settings=Settings(
-                persist_directory=f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/dynamic-chunking',
-                anonymized_telemetry=False,
-            )
-        )
-        
         # Get embedding model
         embedding_model, _ = LLMProvider.getLLM(MODEL_EMBEDDINGS)
         wrapped_embedding_function = ChromaDBEmbeddingWrapper(embedding_model)
         
-        collection = client.get_or_create_collection(
-            name=namespace,
-            embedding_function=wrapped_embedding_function
+        # Basic search collection (shared client from the registry)
+        collection = chroma_registry.get_collection(
+            chroma_path('dynamic-chunking'),
+            namespace,
+            wrapped_embedding_function
         )
         
         # Search for results using expanded queries
+        # Kandydaci niosą zapisane w Chroma wektory i id - reranking nie embedduje ich ponownie
+        include = ["documents", "metadatas", "embeddings"]
         all_results = []
         for query in expanded_queries:
             try:
                 results = collection.query(
                     query_texts=[query],
                     n_results=3,
-                    where={"namespace": serverId} if serverId else None
+                    where={"namespace": serverId} if serverId else None,
+                    include=include
                 )
-                
-                if results and results['documents'] and results['documents'][0]:
-                    for doc in results['documents'][0]:
-                        all_results.append({'text': doc, 'user_score': 0})
+                all_results.extend(reranking_db.candidates_from_query(results))
                         
             except Exception as e:
                 print(f"Error searching for query '{query}': {e}")
@@ -63,16 +54,17 @@ def retrieveContext(serverId: str, text: str, namespace: str):
         try:
             guidelines_results = collection.query(
                 query_texts=["Guidelines for community servers"],
-                n_results=2
+                n_results=2,
+                include=include
             )
-            
-            if guidelines_results and guidelines_results['documents'] and guidelines_results['documents'][0]:
-                for doc in guidelines_results['documents'][0]:
-                    all_results.append({'text': doc, 'user_score': 0})
+            all_results.extend(reranking_db.candidates_from_query(guidelines_results))
                     
         except Exception as e:
             print(f"Error searching for guidelines: {e}")
         
+        # Ten sam chunk znaleziony przez kilka zapytań trafia do rerankingu raz
+        all_results = list({candidate.get('id', candidate['text']): candidate for candidate in all_results}.values())
+        
         # Rerank results for better relevance
         if all_results:
             reranked_results = reranking_db.rerank_results(text, all_results, top_k=5)
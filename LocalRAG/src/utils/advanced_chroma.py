@@ -2,145 +2,388 @@ from chromadb.config import Settings
 import numpy as np
 import chromadb
 import json
+import os
+import time
 import uuid
 import datetime
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.output_parsers import JsonOutputParser
-from ..config import MODEL_EMBEDDINGS, MODEL
-from .llm import LLMProvider
+from ..config import (
+    MODEL_EMBEDDINGS, MODEL, RERANK_LLM_FILTER, RERANK_DECISIVE_SIMILARITY, RERANK_MAX_WORKERS,
+    HYBRID_SEARCH_ENABLED, HYBRID_CANDIDATES, COT_MAX_WORKERS, COT_DOC_TOKENS, COT_DOCS_PER_THOUGHT
+)
+from .llm import LLMProvider, lazy_llm
+from .embedding_policy import get_embedding_failure_policy
+from .cache_policy import CachePolicy
+from .collection_spec import CollectionSpec, spec_for_path
+from .bm25_index import get_bm25_index, reciprocal_rank_fusion
+from .tokens import truncate_to_tokens
 from chromadb.api.types import EmbeddingFunction, Documents, Embeddings
 from .llm_get_tags import clean_json_string
 from llama_index.core.chat_engine.types import ChatMessage
 
-model_embedding, _ = LLMProvider.getLLM(MODEL_EMBEDDINGS)
-model, _ = LLMProvider.getLLM(MODEL)
+# Modele są tworzone przy pierwszym użyciu, nie przy imporcie
+model_embedding = lazy_llm(MODEL_EMBEDDINGS)
+model = lazy_llm(MODEL)
 
 class ChromaDBEmbeddingWrapper(EmbeddingFunction[Documents]):
     """
     Wrapper class to adapt LangChain embedding functions to ChromaDB's expected interface.
     """
-    def __init__(self, langchain_embedding_function):
+    def __init__(self, langchain_embedding_function, model_name: str = None):
         self.langchain_ef = langchain_embedding_function
+        self.model_name = model_name or getattr(langchain_embedding_function, 'model', None) or MODEL_EMBEDDINGS
     
     def __call__(self, input: Documents) -> Embeddings:
         """
         ChromaDB expects this signature: __call__(self, input: Documents) -> Embeddings
         """
-        try:
-            # Use the LangChain embedding function's embed_documents method
-            embeddings = self.langchain_ef.embed_documents(input)
-            return embeddings
-        except Exception as e:
-            print(f"Error in embedding wrapper: {e}")
-            # Fallback to a simple embedding if the main one fails
-            return [[0.0] * 384 for _ in input]  # Return dummy embeddings
+        # Ponawianie i wektory zastępcze o poprawnym wymiarze obsługuje EmbeddingFailurePolicy
+        return get_embedding_failure_policy().embed(self.model_name, self.langchain_ef, list(input))
 
 # Create the wrapped embedding function
-wrapped_embedding_function = ChromaDBEmbeddingWrapper(model_embedding)
+wrapped_embedding_function = ChromaDBEmbeddingWrapper(model_embedding, MODEL_EMBEDDINGS)
+
+# Wyszukiwanie BM25 działa w tle równolegle z zapytaniem do indeksu wektorowego
+_sparse_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+CHROMA_PATH = os.getenv('CHROMA_PATH', 'chroma')
+
+def chroma_path(kind: str) -> str:
+    """Zwraca katalog persist dla danego typu bazy (re-ranking, feedback, ...) dla aktualnej pary modeli."""
+    return f'{CHROMA_PATH}/{MODEL}__{MODEL_EMBEDDINGS}/{kind}'
+
+class ChromaClientRegistry:
+    """
+    Process-wide rejestr klientów ChromaDB i uchwytów do kolekcji.
+    Każdy katalog persist jest otwierany tylko raz, a kolekcje są cache'owane
+    po kluczu (ścieżka, kolekcja, model embeddingów), więc kolejne instancje
+    AdvancedRAG i narzędzi nie otwierają ponownie SQLite ani indeksów HNSW.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients = {}
+        self._collections = {}
+        self._counters = {
+            'client_opens': 0,
+            'client_hits': 0,
+            'collection_opens': 0,
+            'collection_hits': 0,
+            'spec_mismatches': 0,
+        }
+
+    @staticmethod
+    def _normalize_path(path: str) -> str:
+        return os.path.normpath(path)
+
+    def open(self, path: str):
+        """Zwraca klienta dla katalogu persist, tworząc go tylko przy pierwszym użyciu."""
+        path = self._normalize_path(path)
+        with self._lock:
+            client = self._clients.get(path)
+            if client is not None:
+                self._counters['client_hits'] += 1
+                return client
+
+            client = chromadb.PersistentClient(
+                path = path,
+                settings = Settings(
+                    persist_directory = path,
+                    anonymized_telemetry = False,
+            ))
+            self._clients[path] = client
+            self._counters['client_opens'] += 1
+            return client
+
+    def get_collection(self, path: str, collection_name: str, embedding_function = None,
+                       embedding_model: str = MODEL_EMBEDDINGS, spec: CollectionSpec = None):
+        """
+        Zwraca (cache'owany) uchwyt do kolekcji w danym katalogu persist.
+        Nowe kolekcje są tworzone według spec (domyślnie spec_for_path: przestrzeń cosine i parametry HNSW
+        dla rodzaju bazy); istniejące o innych parametrach wymagają migrate_collections.py.
+        """
+        path = self._normalize_path(path)
+        key = (path, collection_name, embedding_model)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is not None:
+                self._counters['collection_hits'] += 1
+                return collection
+
+            client = self.open(path)
+            spec = spec or spec_for_path(path)
+            collection = client.get_or_create_collection(
+                name = collection_name,
+                embedding_function = embedding_function or wrapped_embedding_function,
+                metadata = spec.metadata()
+            )
+            differences = spec.differences(collection.metadata)
+            if differences:
+                self._counters['spec_mismatches'] += 1
+                print(f"Collection '{collection_name}' in {path} differs from its spec {differences}, run migrate_collections.py")
+            self._collections[key] = collection
+            self._counters['collection_opens'] += 1
+            return collection
+
+    def delete_collection(self, path: str, collection_name: str):
+        """Usuwa kolekcję z bazy i unieważnia wszystkie jej uchwyty w rejestrze."""
+        path = self._normalize_path(path)
+        with self._lock:
+            self._forget(path, collection_name)
+            self.open(path).delete_collection(collection_name)
+
+    def _forget(self, path: str, collection_name: str = None):
+        for key in [k for k in self._collections if k[0] == path and (collection_name is None or k[1] == collection_name)]:
+            del self._collections[key]
+
+    def close(self, path: str):
+        """Zamyka klienta dla danego katalogu i usuwa jego kolekcje z rejestru."""
+        path = self._normalize_path(path)
+        with self._lock:
+            self._forget(path)
+            client = self._clients.pop(path, None)
+            if client is not None and hasattr(client, 'close'):
+                try:
+                    client.close()
+                except Exception as e:
+                    print(f"Error closing ChromaDB client for {path}: {e}")
+
+    def find_collection(self, path: str, collection_name: str):
+        """Zwraca istniejącą kolekcję (także dotąd nieotwartą w tym procesie); nie tworzy nowej."""
+        return self.open(path).get_collection(collection_name, embedding_function = wrapped_embedding_function)
+
+    def list_collections(self):
+        """Zwraca listę (ścieżka, kolekcja) wszystkich kolekcji w otwartych katalogach persist."""
+        with self._lock:
+            clients = list(self._clients.items())
+
+        collections = []
+        for path, client in clients:
+            for collection in client.list_collections():
+                # Starsze wersje chromadb zwracają same nazwy kolekcji
+                if isinstance(collection, str):
+                    collection = client.get_collection(collection)
+                collections.append((path, collection))
+        return collections
+
+    def close_all(self):
+        with self._lock:
+            for path in list(self._clients):
+                self.close(path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                'open_clients': len(self._clients),
+                'open_collections': len(self._collections),
+                'paths': sorted(self._clients),
+            }
+
+# Jeden rejestr na cały proces
+chroma_registry = ChromaClientRegistry()
 
 class RerankingChromaDB:
+    relevance_prompt_system: str = """
+    You are an expert in text analysis and scoring similarity.
+    Your task is to evaluate the relevance of the following text to the query.
+
+    You only answer with 0 and 1, where:
+    - 1 means the text is relevant to the query
+    - 0 means the text is not relevant
+    - If you're unsure, return 0.
+
+    Answer only with 0 or 1.
+    """
+
+    batch_relevance_prompt_system: str = """
+    You are an expert in text analysis and scoring similarity.
+    Your task is to evaluate the relevance of each numbered text to the query.
+
+    Return ONLY a JSON array (no markdown, no extra text) with one object per text:
+    [{"id": 1, "score": 1}, {"id": 2, "score": 0}]
+    Where:
+    - "id" is the number of the text
+    - "score" is 1 when the text is relevant to the query, 0 when it is not
+    - If you're unsure, use 0.
+    """
+
     def __init__(self, collection_name: str, embedding_model: str):
         self.ef = wrapped_embedding_function
-        self.client = chromadb.PersistentClient(
-            path = f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/re-ranking',
-            settings = Settings(
-               persist_directory=f'{MODEL + '__' + MODEL_EMBEDDINGS}/re-ranking',
-                anonymized_telemetry=False,
-        ))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.ef
-        )
+        self.path = chroma_path('re-ranking')
+        self.client = chroma_registry.open(self.path)
+        self.collection = chroma_registry.get_collection(self.path, collection_name, self.ef, embedding_model)
         self.llm = model
 
-    def rerank_results(self, query: str, results: list, top_k: int = 5, score_weight: float = 0.2):
+    @staticmethod
+    def candidates_from_query(results: dict) -> list:
+        """
+        Spłaszcza wynik collection.query (najlepiej z include=["documents", "embeddings"])
+        do listy kandydatów {'text', 'user_score', 'id', 'embedding', 'metadata'} dla rerank_results.
+        """
+        candidates = []
+        if not results or not results.get('documents'):
+            return candidates
+
+        ids = results.get('ids') or []
+        metadatas = results.get('metadatas') or []
+        embeddings = results.get('embeddings')
+
+        for q, documents in enumerate(results['documents']):
+            for i, text in enumerate(documents or []):
+                if text is None:
+                    continue
+                candidate = {'text': text, 'user_score': 0}
+                if q < len(ids) and i < len(ids[q]):
+                    candidate['id'] = ids[q][i]
+                if q < len(metadatas) and metadatas[q] is not None and i < len(metadatas[q]):
+                    candidate['metadata'] = metadatas[q][i]
+                if embeddings is not None and q < len(embeddings) and embeddings[q] is not None and i < len(embeddings[q]):
+                    candidate['embedding'] = embeddings[q][i]
+                candidates.append(candidate)
+
+        return candidates
+
+    def rerank_results(self, query: str, results: list, top_k: int = 5, score_weight: float = 0.2, llm_filter: str = None):
         """
         Rerankuje wyniki według podobieństwa do zapytania i oceny użytkownika.
-        Dodatkowo filtruje wyniki przez LLM zgodny z llama_index (np. Ollama), bez użycia LangChain chainów.
+        Przyjmuje listę tekstów, listę kandydatów (dict z 'text', opcjonalnie 'embedding' i 'user_score')
+        albo bezpośrednio wynik collection.query z include=["embeddings"]. Zapisane w Chroma wektory
+        są używane ponownie - embeddowane są tylko teksty bez wektora (np. streszczenia stron www).
+        Dodatkowo filtruje wyniki przez LLM zgodny z llama_index (np. Ollama), bez użycia LangChain chainów:
+        llm_filter = "batch" (jedno zapytanie dla wszystkich kandydatów), "parallel" (równoległe zapytania
+        per kandydat) lub "off"; domyślnie RERANK_LLM_FILTER.
         """
+        if isinstance(results, dict) and 'documents' in results:
+            results = self.candidates_from_query(results)
+
         if not results:
             return []
 
         try:
-            query_embedding = model_embedding.embed_query(query)
+            query_embedding = np.asarray(model_embedding.embed_query(query), dtype=np.float32)
 
             texts = []
             scores = []
+            vectors = []
 
             for r in results:
                 if isinstance(r, dict):
                     texts.append(r.get('text', str(r)))
                     scores.append(float(r.get('user_score', 0)))
+                    embedding = r.get('embedding')
+                    vectors.append(embedding if embedding is not None and len(embedding) == len(query_embedding) else None)
                 elif isinstance(r, str):
                     texts.append(r)
                     scores.append(0)
+                    vectors.append(None)
                 else:
                     texts.append(str(r))
                     scores.append(0)
+                    vectors.append(None)
 
-            result_embeddings = model_embedding.embed_documents(texts)
+            # Embeddujemy tylko kandydatów bez zapisanego wektora
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing:
+                for i, embedding in zip(missing, model_embedding.embed_documents([texts[i] for i in missing])):
+                    vectors[i] = embedding
 
-            # Liczenie podobieństwa kosinusowego + waga za user_score
-            similarities = []
-            for i, result_embedding in enumerate(result_embeddings):
-                similarity = np.dot(query_embedding, result_embedding) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(result_embedding)
-                )
-                weighted_similarity = similarity + (scores[i] * score_weight)
-                similarities.append(weighted_similarity)
+            # Podobieństwo kosinusowe dla wszystkich kandydatów naraz + waga za user_score
+            matrix = np.asarray(vectors, dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            query_embedding /= max(float(np.linalg.norm(query_embedding)), 1e-12)
+            similarities = matrix @ query_embedding + np.asarray(scores, dtype=np.float32) * score_weight
 
             # Sortowanie wyników
-            ranked_results = list(zip(texts, similarities))
-            ranked_results.sort(key=lambda x: x[1], reverse=True)
-
-            reranked_texts = [text for text, _ in ranked_results[:top_k]]
-
-            # Filtracja przez LLM (ręczna interakcja z self.llm – Ollama)
-            filtered_results = []
-            for text in reranked_texts:
-                prompt_system:str = f"""
-                You are an expert in text analysis and scoring similarity.
-                Your task is to evaluate the relevance of the following text to the query.
-
-                You only answer with 0 and 1, where:
-                - 1 means the text is relevant to the query
-                - 0 means the text is not relevant
-                - If you're unsure, return 0.
-
-                Answer only with 0 or 1.
-                """
-                prompt_user:str = f"""
-                Query: {query}
-                Text: {text}
-                """
+            order = np.argsort(-similarities, kind='stable')[:top_k]
+            reranked_texts = [texts[i] for i in order]
 
-                try:
-                    response = self.llm.chat(messages = [ChatMessage(role = "system", content = prompt_system), ChatMessage(role = "user", content = prompt_user)])
-                    answer = response.message.content
-                    if answer == "1":
-                        filtered_results.append(text)
-                except Exception as e:
-                    print(f"LLM evaluation error for text: {text[:30]}... -> {e}")
+            # Filtracja przez LLM (ręczna interakcja z self.llm – Ollama).
+            # Kandydaci z podobieństwem >= decisive_similarity nie wymagają oceny LLM.
+            mode = llm_filter or RERANK_LLM_FILTER
+            if mode == 'off':
+                return reranked_texts
+
+            decisive = [float(similarities[i]) >= RERANK_DECISIVE_SIMILARITY for i in order]
+            ambiguous = [text for text, is_decisive in zip(reranked_texts, decisive) if not is_decisive]
+            if not ambiguous:
+                print("Rerank: cosine margin decisive - skipping LLM relevance filter")
+                return reranked_texts
+
+            if mode == 'parallel':
+                verdicts = self._judge_relevance_parallel(query, ambiguous)
+            else:
+                verdicts = self._judge_relevance_batch(query, ambiguous)
 
-            return filtered_results
+            verdicts = iter(verdicts)
+            return [text for text, is_decisive in zip(reranked_texts, decisive) if is_decisive or next(verdicts)]
 
         except Exception as e:
             print(f"Error in rerank_results: {e}")
             return []
 
+    def _judge_relevance(self, query: str, text: str) -> bool:
+        """Ocena jednego kandydata (0/1) przez LLM."""
+        prompt_user:str = f"""
+        Query: {query}
+        Text: {text}
+        """
+        try:
+            response = self.llm.chat(messages = [ChatMessage(role = "system", content = self.relevance_prompt_system), ChatMessage(role = "user", content = prompt_user)])
+            return str(response.message.content).strip() == "1"
+        except Exception as e:
+            print(f"LLM evaluation error for text: {text[:30]}... -> {e}")
+            return False
+
+    def _judge_relevance_parallel(self, query: str, texts: list) -> list:
+        """Ocena kandydatów osobnymi zapytaniami, z ograniczoną liczbą równoległych wywołań."""
+        if not texts:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(RERANK_MAX_WORKERS, len(texts)))) as executor:
+            return list(executor.map(lambda text: self._judge_relevance(query, text), texts))
+
+    def _judge_relevance_batch(self, query: str, texts: list) -> list:
+        """
+        Ocena wszystkich kandydatów jednym zapytaniem do LLM (JSON z listą id/score).
+        Kandydaci, dla których nie udało się odczytać oceny, są oceniani równolegle pojedynczo.
+        """
+        if len(texts) == 1:
+            return [self._judge_relevance(query, texts[0])]
+
+        prompt_user = f"Query: {query}\n\n"
+        for i, text in enumerate(texts, 1):
+            prompt_user += f"[{i}] {text}\n\n"
+
+        verdicts = {}
+        try:
+            response = self.llm.chat(messages = [ChatMessage(role = "system", content = self.batch_relevance_prompt_system), ChatMessage(role = "user", content = prompt_user)])
+            parsed = json.loads(clean_json_string(str(response.message.content)))
+            if isinstance(parsed, dict):
+                parsed = parsed.get('results', [parsed])
+            for position, item in enumerate(parsed if isinstance(parsed, list) else [], 1):
+                if isinstance(item, dict):
+                    verdicts[int(item.get('id', position))] = float(item.get('score', 0)) >= 0.5
+                else:
+                    verdicts[position] = float(item) >= 0.5
+        except Exception as e:
+            print(f"Batch LLM evaluation error, falling back to per-text evaluation: {e}")
+
+        missing = [i for i in range(1, len(texts) + 1) if i not in verdicts]
+        if missing:
+            for i, verdict in zip(missing, self._judge_relevance_parallel(query, [texts[i - 1] for i in missing])):
+                verdicts[i] = verdict
+
+        return [verdicts[i] for i in range(1, len(texts) + 1)]
+
 
 class QueryExpansionChromaDB:
     def __init__(self, collection_name: str, embedding_model: str):
         self.ef = wrapped_embedding_function
-        self.client = chromadb.PersistentClient(
-            path = f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/query-expansion',
-            settings = Settings(
-                persist_directory=f'{MODEL + '__' + MODEL_EMBEDDINGS}/query-expansion',
-                anonymized_telemetry=False,
-        ))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.ef
-        )
+        self.path = chroma_path('query-expansion')
+        self.client = chroma_registry.open(self.path)
+        self.collection = chroma_registry.get_collection(self.path, collection_name, self.ef, embedding_model)
         self.llm = model
         
     def expand_query(self, query: str, quick_mode: bool = True):
@@ -287,11 +530,13 @@ class QueryExpansionChromaDB:
             }
             
             # Zapisz do bazy - użyj oryginalnego zapytania jako dokumentu
-            self.collection.add(
-                documents=[original_query],
-                metadatas=[metadata],
-                ids=[f"expansion_{hash(original_query)}_{uuid.uuid4().hex[:8]}"]
-            )
+            ids = [f"expansion_{hash(original_query)}_{uuid.uuid4().hex[:8]}"]
+            with get_embedding_failure_policy().writing(self.path, self.collection.name, ids):
+                self.collection.add(
+                    documents=[original_query],
+                    metadatas=[metadata],
+                    ids=ids
+                )
             
             print(f"Stored expansions for query: {original_query[:50]}...")
             
@@ -321,16 +566,11 @@ class QueryExpansionChromaDB:
 class DynamicChunkingChromaDB:
     def __init__(self, collection_name: str, embedding_model: str):
         self.ef = wrapped_embedding_function
-        self.client = chromadb.PersistentClient(
-            path = f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/dynamic-chunking',
-            settings = Settings(
-                persist_directory=f'{MODEL + '__' + MODEL_EMBEDDINGS}/dynamic-chunking',
-                anonymized_telemetry=False,
-        ))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.ef
-        )
+        self.path = chroma_path('dynamic-chunking')
+        self.client = chroma_registry.open(self.path)
+        self.collection = chroma_registry.get_collection(self.path, collection_name, self.ef, embedding_model)
+        # Klucz kolekcji w indeksie BM25 - ścieżka zawiera parę modeli, tak jak katalog persist
+        self.index_key = f"{self.path}/{collection_name}"
         
     def dynamic_chunk(self, text: str, max_chunk_size: int = 512):
         sentences = text.split('.')
@@ -358,72 +598,179 @@ class DynamicChunkingChromaDB:
     def add_documents_with_chunking(self, documents: list):
         for doc in documents:
             chunks = self.dynamic_chunk(doc['text'])
-            
-            for i, chunk in enumerate(chunks):
+
+            # Wszystkie chunki dokumentu dodajemy jednym wywołaniem (embeddingi liczone partiami)
+            self._add_in_batches(
+                ids=[f"{doc['id']}_{i}" for i in range(len(chunks))],
+                documents=chunks,
+                metadatas=[{
+                    **doc['metadata'],
+                    'chunk_index': i,
+                    'total_chunks': len(chunks)
+                } for i in range(len(chunks))]
+            )
+
+    def _add_in_batches(self, ids: list, documents: list, metadatas: list):
+        """Dodaje rekordy do kolekcji w możliwie dużych partiach (ograniczonych przez max batch size Chroma)."""
+        max_batch_size = self.client.get_max_batch_size() if hasattr(self.client, 'get_max_batch_size') else len(ids)
+        max_batch_size = max(1, max_batch_size)
+        for start in range(0, len(ids), max_batch_size):
+            end = start + max_batch_size
+            with get_embedding_failure_policy().writing(self.path, self.collection.name, ids[start:end]):
                 self.collection.add(
-                    documents=[chunk],
-                    metadatas=[{
-                        **doc['metadata'],
-                        'chunk_index': i,
-                        'total_chunks': len(chunks)
-                    }],
-                    ids=[f"{doc['id']}_{i}"]
+                    ids=ids[start:end],
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end]
                 )
+            if HYBRID_SEARCH_ENABLED:
+                get_bm25_index().add(self.index_key, ids[start:end], documents[start:end])
+
+    def delete(self, ids: list = None, where: dict = None) -> int:
+        """Usuwa chunki (po id albo filtrze metadanych) z kolekcji i z indeksu BM25. Zwraca liczbę usuniętych."""
+        if ids is None:
+            ids = self.collection.get(where=where, include=[])['ids'] if where else []
+        if not ids:
+            return 0
+        for start in range(0, len(ids), 500):
+            self.collection.delete(ids=ids[start:start + 500])
+        if HYBRID_SEARCH_ENABLED:
+            get_bm25_index().delete(self.index_key, ids)
+        return len(ids)
+
+    def _sparse_query(self, queries: list, limit: int) -> list:
+        index = get_bm25_index()
+        index.sync(self.index_key, self.collection)
+        return [[doc_id for doc_id, _ in index.search(self.index_key, query, limit)] for query in queries]
+
+    def hybrid_query(self, queries, n_results: int = 5, candidates: int = HYBRID_CANDIDATES, query_embeddings: list = None) -> list:
+        """
+        Wyszukiwanie hybrydowe dla jednego zapytania albo listy wariantów: indeks wektorowy (jedno
+        zapytanie do Chroma dla wszystkich wariantów) i BM25 (dokładne trafienia numerów punktów
+        regulaminu, tickerów, nazw własnych) odpytywane równolegle po candidates wyników. Rankingi
+        wszystkich wariantów są łączone przez Reciprocal Rank Fusion, więc chunk występuje raz (po id).
+        Zwraca n_results kandydatów {'text', 'id', 'embedding', 'metadata', 'rrf_score'} gotowych do
+        RerankingChromaDB.rerank_results (zapisane wektory są używane ponownie).
+        query_embeddings: wektory wariantów policzone wcześniej (np. jednym wywołaniem embeddingów).
+        """
+        queries = [queries] if isinstance(queries, str) else list(queries)
+        if not queries:
+            return []
+        depth = max(n_results, candidates)
+        include = ['documents', 'metadatas', 'embeddings']
+
+        sparse = _sparse_executor.submit(self._sparse_query, queries, depth) if HYBRID_SEARCH_ENABLED else None
+        if query_embeddings is not None:
+            results = self.collection.query(query_embeddings=query_embeddings, n_results=depth, include=include)
+        else:
+            results = self.collection.query(query_texts=queries, n_results=depth, include=include)
+
+        by_id = {}
+        rankings = []
+        for q in range(len(results['ids'])):
+            ranking = []
+            for candidate in RerankingChromaDB.candidates_from_query({key: [results[key][q]] if results.get(key) is not None else None for key in ['ids', *include]}):
+                by_id.setdefault(candidate['id'], candidate)
+                ranking.append(candidate['id'])
+            rankings.append(ranking)
+
+        if sparse is not None:
+            try:
+                rankings.extend(sparse.result())
+            except Exception as e:
+                print(f"BM25 search error, using vector results only: {e}")
+
+        fused = reciprocal_rank_fusion(rankings)[:n_results]
+
+        # Chunki znalezione tylko przez BM25 dociągamy z Chroma razem z zapisanymi wektorami
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        if missing:
+            found = self.collection.get(ids=missing, include=include)
+            for candidate in RerankingChromaDB.candidates_from_query({
+                key: [found[key]] if found.get(key) is not None else None for key in ['ids', *include]
+            }):
+                by_id[candidate['id']] = candidate
+
+        return [{**by_id[doc_id], 'rrf_score': score} for doc_id, score in fused if doc_id in by_id]
 
 class ChainOfThoughtChromaDB:
     def __init__(self, collection_name: str, embedding_model: str):
         self.ef = wrapped_embedding_function
-        self.client = chromadb.PersistentClient(
-            path = f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/chain-of-thought',
-            settings = Settings(
-                persist_directory=f'{MODEL + '__' + MODEL_EMBEDDINGS}/chain-of-thought',
-                anonymized_telemetry=False,
-        ))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.ef
-        )
+        self.path = chroma_path('chain-of-thought')
+        self.client = chroma_registry.open(self.path)
+        self.collection = chroma_registry.get_collection(self.path, collection_name, self.ef, embedding_model)
         self.llm = model
         
-    def generate_with_cot(self, query: str, reranked_results: list = None):
-        if reranked_results == []:
+    def generate_with_cot(self, query: str, reranked_results: list = None, stream: bool = False,
+                          docs_per_thought: int = COT_DOCS_PER_THOUGHT, max_doc_tokens: int = COT_DOC_TOKENS):
+        """
+        Chain of Thought w stylu map-reduce:
+        - map: "myśl" dla każdego dokumentu (albo grupy docs_per_thought dokumentów) - wywołania równoległe,
+          najwyżej COT_MAX_WORKERS naraz, kontekst każdego dokumentu skrócony do max_doc_tokens tokenów,
+        - reduce: odpowiedź końcowa na podstawie myśli; przy stream=True zwracany jest generator fragmentów tekstu.
+        Brak wyników (None albo []) oznacza wyszukanie kontekstu we własnej kolekcji.
+        """
+        if not reranked_results:
             results = self.collection.query(
                 query_texts=[query],
                 n_results=3
             )
-            reranked_results = results['documents'][0]
-        
-        thoughts = []
-        for doc in reranked_results:
-            thought_prompt = f"""
-            Based on this context: {doc}
-            Think step by step about how to answer: {query}
-            """
-            thought = self.llm.chat(messages = [ChatMessage(role = "user", content = thought_prompt)])
-            thoughts.append(thought.message.content)
-            
+            reranked_results = results['documents'][0] if results['documents'] else []
+
+        docs = [truncate_to_tokens(str(doc.get('text', doc)) if isinstance(doc, dict) else str(doc), max_doc_tokens)
+                for doc in reranked_results]
+        docs_per_thought = max(1, docs_per_thought)
+        groups = [docs[i:i + docs_per_thought] for i in range(0, len(docs), docs_per_thought)]
+
+        thoughts = self._map_thoughts(query, groups)
+        # Gdy żadna myśl się nie udała, odpowiedź powstaje bezpośrednio z (skróconych) dokumentów
         final_prompt = f"""
         Based on these thoughts:
-        {thoughts}
+        {thoughts or docs}
         
         Provide a final answer to: {query}
         """
-        
-        return self.llm.chat(messages = [ChatMessage(role = "user", content = final_prompt)]).message.content
+        messages = [ChatMessage(role = "user", content = final_prompt)]
+
+        if stream:
+            return self._stream_reduce(messages)
+        return self.llm.chat(messages = messages).message.content
+
+    def _thought(self, query: str, docs: list):
+        context = "\n\n".join(docs)
+        thought_prompt = f"""
+            Based on this context: {context}
+            Think step by step about how to answer: {query}
+            """
+        try:
+            return self.llm.chat(messages = [ChatMessage(role = "user", content = thought_prompt)]).message.content
+        except Exception as e:
+            print(f"Chain of Thought: thought generation failed: {e}")
+            return None
+
+    def _map_thoughts(self, query: str, groups: list) -> list:
+        """Myśli dla grup dokumentów, w kolejności grup (nieudane są pomijane)."""
+        if not groups:
+            return []
+        if len(groups) == 1:
+            thoughts = [self._thought(query, groups[0])]
+        else:
+            # Każde zadanie dostaje kopię kontekstu wywołującego (priorytet zapytań do LLM)
+            contexts = [contextvars.copy_context() for _ in groups]
+            with ThreadPoolExecutor(max_workers=max(1, min(COT_MAX_WORKERS, len(groups)))) as executor:
+                thoughts = list(executor.map(lambda ctx, group: ctx.run(self._thought, query, group), contexts, groups))
+        return [thought for thought in thoughts if thought]
+
+    def _stream_reduce(self, messages: list):
+        for chunk in self.llm.stream_chat(messages = messages):
+            if chunk.delta:
+                yield chunk.delta
     
 class FeedbackChromaDB:
     def __init__(self, collection_name: str, embedding_model: str):
         self.ef = wrapped_embedding_function
-        self.client = chromadb.PersistentClient(
-            path = f'chroma/{MODEL + '__' + MODEL_EMBEDDINGS}/feedback',
-            settings = Settings(
-                persist_directory=f'{MODEL + '__' + MODEL_EMBEDDINGS}/feedback',
-                anonymized_telemetry=False,
-        ))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.ef
-        )
+        self.path = chroma_path('feedback')
+        self.client = chroma_registry.open(self.path)
+        self.collection = chroma_registry.get_collection(self.path, collection_name, self.ef, embedding_model)
         self.llm = model
         
     def evaluate_response(self, query: str, response: str):
@@ -626,11 +973,12 @@ class FeedbackChromaDB:
             ids = [response_id]
             
             # Zapisz do bazy
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            with get_embedding_failure_policy().writing(self.path, self.collection.name, ids):
+                self.collection.add(
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=ids
+                )
 
             return True
         except Exception as e:
@@ -652,11 +1000,12 @@ class FeedbackChromaDB:
             ids = [correction_id]
             
             # Zapisz do bazy
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
+            with get_embedding_failure_policy().writing(self.path, self.collection.name, ids):
+                self.collection.add(
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=ids
+                )
             
             return True
         except Exception as e:
@@ -664,21 +1013,26 @@ class FeedbackChromaDB:
             return False
 
 class CachedChromaDB:
-    def __init__(self, collection_name: str, embedding_model: str, similarity_threshold: float = 0.7):
+    """
+    Cache zapytań i odpowiedzi: w pamięci (ograniczony, z TTL) dla query_with_cache
+    oraz trwały, semantyczny w kolekcji Chroma. Rozmiar, czas życia wpisów i sposób
+    usuwania (LRU/LFU) określa CachePolicy.
+    """
+    # Ostatnie sprzątanie per kolekcja - wiele instancji współdzieli tę samą kolekcję
+    _last_sweep = {}
+    _sweep_lock = threading.Lock()
+
+    def __init__(self, collection_name: str, embedding_model: str, similarity_threshold: float = 0.7,
+                 policy: CachePolicy = None):
         self.ef = wrapped_embedding_function
-        self.client = chromadb.PersistentClient(
-            path = 'chroma/cache',
-            settings = Settings(
-                persist_directory="cache",
-                anonymized_telemetry=False,
-        ))
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.ef
-        )
-        self.cache = {}
+        self.path = f'{CHROMA_PATH}/cache'
+        self.client = chroma_registry.open(self.path)
+        self.collection = chroma_registry.get_collection(self.path, collection_name, self.ef, embedding_model)
+        self.policy = policy or CachePolicy()
+        self.cache = self.policy.memory_cache()
         self.similarity_threshold = similarity_threshold
         self.embedding_model = model_embedding
+        self._sweep_key = (self.path, collection_name)
         
     def query_with_cache(self, query: str, n_results: int = 5):
         cache_key = f"{query}_{n_results}"
@@ -694,82 +1048,97 @@ class CachedChromaDB:
         
         return results
     
+    # Wpisy zapisane z wektorem zapytania jako embeddingiem rekordu (starsze trzymały go w metadanych jako JSON)
+    CACHE_VERSION = 2
+
+    def _query_vector(self, query: str):
+        """Znormalizowany embedding zapytania albo None, gdy model embeddingów nie odpowiada."""
+        try:
+            vector = np.asarray(self.embedding_model.embed_query(query), dtype=np.float32)
+        except Exception as e:
+            print(f"Błąd podczas embeddowania zapytania do cache: {e}")
+            return None
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        return (vector / norm).tolist()
+
+    def _similarity(self, distance: float) -> float:
+        # Wektory są znormalizowane: dla przestrzeni l2 Chroma zwraca kwadrat odległości = 2 - 2*cos
+        space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        if space in ('cosine', 'ip'):
+            return 1.0 - distance
+        return 1.0 - distance / 2.0
+
+    def _lookup(self, query: str, query_vector: list = None):
+        """Najbliższe zapisane zapytanie: (id, metadane, podobieństwo) albo None."""
+        query_vector = query_vector or self._query_vector(query)
+        if query_vector is None:
+            return None
+
+        results = self.collection.query(
+            query_embeddings=[query_vector],
+            n_results=1,
+            where={"$and": [
+                {"type": "search_query"},
+                {"cache_version": self.CACHE_VERSION},
+                {"expires_at": {"$gte": time.time()}}
+            ]},
+            include=["distances", "metadatas"]
+        )
+        if not results or not results.get('ids') or not results['ids'][0]:
+            return None
+
+        return results['ids'][0][0], results['metadatas'][0][0] or {}, self._similarity(results['distances'][0][0])
+
     def check_similarity_cache(self, query: str, n_results: int = 3):
         """
         Sprawdza czy istnieje podobne zapytanie w cache z prawdopodobieństwem >= similarity_threshold.
         Zwraca (is_similar, cached_response, similarity_score) lub (False, None, 0.0)
         """
         try:
-            # Pobierz wszystkie zapisane zapytania z cache
-            all_results = self.collection.query(
-                query_texts=[query],
-                n_results=20  # Pobierz więcej wyników do porównania
-            )
-            
-            if not all_results or not all_results.get('documents') or not all_results['documents'][0]:
+            # Jeden embedding zapytania i jedno zapytanie do indeksu - próg stosowany do zwróconej odległości
+            match = self._lookup(query)
+            if match is None:
                 return False, None, 0.0
-            
-            # Generuj embedding dla aktualnego zapytania
-            query_embedding = self.embedding_model.embed_query(query)
-            
-            # Sprawdź podobieństwo z każdym zapisanym zapytaniem
-            for _, (document, metadata) in enumerate(zip(
-                all_results['documents'][0], 
-                all_results.get('metadatas', [{}])[0] if all_results.get('metadatas') else [{}]
-            )):
-                if not metadata:
-                    continue
-                    
-                # Sprawdź czy to jest zapytanie (nie odpowiedź)
-                if metadata.get('type') != 'search_query':
-                    continue
-                
-                # Pobierz embedding zapisanego zapytania
-                if 'embedding' in metadata:
-                    try:
-                        cached_embedding = json.loads(metadata['embedding'])
-                    except:
-                        continue
-                else:
-                    # Jeśli nie ma zapisanego embeddingu, wygeneruj go
-                    cached_query = metadata.get('original_query', document)
-                    cached_embedding = self.embedding_model.embed_query(cached_query)
-                
-                # Oblicz podobieństwo cosinusowe
-                similarity = np.dot(query_embedding, cached_embedding) / (
-                    np.linalg.norm(query_embedding) * np.linalg.norm(cached_embedding)
-                )
-                
-                print(f"Podobieństwo zapytania '{query[:50]}...' do '{metadata.get('original_query', document)[:50]}...': {similarity:.3f}")
-                
-                # Jeśli podobieństwo >= threshold, zwróć cached response
-                if similarity >= self.similarity_threshold:
-                    cached_response = metadata.get('cached_response', '')
-                    print(f"Znaleziono podobne zapytanie w cache (podobieństwo: {similarity:.3f})")
-                    return True, cached_response, similarity
-            
+
+            _, metadata, similarity = match
+            print(f"Podobieństwo zapytania '{query[:50]}...' do '{metadata.get('original_query', '')[:50]}...': {similarity:.3f}")
+
+            if similarity >= self.similarity_threshold:
+                cached_response = metadata.get('cached_response', '')
+                print(f"Znaleziono podobne zapytanie w cache (podobieństwo: {similarity:.3f})")
+                self._touch(*match[:2])
+                return True, cached_response, similarity
+
             return False, None, 0.0
             
         except Exception as e:
             print(f"Błąd podczas sprawdzania cache: {e}")
             return False, None, 0.0
     
-    def store_search_query_and_response(self, query: str, response: str):
+    def store_search_query_and_response(self, query: str, response: str, ttl: float = None):
         """
         Zapisuje zapytanie i odpowiedź do cache dla przyszłych porównań.
+        ttl (s) nadpisuje domyślny czas życia wpisu z polityki (np. krótszy dla wyników wyszukiwania).
         """
         try:
-            # Generuj embedding dla zapytania
-            query_embedding = self.embedding_model.embed_query(query)
+            # Wektor zapytania trafia do indeksu jako embedding rekordu
+            query_embedding = self._query_vector(query)
+            if query_embedding is None:
+                return False
             
             # Przygotuj metadane
+            now = time.time()
             metadata = {
                 'type': 'search_query',
+                'cache_version': self.CACHE_VERSION,
                 'original_query': query,
                 'cached_response': response,
-                'embedding': json.dumps(query_embedding),
                 'timestamp': datetime.datetime.now().isoformat(),
-                'usage_count': 1
+                'usage_count': 1,
+                'last_used': now,
+                'expires_at': self.policy.expires_at(ttl, now)
             }
             
             # Generuj unikalny ID
@@ -778,11 +1147,13 @@ class CachedChromaDB:
             # Zapisz do bazy
             self.collection.add(
                 documents=[query],
+                embeddings=[query_embedding],
                 metadatas=[metadata],
                 ids=[search_id]
             )
             
             print(f"Zapisano zapytanie do cache: '{query[:50]}...'")
+            self.enforce_policy()
             return True
             
         except Exception as e:
@@ -795,42 +1166,90 @@ class CachedChromaDB:
         """
         try:
             # Znajdź podobne zapytanie
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=1
-            )
-            
-            if results and results.get('metadatas') and results['metadatas'][0]:
-                metadata = results['metadatas'][0][0]
-                if metadata.get('type') == 'search_query':
-                    # Zwiększ licznik użycia
-                    current_count = int(metadata.get('usage_count', 0))
-                    metadata['usage_count'] = current_count + 1
-                    
-                    # Aktualizuj w bazie (ChromaDB nie ma bezpośredniej metody update, więc usuwamy i dodajemy ponownie)
-                    doc_id = results['ids'][0][0]
-                    self.collection.delete(ids=[doc_id])
-                    self.collection.add(
-                        documents=[results['documents'][0][0]],
-                        metadatas=[metadata],
-                        ids=[doc_id]
-                    )
-                    
-                    print(f"Zaktualizowano licznik użycia dla zapytania (nowa wartość: {metadata['usage_count']})")
+            match = self._lookup(query)
+            if match is None:
+                return
+
+            self._touch(*match[:2])
                     
         except Exception as e:
             print(f"Błąd podczas aktualizacji licznika użycia: {e}")
+
+    def _touch(self, doc_id: str, metadata: dict):
+        """Zwiększa usage_count i ustawia last_used (dla LRU/LFU) bez przeliczania embeddingu."""
+        try:
+            usage_count = int(metadata.get('usage_count', 0)) + 1
+            # Aktualizacja w miejscu - usunięcie i ponowne dodanie przeliczałoby embedding z tekstu
+            self.collection.update(ids=[doc_id], metadatas=[{'usage_count': usage_count, 'last_used': time.time()}])
+            print(f"Zaktualizowano licznik użycia dla zapytania (nowa wartość: {usage_count})")
+        except Exception as e:
+            print(f"Błąd podczas aktualizacji licznika użycia: {e}")
+
+    def enforce_policy(self, force: bool = False) -> int:
+        """
+        Usuwa wpisy przeterminowane, nadmiarowe (LRU/LFU) i stare wpisy bez wektora zapytania.
+        Bez force działa najwyżej raz na sweep_interval, chyba że kolekcja przekroczyła limit.
+        Zwraca liczbę usuniętych wpisów.
+        """
+        now = time.time()
+        with CachedChromaDB._sweep_lock:
+            last_sweep = CachedChromaDB._last_sweep.get(self._sweep_key, 0.0)
+            over_limit = bool(self.policy.max_entries) and self.collection.count() > self.policy.max_entries
+            if not force and not over_limit and now - last_sweep < self.policy.sweep_interval:
+                return 0
+            CachedChromaDB._last_sweep[self._sweep_key] = now
+
+        try:
+            # Tylko metadane - bez dokumentów i wektorów
+            results = self.collection.get(include=["metadatas"])
+            entries = []
+            legacy = []
+            missing_expiry = {}
+            for doc_id, metadata in zip(results['ids'], results['metadatas']):
+                metadata = metadata or {}
+                if metadata.get('cache_version') != self.CACHE_VERSION:
+                    # Wpisy sprzed wersji 2 trzymały embedding jako JSON w metadanych i nie są już odpytywane
+                    legacy.append(doc_id)
+                    continue
+                if 'expires_at' not in metadata:
+                    metadata = {**metadata, 'expires_at': self.policy.expires_at(now=self._created_at(metadata, now))}
+                    missing_expiry[doc_id] = metadata['expires_at']
+                entries.append((doc_id, metadata))
+
+            to_delete = legacy + self.policy.select_evictions(entries, now)
+            for start in range(0, len(to_delete), 500):
+                self.collection.delete(ids=to_delete[start:start + 500])
+
+            # Wpisy bez expires_at nie przechodzą filtra w _lookup - uzupełniamy je
+            deleted = set(to_delete)
+            backfill = [(doc_id, expires_at) for doc_id, expires_at in missing_expiry.items() if doc_id not in deleted]
+            if backfill:
+                self.collection.update(
+                    ids=[doc_id for doc_id, _ in backfill],
+                    metadatas=[{'expires_at': expires_at, 'last_used': expires_at - self.policy.ttl} for _, expires_at in backfill]
+                )
+
+            if to_delete:
+                print(f"Usunięto {len(to_delete)} wpisów z cache ({len(legacy)} w starym formacie)")
+            return len(to_delete)
+        except Exception as e:
+            print(f"Błąd podczas sprzątania cache: {e}")
+            return 0
+
+    @staticmethod
+    def _created_at(metadata: dict, default: float) -> float:
+        try:
+            return datetime.datetime.fromisoformat(metadata['timestamp']).timestamp()
+        except Exception:
+            return default
     
     def get_cache_stats(self):
         """
         Zwraca statystyki cache'u.
         """
         try:
-            # Pobierz wszystkie wpisy
-            all_results = self.collection.query(
-                query_texts=[""],
-                n_results=1000
-            )
+            # Pobierz metadane wszystkich wpisów (bez embeddowania pustego zapytania)
+            all_results = self.collection.get(include=["metadatas"])
             
             if not all_results or not all_results.get('metadatas'):
                 return {
@@ -841,16 +1260,22 @@ class CachedChromaDB:
             
             search_queries = []
             total_usage = 0
+            expired = 0
+            now = time.time()
             
-            for metadata in all_results['metadatas'][0]:
+            for metadata in all_results['metadatas']:
                 if metadata and metadata.get('type') == 'search_query':
                     search_queries.append(metadata)
                     total_usage += int(metadata.get('usage_count', 0))
+                    expired += self.policy.is_expired(metadata, now)
             
             return {
                 'total_queries': len(search_queries),
                 'total_usage': total_usage,
-                'average_usage': total_usage / len(search_queries) if search_queries else 0
+                'average_usage': total_usage / len(search_queries) if search_queries else 0,
+                'expired': expired,
+                'memory_items': len(self.cache),
+                'policy': self.policy.stats()
             }
             
         except Exception as e:
@@ -0,0 +1,204 @@
+import os
+import re
+import math
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+
+from ..config import BM25_INDEX_PATH, BM25_K1, BM25_B, RRF_K
+
+# Słowa z liter/cyfr dowolnego alfabetu (także polskie znaki), łączone kropką, myślnikiem lub ukośnikiem:
+# "§5.2", "PKN-ORLEN", "12/2024" zostają jednym tokenem, a ich części są dodawane osobno
+_TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/]\w+)*")
+_TOKEN_SEPARATORS = re.compile(r"[.\-/]")
+
+
+def tokenize(text: str) -> list:
+    """Tokeny do BM25: normalizacja Unicode (NFC), małe litery, bez stemmingu (odmianę obsługuje wyszukiwanie wektorowe)."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(unicodedata.normalize('NFC', str(text)).lower()):
+        tokens.append(token)
+        if _TOKEN_SEPARATORS.search(token):
+            tokens.extend(part for part in _TOKEN_SEPARATORS.split(token) if part)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> list:
+    """
+    Łączy rankingi (listy id od najlepszego) metodą Reciprocal Rank Fusion: score = sum(1 / (k + pozycja)).
+    Zwraca listę (id, score) posortowaną malejąco; przy remisie wygrywa wcześniejszy ranking.
+    """
+    scores = {}
+    for ranking in rankings:
+        for position, item_id in enumerate(ranking, 1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + position)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class BM25Index:
+    """
+    Trwały indeks słów kluczowych (BM25) dla chunków z kolekcji Chroma, w SQLite obok baz Chroma.
+    Indeks jest aktualizowany przyrostowo przy dodawaniu i usuwaniu chunków; kolekcje zapisane przed
+    jego wprowadzeniem są indeksowane przy pierwszym wyszukiwaniu (sync). Tekst chunków zostaje w Chroma,
+    tutaj trzymane są tylko długości dokumentów i listy wystąpień termów.
+    """
+    def __init__(self, path: str = BM25_INDEX_PATH, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._synced = set()
+        self._counters = {'searches': 0, 'indexed': 0, 'deleted': 0, 'rebuilds': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_docs (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bm25_postings (
+                collection TEXT NOT NULL,
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (collection, term, doc_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bm25_postings_doc ON bm25_postings (collection, doc_id)")
+        self._conn.commit()
+
+    def _delete(self, collection: str, ids: list):
+        deleted = 0
+        # SQLite ma limit parametrów w zapytaniu, więc usuwamy partiami
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            self._conn.execute(f"DELETE FROM bm25_postings WHERE collection = ? AND doc_id IN ({placeholders})", [collection, *batch])
+            deleted += self._conn.execute(f"DELETE FROM bm25_docs WHERE collection = ? AND doc_id IN ({placeholders})", [collection, *batch]).rowcount
+        return deleted
+
+    def _insert(self, collection: str, ids: list, texts: list):
+        self._delete(collection, ids)
+        docs = []
+        postings = []
+        for doc_id, text in zip(ids, texts):
+            tokens = tokenize(text or '')
+            docs.append((collection, doc_id, len(tokens)))
+            postings.extend((collection, term, doc_id, tf) for term, tf in Counter(tokens).items())
+        self._conn.executemany("INSERT INTO bm25_docs (collection, doc_id, length) VALUES (?, ?, ?)", docs)
+        self._conn.executemany("INSERT INTO bm25_postings (collection, term, doc_id, tf) VALUES (?, ?, ?, ?)", postings)
+        return len(docs)
+
+    def add(self, collection: str, ids: list, texts: list):
+        """Dodaje (lub zastępuje) chunki o podanych id."""
+        if not ids:
+            return
+        with self._lock:
+            self._counters['indexed'] += self._insert(collection, list(ids), list(texts))
+            self._conn.commit()
+
+    def delete(self, collection: str, ids: list):
+        if not ids:
+            return
+        with self._lock:
+            self._counters['deleted'] += self._delete(collection, list(ids))
+            self._conn.commit()
+
+    def count(self, collection: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM bm25_docs WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def sync(self, collection: str, chroma_collection, batch_size: int = 500) -> bool:
+        """
+        Raz na proces porównuje liczbę chunków z kolekcją Chroma i przy rozbieżności przebudowuje
+        indeks z jej zawartości (np. kolekcje sprzed indeksu BM25). Zwraca True, jeśli przebudowano.
+        """
+        if collection in self._synced:
+            return False
+        with self._lock:
+            if collection in self._synced:
+                return False
+            total = chroma_collection.count()
+            if self.count(collection) == total:
+                self._synced.add(collection)
+                return False
+
+            self._conn.execute("DELETE FROM bm25_postings WHERE collection = ?", (collection,))
+            self._conn.execute("DELETE FROM bm25_docs WHERE collection = ?", (collection,))
+            offset = 0
+            while offset < total:
+                batch = chroma_collection.get(include=['documents'], limit=batch_size, offset=offset)
+                if not batch['ids']:
+                    break
+                self._insert(collection, batch['ids'], batch['documents'])
+                offset += len(batch['ids'])
+            self._conn.commit()
+            self._counters['rebuilds'] += 1
+            self._synced.add(collection)
+            print(f"BM25: rebuilt index for '{collection}' ({offset} chunks)")
+            return True
+
+    def search(self, collection: str, query: str, limit: int = 10) -> list:
+        """Zwraca listę (doc_id, score) najlepiej pasujących chunków."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        placeholders = ','.join('?' * len(terms))
+        with self._lock:
+            self._counters['searches'] += 1
+            total, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM bm25_docs WHERE collection = ?", (collection,)
+            ).fetchone()
+            if not total:
+                return []
+            document_frequency = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM bm25_postings WHERE collection = ? AND term IN ({placeholders}) GROUP BY term",
+                [collection, *terms]
+            ).fetchall())
+            rows = self._conn.execute(
+                f"""SELECT p.term, p.doc_id, p.tf, d.length FROM bm25_postings p
+                    JOIN bm25_docs d ON d.collection = p.collection AND d.doc_id = p.doc_id
+                    WHERE p.collection = ? AND p.term IN ({placeholders})""",
+                [collection, *terms]
+            ).fetchall()
+
+        avg_length = avg_length or 1.0
+        scores = {}
+        for term, doc_id, tf, length in rows:
+            df = document_frequency[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                'collections': self._conn.execute("SELECT COUNT(DISTINCT collection) FROM bm25_docs").fetchone()[0],
+                'documents': self._conn.execute("SELECT COUNT(*) FROM bm25_docs").fetchone()[0],
+                'path': self.path,
+            }
+
+
+_bm25_index = None
+_bm25_index_lock = threading.Lock()
+
+def get_bm25_index() -> BM25Index:
+    """Zwraca wspólny dla procesu BM25Index (tworzony przy pierwszym użyciu)."""
+    global _bm25_index
+    with _bm25_index_lock:
+        if _bm25_index is None:
+            _bm25_index = BM25Index()
+        return _bm25_index
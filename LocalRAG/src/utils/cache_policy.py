@@ -0,0 +1,114 @@
+import time
+import threading
+from collections import OrderedDict
+
+from ..config import (
+    SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_EVICTION,
+    SEMANTIC_CACHE_SWEEP_INTERVAL, SEMANTIC_CACHE_MEMORY_ITEMS, SEMANTIC_CACHE_MEMORY_TTL
+)
+
+_MISSING = object()
+
+
+class BoundedTTLCache:
+    """Słownik w pamięci z limitem wpisów (LRU) i czasem życia wpisu."""
+    def __init__(self, max_items: int, ttl: float = None):
+        self.max_items = max(1, max_items)
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default = None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.time() + self.ttl if self.ttl else None)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class CachePolicy:
+    """
+    Zasady utrzymania trwałego cache (kolekcja Chroma z zapytaniami i odpowiedziami):
+    - każdy wpis ma expires_at (domyślny ttl albo własny, np. krótszy dla wyników wyszukiwania),
+    - powyżej max_entries usuwane są wpisy najdawniej używane ('lru', według last_used)
+      albo najrzadziej używane ('lfu', według usage_count, potem last_used),
+    - sprzątanie jest wykonywane najwyżej raz na sweep_interval sekund albo po przekroczeniu limitu.
+    """
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, ttl: float = SEMANTIC_CACHE_TTL,
+                 eviction: str = SEMANTIC_CACHE_EVICTION, sweep_interval: float = SEMANTIC_CACHE_SWEEP_INTERVAL,
+                 memory_items: int = SEMANTIC_CACHE_MEMORY_ITEMS, memory_ttl: float = SEMANTIC_CACHE_MEMORY_TTL):
+        if eviction not in ('lru', 'lfu'):
+            raise ValueError(f"Unknown cache eviction strategy '{eviction}', use 'lru' or 'lfu'")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.eviction = eviction
+        self.sweep_interval = sweep_interval
+        self.memory_items = memory_items
+        self.memory_ttl = memory_ttl
+
+    def memory_cache(self) -> BoundedTTLCache:
+        return BoundedTTLCache(self.memory_items, self.memory_ttl)
+
+    def expires_at(self, ttl: float = None, now: float = None) -> float:
+        return (now or time.time()) + (self.ttl if ttl is None else ttl)
+
+    @staticmethod
+    def is_expired(metadata: dict, now: float) -> bool:
+        expires_at = metadata.get('expires_at')
+        return expires_at is not None and float(expires_at) < now
+
+    def _eviction_key(self, metadata: dict):
+        last_used = float(metadata.get('last_used', 0))
+        if self.eviction == 'lfu':
+            return (int(metadata.get('usage_count', 0)), last_used)
+        return (last_used,)
+
+    def select_evictions(self, entries: list, now: float = None) -> list:
+        """entries: lista (id, metadane); zwraca id do usunięcia - przeterminowane i nadmiarowe."""
+        now = now or time.time()
+        expired = [entry_id for entry_id, metadata in entries if self.is_expired(metadata, now)]
+        alive = [(entry_id, metadata) for entry_id, metadata in entries if not self.is_expired(metadata, now)]
+
+        overflow = len(alive) - self.max_entries if self.max_entries else 0
+        if overflow <= 0:
+            return expired
+
+        alive.sort(key=lambda entry: self._eviction_key(entry[1]))
+        return expired + [entry_id for entry_id, _ in alive[:overflow]]
+
+    def stats(self):
+        return {
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'eviction': self.eviction,
+            'memory_items': self.memory_items,
+            'memory_ttl': self.memory_ttl,
+        }
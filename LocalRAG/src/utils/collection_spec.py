@@ -0,0 +1,110 @@
+import os
+import json
+
+from ..config import CHROMA_COLLECTION_SPECS
+
+
+class CollectionSpec:
+    """
+    Parametry indeksu HNSW kolekcji Chroma: przestrzeń odległości i kompromis jakość/szybkość.
+    - M: liczba sąsiadów w grafie (więcej = lepszy recall, większy indeks),
+    - construction_ef / search_ef: szerokość przeszukiwania przy budowie / zapytaniu,
+    - batch_size / sync_threshold: co ile wpisów indeks jest aktualizowany / zapisywany na dysk.
+    Parametry są zapisywane w metadanych kolekcji (klucze hnsw:*), działają w chromadb 0.5 i 1.x.
+    """
+    FIELDS = ('space', 'M', 'construction_ef', 'search_ef', 'batch_size', 'sync_threshold')
+
+    def __init__(self, space: str = 'cosine', M: int = 16, construction_ef: int = 100, search_ef: int = 50,
+                 batch_size: int = 100, sync_threshold: int = 1000):
+        self.space = space
+        self.M = M
+        self.construction_ef = construction_ef
+        self.search_ef = search_ef
+        self.batch_size = batch_size
+        self.sync_threshold = sync_threshold
+
+    def replace(self, **overrides) -> 'CollectionSpec':
+        unknown = set(overrides) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown collection spec fields: {sorted(unknown)}")
+        return CollectionSpec(**{**self.to_dict(), **overrides})
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def metadata(self) -> dict:
+        return {f"hnsw:{field}": value for field, value in self.to_dict().items()}
+
+    def differences(self, metadata: dict) -> dict:
+        """Parametry, którymi istniejąca kolekcja różni się od specyfikacji: {pole: (jest, powinno być)}."""
+        metadata = metadata or {}
+        # Kolekcje utworzone bez parametrów mają domyślną przestrzeń l2
+        current = {'space': 'l2', **{key[len('hnsw:'):]: value for key, value in metadata.items() if key.startswith('hnsw:')}}
+        return {
+            field: (current.get(field), value)
+            for field, value in self.to_dict().items()
+            if current.get(field) != value
+        }
+
+    def __repr__(self):
+        return f"CollectionSpec({', '.join(f'{k}={v!r}' for k, v in self.to_dict().items())})"
+
+
+DEFAULT_SPEC = CollectionSpec()
+
+# Specyfikacje według rodzaju bazy (ostatni człon ścieżki z chroma_path):
+# duże kolekcje dokumentów - lepszy recall, cache zapytań - najmniejsze opóźnienie
+COLLECTION_SPECS = {
+    'documents': DEFAULT_SPEC.replace(M=32, construction_ef=200, search_ef=100, batch_size=500, sync_threshold=2000),
+    'dynamic-chunking': DEFAULT_SPEC.replace(M=32, construction_ef=200, search_ef=100, batch_size=500, sync_threshold=2000),
+    'cache': DEFAULT_SPEC.replace(search_ef=40),
+}
+
+# Nadpisania z konfiguracji, np. CHROMA_COLLECTION_SPECS='{"documents": {"search_ef": 200}}'
+for _kind, _overrides in json.loads(CHROMA_COLLECTION_SPECS or '{}').items():
+    COLLECTION_SPECS[_kind] = COLLECTION_SPECS.get(_kind, DEFAULT_SPEC).replace(**_overrides)
+
+
+def spec_for_path(path: str) -> CollectionSpec:
+    """Specyfikacja dla katalogu persist - rodzaj bazy to ostatni człon ścieżki."""
+    kind = os.path.basename(os.path.normpath(path))
+    return COLLECTION_SPECS.get(kind, COLLECTION_SPECS.get('default', DEFAULT_SPEC))
+
+
+def migrate_collection(client, collection, spec: CollectionSpec, batch_size: int = 500) -> int:
+    """
+    Przebudowuje kolekcję zgodnie ze spec: kopiuje rekordy (wraz z wektorami - bez ponownego
+    embeddowania) do nowej kolekcji, usuwa starą i nadaje nowej jej nazwę. Zwraca liczbę rekordów.
+    """
+    name = collection.name
+    tmp_name = f"{name}-migrating"
+    try:
+        client.delete_collection(tmp_name)
+    except Exception:
+        pass
+
+    # Metadane użytkownika zostają, parametry indeksu pochodzą ze specyfikacji
+    metadata = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith('hnsw:')}
+    target = client.create_collection(name=tmp_name, metadata={**metadata, **spec.metadata()}, embedding_function=None)
+
+    copied = 0
+    total = collection.count()
+    while copied < total:
+        batch = collection.get(include=['embeddings', 'documents', 'metadatas'], limit=batch_size, offset=copied)
+        if not batch['ids']:
+            break
+        target.add(
+            ids=batch['ids'],
+            embeddings=batch['embeddings'],
+            documents=batch['documents'],
+            metadatas=batch['metadatas'],
+        )
+        copied += len(batch['ids'])
+
+    if target.count() != total:
+        client.delete_collection(tmp_name)
+        raise RuntimeError(f"Migration of '{name}' copied {target.count()} of {total} records, original kept")
+
+    client.delete_collection(name)
+    target.modify(name=name)
+    return copied
@@ -0,0 +1,145 @@
+from ..config import PROMPT_TOKEN_BUDGET, PROMPT_FEEDBACK_SHARE, PROMPT_HISTORY_SHARE
+from .tokens import count_tokens, truncate_to_tokens
+
+# Przybliżony narzut szablonu czatu na jedną wiadomość (rola, separatory)
+MESSAGE_OVERHEAD = 4
+
+# Teksty dodawane wokół sekcji promptu - liczone do budżetu razem z treścią
+FEEDBACK_HEADER = "\n\nFeedback context:\n"
+CONTEXT_INTRO = "Use the following relevant context to answer the question:\n\n"
+NO_CONTEXT_NOTE = "Note: No relevant context was found in the knowledge base. Please answer based on your general knowledge."
+
+
+def format_chunk(index: int, chunk: str) -> str:
+    return f"Context {index}:\n{chunk}\n\n"
+
+
+class PackedContext:
+    """Wynik ContextPacker.pack: przycięte sekcje promptu i raport z liczbą tokenów każdej sekcji."""
+    def __init__(self, system: str, feedback: str, chunks: list, history: list, report: dict):
+        self.system = system
+        self.feedback = feedback
+        self.chunks = chunks
+        self.history = history
+        self.report = report
+
+    def system_prompt(self) -> str:
+        return f"{self.system}{FEEDBACK_HEADER}{self.feedback}" if self.feedback else self.system
+
+    def context_prompt(self) -> str:
+        """Wiadomość z chunkami (wstęp i numerowane bloki) albo informacja o braku kontekstu."""
+        if not self.chunks:
+            return NO_CONTEXT_NOTE
+        return CONTEXT_INTRO + "".join(format_chunk(i, chunk) for i, chunk in enumerate(self.chunks, 1))
+
+    def messages(self, query: str) -> list:
+        """Wiadomości promptu w kolejności: system, kontekst, historia, pytanie - dokładnie to, co policzono w raporcie."""
+        return [
+            {'role': 'system', 'content': self.system_prompt()},
+            {'role': 'system', 'content': self.context_prompt()},
+            *self.history,
+            {'role': 'user', 'content': query},
+        ]
+
+
+class ContextPacker:
+    """
+    Układa prompt w budżecie tokenów (budget = cały prompt, bez odpowiedzi modelu).
+    Liczone są teksty w postaci wysyłanej do modelu (PackedContext.messages): z nagłówkiem feedbacku,
+    wstępem kontekstu i nagłówkiem każdego chunka, a bez chunków - z informacją o braku kontekstu.
+    Prompt systemowy i pytanie użytkownika są zawsze w całości, pozostały budżet jest dzielony:
+    - feedback (najmniej wartościowy) dostaje najwyżej feedback_share, historia najwyżej history_share,
+    - chunki (w kolejności rankingu) dostają resztę - całe, a ostatni mieszczący się jest skracany,
+    - niewykorzystany budżet chunków wraca do historii, a potem do feedbacku.
+    Z historii zostają najnowsze wiadomości; z feedbacku - jego początek (najbardziej podobne interakcje).
+    """
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET, feedback_share: float = PROMPT_FEEDBACK_SHARE,
+                 history_share: float = PROMPT_HISTORY_SHARE, min_chunk_tokens: int = 64):
+        self.budget = budget
+        self.feedback_share = feedback_share
+        self.history_share = history_share
+        self.min_chunk_tokens = min_chunk_tokens
+
+    @staticmethod
+    def _fit_chunks(chunks: list, budget: int, min_tokens: int):
+        """Chunki w jednej wiadomości: wstęp + bloki "Context i:" - każdy blok liczony z nagłówkiem."""
+        packed = []
+        used = count_tokens(CONTEXT_INTRO) + MESSAGE_OVERHEAD
+        truncated = 0
+        for index, chunk in enumerate(chunks, 1):
+            tokens = count_tokens(format_chunk(index, chunk))
+            if used + tokens <= budget:
+                packed.append(chunk)
+                used += tokens
+                continue
+            left = budget - used - count_tokens(format_chunk(index, ""))
+            if left >= min_tokens:
+                chunk = truncate_to_tokens(chunk, left)
+                packed.append(chunk)
+                used += count_tokens(format_chunk(index, chunk))
+                truncated += 1
+            break
+        if not packed:
+            # Zamiast kontekstu idzie informacja o jego braku
+            return packed, count_tokens(NO_CONTEXT_NOTE) + MESSAGE_OVERHEAD, truncated
+        return packed, used, truncated
+
+    @staticmethod
+    def _fit_history(history: list, budget: int):
+        """Najnowsze wiadomości mieszczące się w budżecie; pojedyncza za długa wiadomość jest skracana."""
+        packed = []
+        used = 0
+        for message in reversed(history):
+            tokens = count_tokens(message['content']) + MESSAGE_OVERHEAD
+            if used + tokens > budget:
+                left = budget - used - MESSAGE_OVERHEAD
+                if not packed and left > 0:
+                    content = truncate_to_tokens(message['content'], left)
+                    packed.append({**message, 'content': content})
+                    used += count_tokens(content) + MESSAGE_OVERHEAD
+                break
+            packed.append(message)
+            used += tokens
+        return packed[::-1], used
+
+    def pack(self, system: str, query: str, chunks: list = None, feedback: str = "", history: list = None) -> PackedContext:
+        """
+        chunks: teksty w kolejności od najlepszego; history: lista {'role', 'content'} od najstarszej.
+        """
+        chunks = chunks or []
+        history = history or []
+
+        system_tokens = count_tokens(system) + MESSAGE_OVERHEAD
+        query_tokens = count_tokens(query) + MESSAGE_OVERHEAD
+        remaining = max(0, self.budget - system_tokens - query_tokens)
+
+        feedback_tokens = count_tokens(FEEDBACK_HEADER + feedback) if feedback else 0
+        history_tokens = sum(count_tokens(message['content']) + MESSAGE_OVERHEAD for message in history)
+        feedback_reserve = min(feedback_tokens, int(remaining * self.feedback_share))
+        history_reserve = min(history_tokens, int(remaining * self.history_share))
+
+        packed_chunks, chunks_used, chunks_truncated = self._fit_chunks(
+            chunks, remaining - feedback_reserve - history_reserve, self.min_chunk_tokens
+        )
+
+        # Budżet niewykorzystany przez chunki przechodzi na historię, potem na feedback
+        left = remaining - chunks_used
+        packed_history, history_used = self._fit_history(history, min(history_tokens, left - feedback_reserve))
+        left -= history_used
+        packed_feedback = truncate_to_tokens(feedback, left - count_tokens(FEEDBACK_HEADER)) if feedback else ""
+        feedback_used = count_tokens(FEEDBACK_HEADER + packed_feedback) if packed_feedback else 0
+
+        report = {
+            'budget': self.budget,
+            'system': system_tokens,
+            'query': query_tokens,
+            'feedback': feedback_used,
+            'chunks': chunks_used,
+            'history': history_used,
+            'total': system_tokens + query_tokens + feedback_used + chunks_used + history_used,
+            'dropped_chunks': len(chunks) - len(packed_chunks),
+            'truncated_chunks': chunks_truncated,
+            'dropped_history': len(history) - len(packed_history),
+            'feedback_truncated': packed_feedback != feedback,
+        }
+        return PackedContext(system, packed_feedback, packed_chunks, packed_history, report)
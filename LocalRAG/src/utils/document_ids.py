@@ -0,0 +1,57 @@
+import hashlib
+
+from .embedding_cache import EmbeddingCache
+
+
+def file_hash(file_path: str) -> str:
+    """sha256 zawartości pliku."""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    """sha256 znormalizowanego tekstu fragmentu (ta sama normalizacja co w cache embeddingów)."""
+    return EmbeddingCache.text_hash(text)
+
+
+def chunk_id(namespace: str, file_sha: str, chunk_sha: str) -> str:
+    """Deterministyczne id fragmentu - ten sam plik w tej samej przestrzeni nazw daje te same id."""
+    return hashlib.sha256(f"{namespace}\0{file_sha}\0{chunk_sha}".encode("utf-8")).hexdigest()
+
+
+def tag_chunk(chunk, namespace: str, source_file: str, file_sha: str, pipeline: str):
+    """Dopisuje do metadanych fragmentu dane potrzebne do przyrostowej ingestii."""
+    chunk_sha = chunk_hash(chunk.page_content)
+    chunk.metadata.update({
+        'source_file': source_file,
+        'file_hash': file_sha,
+        'chunk_hash': chunk_sha,
+        'chunk_id': chunk_id(namespace, file_sha, chunk_sha),
+        'pipeline': pipeline,
+    })
+    return chunk
+
+
+def existing_chunk_ids(db, source_file: str, file_sha: str, pipeline: str) -> set:
+    """Id fragmentów tej wersji pliku, które są już w kolekcji (db to langchain Chroma)."""
+    results = db.get(
+        where={"$and": [{"source_file": source_file}, {"file_hash": file_sha}, {"pipeline": pipeline}]},
+        include=["metadatas"]
+    )
+    return {metadata.get('chunk_id') for metadata in results.get('metadatas') or [] if metadata}
+
+
+def delete_stale_chunks(db, source_file: str, file_sha: str, pipeline: str) -> int:
+    """Usuwa fragmenty poprzednich wersji pliku (ta sama nazwa, inna zawartość)."""
+    results = db.get(
+        where={"$and": [{"source_file": source_file}, {"file_hash": {"$ne": file_sha}}, {"pipeline": pipeline}]},
+        include=[]
+    )
+    ids = results.get('ids') or []
+    if ids:
+        db.delete(ids=ids)
+        print(f"Deleted {len(ids)} stale chunks of {source_file}")
+    return len(ids)
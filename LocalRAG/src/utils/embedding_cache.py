@@ -0,0 +1,166 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache embeddingów: klucz to (nazwa modelu, sha256 znormalizowanego tekstu).
+    Przed trwałym magazynem SQLite (wektory float32 jako BLOB) stoi LRU w pamięci.
+    """
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stored': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """sha256 tekstu po normalizacji Unicode (NFC) i białych znaków."""
+        normalized = " ".join(unicodedata.normalize("NFC", str(text)).split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: tuple, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: list) -> list:
+        """Zwraca listę wektorów (lub None dla braków) w kolejności tekstów."""
+        hashes = [self.text_hash(text) for text in texts]
+        found = {}
+        from_disk = set()
+
+        with self._lock:
+            missing = []
+            for text_hash in dict.fromkeys(hashes):
+                vector = self._memory.get((model, text_hash))
+                if vector is not None:
+                    self._memory.move_to_end((model, text_hash))
+                    found[text_hash] = vector
+                else:
+                    missing.append(text_hash)
+
+            # SQLite ma limit parametrów w zapytaniu, więc pytamy partiami
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[text_hash] = vector
+                    self._remember((model, text_hash), vector)
+                    from_disk.add(text_hash)
+
+            for text_hash in hashes:
+                if text_hash in from_disk:
+                    self._counters['disk_hits'] += 1
+                elif text_hash in found:
+                    self._counters['memory_hits'] += 1
+                else:
+                    self._counters['misses'] += 1
+
+        return [found[h].tolist() if h in found else None for h in hashes]
+
+    def put_many(self, model: str, texts: list, vectors: list):
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                text_hash = self.text_hash(text)
+                array = np.asarray(vector, dtype=np.float32)
+                self._remember((model, text_hash), array)
+                rows.append((model, text_hash, int(array.shape[0]), array.tobytes()))
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._counters['stored'] += len(rows)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['memory_hits'] + self._counters['disk_hits'] + self._counters['misses']
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            return {
+                **self._counters,
+                'hit_rate': hits / lookups if lookups else 0,
+                'memory_items': len(self._memory),
+                'path': self.path,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrapper na embeddingi LangChain (OllamaEmbeddings, OpenAIEmbeddings), który przed wywołaniem
+    modelu sprawdza EmbeddingCache. Do modelu trafiają tylko unikalne teksty, których nie ma w cache.
+    """
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+
+    def embed_documents(self, texts: list) -> list:
+        texts = [str(text) for text in texts]
+        if not texts:
+            return []
+
+        vectors = self.cache.get_many(self.model_name, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+
+        if missing:
+            embedded = self.embeddings.embed_documents(missing)
+            self.cache.put_many(self.model_name, missing, embedded)
+            by_text = dict(zip(missing, embedded))
+            vectors = [vector if vector is not None else list(by_text[text]) for text, vector in zip(texts, vectors)]
+
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+    def __getattr__(self, name):
+        # Pozostałe atrybuty (np. model) z oryginalnego obiektu embeddingów
+        if name == 'embeddings':
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Zwraca wspólny dla procesu EmbeddingCache (tworzony przy pierwszym użyciu)."""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+        return _embedding_cache
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from ..config import EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WORKERS
+
+# Wspólna pula wątków dla zapytań o embeddingi (Ollama/OpenAI)
+_executor = ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS, thread_name_prefix="embedding")
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Wrapper na embeddingi LangChain, który dzieli listę tekstów na partie po batch_size
+    i wysyła kilka partii równolegle. Kolejność wektorów odpowiada kolejności tekstów.
+    """
+    def __init__(self, embeddings: Embeddings, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+
+    def embed_documents(self, texts: list) -> list:
+        texts = list(texts)
+        if not texts:
+            return []
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return [list(vector) for vector in self.embeddings.embed_documents(batches[0])]
+
+        # executor.map zachowuje kolejność partii
+        vectors = []
+        for batch_vectors in _executor.map(self.embeddings.embed_documents, batches):
+            vectors.extend(list(vector) for vector in batch_vectors)
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        return self.embeddings.embed_query(text)
+
+    def __getattr__(self, name):
+        if name == 'embeddings':
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
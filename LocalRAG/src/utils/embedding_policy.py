@@ -0,0 +1,299 @@
+import os
+import math
+import time
+import sqlite3
+import datetime
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from ..config import EMBEDDING_PENDING_PATH, EMBEDDING_RETRIES, EMBEDDING_RETRY_BACKOFF, EMBEDDING_REPAIR_INTERVAL
+from .embedding_cache import EmbeddingCache
+
+# Cel bieżącego zapisu do Chroma (ścieżka, kolekcja, id dokumentów) - ustawiany przez
+# EmbeddingFailurePolicy.writing; poza nim (np. przy query_texts) wektory zastępcze nie są używane
+_write_target = contextvars.ContextVar('embedding_write_target', default=None)
+
+# Znane wymiary popularnych modeli - używane, gdy nie da się odpytać modelu
+KNOWN_DIMENSIONS = {
+    'nomic-embed-text': 768,
+    'mxbai-embed-large': 1024,
+    'snowflake-arctic-embed': 1024,
+    'bge-m3': 1024,
+    'all-minilm': 384,
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072,
+    'text-embedding-ada-002': 1536,
+}
+
+
+class EmbeddingFailurePolicy:
+    """
+    Polityka obsługi błędów embeddingu:
+    - ponawia zapytanie z wykładniczym backoffem,
+    - zna wymiar każdego modelu (odpytany raz i zapamiętany, także na dysku),
+    - gdy model nie odpowiada przy zapisie dokumentów (blok writing), zwraca wektory zastępcze
+      o poprawnym wymiarze, a teksty razem z miejscem zapisu (ścieżka, kolekcja, id) trafiają do kolejki,
+    - poza zapisem (zapytania) błąd jest zgłaszany dalej - stały wektor zastępczy zapytania trafiałby
+      dokładnie w dokumenty z wektorami zastępczymi,
+    - reembed_pending podmienia wektory zastępcze w zapisanych miejscach na właściwe.
+    """
+    def __init__(self, path: str = EMBEDDING_PENDING_PATH, retries: int = EMBEDDING_RETRIES,
+                 backoff: float = EMBEDDING_RETRY_BACKOFF):
+        self.path = path
+        self.retries = max(1, retries)
+        self.backoff = backoff
+        self._dimensions = {}
+        self._lock = threading.RLock()
+        self._counters = {'retries': 0, 'failures': 0, 'placeholders': 0, 'repaired': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS placeholder_ids (
+                model TEXT NOT NULL,
+                collection_path TEXT NOT NULL,
+                collection_name TEXT NOT NULL,
+                id TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                PRIMARY KEY (collection_path, collection_name, id)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS model_dimensions (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        for model, dim in self._conn.execute("SELECT model, dim FROM model_dimensions").fetchall():
+            self._dimensions[model] = dim
+
+    def _remember_dimension(self, model_name: str, dim: int):
+        with self._lock:
+            if self._dimensions.get(model_name) == dim:
+                return
+            self._dimensions[model_name] = dim
+            self._conn.execute("INSERT OR REPLACE INTO model_dimensions (model, dim) VALUES (?, ?)", (model_name, dim))
+            self._conn.commit()
+
+    def dimension(self, model_name: str, embeddings=None) -> int:
+        """Wymiar wektorów modelu: z pamięci/dysku, z jednorazowego zapytania do modelu albo z listy znanych modeli."""
+        if model_name in self._dimensions:
+            return self._dimensions[model_name]
+
+        if embeddings is not None:
+            try:
+                dim = len(embeddings.embed_query("dimension probe"))
+                self._remember_dimension(model_name, dim)
+                return dim
+            except Exception as e:
+                print(f"Could not probe embedding dimension for {model_name}: {e}")
+
+        return KNOWN_DIMENSIONS.get(model_name.split(':')[0], 768)
+
+    @staticmethod
+    def placeholder(dim: int) -> list:
+        """Stały wektor jednostkowy - w odróżnieniu od wektora zerowego nie psuje podobieństwa kosinusowego."""
+        value = 1.0 / math.sqrt(dim)
+        return [value] * dim
+
+    @contextmanager
+    def writing(self, collection_path: str, collection_name: str, ids: list):
+        """
+        Oznacza zapis dokumentów o podanych id (w kolejności dokumentów) do kolekcji - tylko wtedy
+        nieudany embedding daje wektory zastępcze, które reembed_pending później naprawi.
+        """
+        token = _write_target.set((collection_path, collection_name, list(ids)))
+        try:
+            yield
+        finally:
+            _write_target.reset(token)
+
+    def embed(self, model_name: str, embeddings, texts: list) -> list:
+        """
+        embed_documents z ponawianiem. Po ostatniej nieudanej próbie: w bloku writing zwraca wektory
+        zastępcze i kolejkuje teksty wraz z miejscem zapisu, poza nim zgłasza ostatni błąd.
+        """
+        texts = [str(text) for text in texts]
+        if not texts:
+            return []
+
+        error = None
+        for attempt in range(self.retries):
+            try:
+                vectors = embeddings.embed_documents(texts)
+                if vectors:
+                    self._remember_dimension(model_name, len(vectors[0]))
+                return vectors
+            except Exception as e:
+                error = e
+                print(f"Embedding attempt {attempt + 1}/{self.retries} for {model_name} failed: {e}")
+                if attempt + 1 < self.retries:
+                    with self._lock:
+                        self._counters['retries'] += 1
+                    time.sleep(self.backoff * (2 ** attempt))
+
+        with self._lock:
+            self._counters['failures'] += 1
+
+        target = _write_target.get()
+        if target is None or len(target[2]) != len(texts):
+            raise error
+
+        with self._lock:
+            self._counters['placeholders'] += len(texts)
+        self.defer(model_name, texts, target)
+
+        dim = self.dimension(model_name)
+        print(f"Using {len(texts)} placeholder embeddings ({dim} dims) for {model_name}, queued for re-embedding")
+        return [self.placeholder(dim) for _ in texts]
+
+    def defer(self, model_name: str, texts: list, target: tuple):
+        """Zapisuje teksty do kolejki embeddowania odroczonego razem z miejscem zapisu (ścieżka, kolekcja, id)."""
+        collection_path, collection_name, ids = target
+        now = datetime.datetime.now().isoformat()
+        hashes = [EmbeddingCache.text_hash(text) for text in texts]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pending_embeddings (model, text_hash, text, created_at) VALUES (?, ?, ?, ?)",
+                [(model_name, text_hash, text, now) for text_hash, text in zip(hashes, texts)]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO placeholder_ids (model, collection_path, collection_name, id, text_hash) VALUES (?, ?, ?, ?, ?)",
+                [(model_name, collection_path, collection_name, doc_id, text_hash) for doc_id, text_hash in zip(ids, hashes)]
+            )
+            self._conn.commit()
+
+    def pending_count(self, model_name: str = None) -> int:
+        with self._lock:
+            if model_name:
+                return self._conn.execute("SELECT COUNT(*) FROM pending_embeddings WHERE model = ?", (model_name,)).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM pending_embeddings").fetchone()[0]
+
+    def reembed_pending(self, model_name: str, embeddings, open_collection) -> int:
+        """
+        Ponownie embeddouje teksty z kolejki i podmienia wektory zastępcze w miejscach zapisanych przy
+        zapisie dokumentów. open_collection(ścieżka, nazwa) zwraca kolekcję (także dotąd nieotwartą w procesie).
+        Tekst opuszcza kolejkę dopiero, gdy wszystkie jego rekordy zostały naprawione.
+        Zwraca liczbę naprawionych rekordów.
+        """
+        with self._lock:
+            targets = self._conn.execute(
+                "SELECT collection_path, collection_name, id, text_hash FROM placeholder_ids WHERE model = ?", (model_name,)
+            ).fetchall()
+            pending = self._conn.execute(
+                "SELECT text_hash, text FROM pending_embeddings WHERE model = ?", (model_name,)
+            ).fetchall()
+        needed = {text_hash for _, _, _, text_hash in targets}
+        pending = [(text_hash, text) for text_hash, text in pending if text_hash in needed]
+        if not pending:
+            return 0
+
+        try:
+            vectors = embeddings.embed_documents([text for _, text in pending])
+        except Exception as e:
+            print(f"Re-embedding of {len(pending)} pending texts for {model_name} failed, will retry later: {e}")
+            return 0
+        by_hash = {text_hash: vector for (text_hash, _), vector in zip(pending, vectors)}
+
+        by_collection = {}
+        for collection_path, collection_name, doc_id, text_hash in targets:
+            if text_hash in by_hash:
+                by_collection.setdefault((collection_path, collection_name), []).append((doc_id, text_hash))
+
+        repaired = 0
+        for (collection_path, collection_name), rows in by_collection.items():
+            try:
+                try:
+                    collection = open_collection(collection_path, collection_name)
+                except Exception as e:
+                    if 'does not exist' not in str(e):
+                        raise
+                    # Kolekcja została usunięta - nie ma już czego naprawiać
+                    print(f"Collection {collection_path}/{collection_name} no longer exists, dropping its placeholders")
+                else:
+                    for start in range(0, len(rows), 500):
+                        batch = rows[start:start + 500]
+                        collection.update(
+                            ids=[doc_id for doc_id, _ in batch],
+                            embeddings=[by_hash[text_hash] for _, text_hash in batch]
+                        )
+                    repaired += len(rows)
+                with self._lock:
+                    self._conn.executemany(
+                        "DELETE FROM placeholder_ids WHERE collection_path = ? AND collection_name = ? AND id = ?",
+                        [(collection_path, collection_name, doc_id) for doc_id, _ in rows]
+                    )
+                    self._conn.commit()
+            except Exception as e:
+                # Rekordy i teksty zostają w kolejce - spróbujemy przy następnym przebiegu
+                print(f"Error repairing placeholder embeddings in {collection_path}/{collection_name}: {e}")
+
+        with self._lock:
+            # Z kolejki usuwamy tylko teksty, które nie mają już żadnych rekordów do naprawy
+            remaining = {row[0] for row in self._conn.execute(
+                "SELECT DISTINCT text_hash FROM placeholder_ids WHERE model = ?", (model_name,)
+            ).fetchall()}
+            self._conn.executemany(
+                "DELETE FROM pending_embeddings WHERE model = ? AND text_hash = ?",
+                [(model_name, text_hash) for text_hash in by_hash if text_hash not in remaining]
+            )
+            self._conn.commit()
+            self._counters['repaired'] += repaired
+
+        print(f"Re-embedded {len(by_hash)} pending texts, repaired {repaired} placeholder vectors for {model_name}")
+        return repaired
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                'pending': self.pending_count(),
+                'dimensions': dict(self._dimensions),
+            }
+
+
+_embedding_failure_policy = None
+_embedding_failure_policy_lock = threading.Lock()
+
+def get_embedding_failure_policy() -> EmbeddingFailurePolicy:
+    """Zwraca wspólną dla procesu EmbeddingFailurePolicy (tworzoną przy pierwszym użyciu)."""
+    global _embedding_failure_policy
+    with _embedding_failure_policy_lock:
+        if _embedding_failure_policy is None:
+            _embedding_failure_policy = EmbeddingFailurePolicy()
+        return _embedding_failure_policy
+
+
+def start_repair_worker(model_name: str, embeddings, open_collection, interval: float = EMBEDDING_REPAIR_INTERVAL):
+    """
+    Uruchamia wątek w tle, który co `interval` sekund próbuje ponownie embeddować teksty z kolejki.
+    open_collection(ścieżka, nazwa) zwraca kolekcję z rekordami do naprawy.
+    """
+    def worker():
+        while True:
+            time.sleep(interval)
+            try:
+                policy = get_embedding_failure_policy()
+                if policy.pending_count(model_name):
+                    policy.reembed_pending(model_name, embeddings, open_collection)
+            except Exception as e:
+                print(f"Error in embedding repair worker: {e}")
+
+    thread = threading.Thread(target=worker, name="embedding-repair", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,77 @@
+import threading
+
+
+class Lazy:
+    """
+    Odroczony singleton: obiekt jest tworzony przez factory dopiero przy pierwszym użyciu
+    (dostęp do atrybutu, wywołanie albo get()), a potem współdzielony.
+    Biblioteki sprawdzające typ (np. pola pydantic w llama_index) muszą dostać get(), nie proxy.
+    """
+    _instances = []
+    _instances_lock = threading.Lock()
+
+    def __init__(self, factory, name: str = None):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'lazy')
+        self._value = None
+        self._initialized = False
+        self._lock = threading.RLock()
+        with Lazy._instances_lock:
+            Lazy._instances.append(self)
+
+    def get(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._value = self._factory()
+                    self._initialized = True
+        return self._value
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def __getattr__(self, name):
+        # wywoływane tylko dla atrybutów, których nie ma sam Lazy
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __getitem__(self, key):
+        return self.get()[key]
+
+    def __call__(self, *args, **kwargs):
+        return self.get()(*args, **kwargs)
+
+    def __repr__(self):
+        state = repr(self._value) if self._initialized else 'not initialized'
+        return f"<Lazy {self._name}: {state}>"
+
+
+def resolve(value):
+    """Zwraca obiekt schowany za Lazy (albo sam obiekt, jeśli nie jest Lazy)."""
+    return value.get() if isinstance(value, Lazy) else value
+
+
+def warmup(names: list = None) -> dict:
+    """
+    Tworzy od razu wszystkie (lub wybrane po nazwie) odroczone obiekty.
+    Zwraca {nazwa: czas w sekundach albo komunikat błędu}.
+    """
+    import time
+
+    with Lazy._instances_lock:
+        instances = list(Lazy._instances)
+
+    timings = {}
+    for instance in instances:
+        if names is not None and instance._name not in names:
+            continue
+        start = time.perf_counter()
+        try:
+            instance.get()
+            timings[instance._name] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            print(f"Warmup of {instance._name} failed: {e}")
+            timings[instance._name] = f"error: {e}"
+    return timings
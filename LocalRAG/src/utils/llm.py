@@ -2,79 +2,182 @@ from llama_index.llms.ollama import Ollama
 from llama_index.llms.openai import OpenAI
 from langchain_ollama import OllamaEmbeddings
 from langchain_openai import OpenAIEmbeddings
-import requests
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from typing import ClassVar
+import threading
+import httpx
+import ollama
 
-from src.config import OPENAI_API_KEY
+from src.config import OLLAMA_BASE_URL, LLM_REQUEST_TIMEOUT, LLM_KEEP_ALIVE, LLM_MAX_CONNECTIONS, LLM_MAX_RETRIES, LLM_CACHE_ENABLED
+from .embedding_cache import CachedEmbeddings
+from .embedding_executor import BatchedEmbeddings
+from .lazy import Lazy
+from .llm_cache import get_llm_cache
+from .llm_scheduler import ScheduledLLMMixin
+from .model_catalog import model_catalog
 
-OpenAIModels: list[str] = []
-OllamaModels: list[str] = []
-isFilledOllama = False
-isFilledOpenAI = False
+
+class ScheduledOllama(ScheduledLLMMixin, Ollama):
+    scheduler_backend: ClassVar[str] = 'ollama'
+
+
+class ScheduledOpenAI(ScheduledLLMMixin, OpenAI):
+    scheduler_backend: ClassVar[str] = 'openai'
+
+
+_http_clients = {}
+_http_lock = threading.Lock()
+
+def _openai_http_client() -> httpx.Client:
+    """Wspólny klient HTTP (pula połączeń keep-alive) dla wszystkich modeli OpenAI."""
+    with _http_lock:
+        if 'openai' not in _http_clients:
+            _http_clients['openai'] = httpx.Client(
+                timeout=LLM_REQUEST_TIMEOUT,
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            )
+        return _http_clients['openai']
+
+def _ollama_client_kwargs() -> dict:
+    # Przekazywane do ollama.Client -> httpx.Client
+    return {
+        'timeout': LLM_REQUEST_TIMEOUT,
+        'limits': httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+    }
+
+def _ollama_client() -> ollama.Client:
+    """Wspólny klient Ollama (pula połączeń keep-alive) dla wszystkich modeli czatu Ollama."""
+    with _http_lock:
+        if 'ollama' not in _http_clients:
+            _http_clients['ollama'] = ollama.Client(host=OLLAMA_BASE_URL, **_ollama_client_kwargs())
+        return _http_clients['ollama']
+
+def _options_key(options: dict) -> tuple:
+    return tuple(sorted((name, repr(value)) for name, value in options.items()))
 
 
 class LLMProvider:
+    # Pula klientów: (dostawca, model, opcje) -> [instancja, isFormatted]
+    _clients = {}
+    _clients_lock = threading.Lock()
 
-    def getLLM(model: str):
+    def getLLM(model: str, **options):
         """
         Factory function to create an LLM instance based on the provided model name.
+        Instances are pooled by (provider, model, options) and shared between calls,
+        so their HTTP connections (keep-alive) are reused.
 
         Args:
             model (str): The name of the model to use.
+            **options: Extra constructor arguments (e.g. temperature); part of the pool key.
 
         Returns:
             LLM: An instance of the LLM class corresponding to the specified model.
         """
-        if not isFilledOllama:
-            LLMProvider.list_ollama_models()
-
-        if not isFilledOpenAI:
-            LLMProvider.list_openai_models()
+        # Listy modeli są w pamięci (model_catalog) - bez zapytań HTTP przy każdym wywołaniu
+        provider = model_catalog.provider_of(model)
+        if provider is None:
+            raise ValueError(f"Model '{model}' is not supported. Available models: {model_catalog.models()}")
+
+        key = (provider, model, _options_key(options))
+        client = LLMProvider._clients.get(key)
+        if client is None:
+            with LLMProvider._clients_lock:
+                client = LLMProvider._clients.get(key)
+                if client is None:
+                    client = LLMProvider._create(provider, model, options)
+                    LLMProvider._clients[key] = client
+
+        return list(client)
 
-        if model in OllamaModels or (model+':latest') in OllamaModels:
+    @staticmethod
+    def _create(provider: str, model: str, options: dict):
+        if provider == 'ollama':
             if "embed" in model:
-                return [OllamaEmbeddings(model=model), True]
+                embeddings = OllamaEmbeddings(model=model, base_url=OLLAMA_BASE_URL, client_kwargs=_ollama_client_kwargs(), **options)
+                return [CachedEmbeddings(BatchedEmbeddings(embeddings), model), True]
             else:
-                return [Ollama(model=model), True]
-        elif model in OpenAIModels:
+                # AsyncClient jest per instancja - pula httpx.AsyncClient jest związana z pętlą zdarzeń
+                return [ScheduledOllama(model=model, base_url=OLLAMA_BASE_URL, request_timeout=LLM_REQUEST_TIMEOUT,
+                                        keep_alive=LLM_KEEP_ALIVE, client=_ollama_client(),
+                                        async_client=ollama.AsyncClient(host=OLLAMA_BASE_URL, **_ollama_client_kwargs()),
+                                        **options), True]
+        else:
             if "embed" in model:
-                return [OpenAIEmbeddings(model=model), False]
+                embeddings = OpenAIEmbeddings(model=model, http_client=_openai_http_client(),
+                                              max_retries=LLM_MAX_RETRIES, **options)
+                return [CachedEmbeddings(BatchedEmbeddings(embeddings), model), False]
             else:
-                return [OpenAI(model=model), False]
-        else:
-            raise ValueError(f"Model '{model}' is not supported. Available models: {OllamaModels + OpenAIModels}")
+                return [ScheduledOpenAI(model=model, http_client=_openai_http_client(), timeout=LLM_REQUEST_TIMEOUT,
+                                        max_retries=LLM_MAX_RETRIES, **options), False]
 
     @staticmethod
-    def list_ollama_models():
-        global OllamaModels
-        global isFilledOllama
-
-        try:
-            response = requests.get("http://localhost:11434/api/tags")
-            response.raise_for_status()
-            data = response.json()
-
-            OllamaModels = [model["name"] for model in data.get("models", [])]
-        except:
-            pass
-        isFilledOllama = True
-
-        return OllamaModels
+    def pool_stats():
+        with LLMProvider._clients_lock:
+            return {
+                'clients': len(LLMProvider._clients),
+                'models': sorted({f"{provider}:{model}" for provider, model, _ in LLMProvider._clients}),
+            }
 
     @staticmethod
-    def list_openai_models(api_base="https://api.openai.com/v1"):
-        global OpenAIModels
-        global isFilledOpenAI
-
-        try:
-            response = requests.get(
-                f"{api_base}/models",
-                headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}
-            )
-            response.raise_for_status()
+    def available_models() -> list[str]:
+        """Modele Ollama i OpenAI z katalogu (odświeżanego w tle co MODEL_CATALOG_TTL)."""
+        return model_catalog.models()
 
-            OpenAIModels = [model["id"] for model in response.json().get("data", [])]
-        except:
-            pass
-        isFilledOpenAI = True
+    @staticmethod
+    def list_ollama_models():
+        return model_catalog.refresh('ollama')['ollama']
 
-        return OpenAIModels
\ No newline at end of file
+    @staticmethod
+    def list_openai_models():
+        return model_catalog.refresh('openai')['openai']
+
+
+def lazy_llm(model: str, **options) -> Lazy:
+    """
+    Model (LLM albo embeddingi) tworzony przy pierwszym użyciu zamiast przy imporcie modułu.
+    options trafiają do getLLM - np. temperature=0 dla zapytań pomocniczych, których odpowiedzi są cache'owane.
+    """
+    name = f"llm:{model}" + "".join(f",{key}={value}" for key, value in sorted(options.items()))
+    return Lazy(lambda: LLMProvider.getLLM(model, **options)[0], name)
+
+
+def _cache_key(llm, messages: list, params: dict):
+    llm = llm.get() if isinstance(llm, Lazy) else llm
+    model = getattr(llm, 'model', type(llm).__name__)
+    serialized = [(str(message.role.value if hasattr(message.role, 'value') else message.role), message.content)
+                  for message in messages]
+    return model, get_llm_cache().key(model, getattr(llm, 'temperature', None), serialized, params)
+
+def is_deterministic(llm) -> bool:
+    """Czy model ma temperaturę 0 - tylko wtedy jedna próbka odpowiedzi może zastąpić kolejne wywołania."""
+    llm = llm.get() if isinstance(llm, Lazy) else llm
+    return getattr(llm, 'temperature', None) == 0
+
+def chat_cached(llm, messages: list, use_cache: bool = True, refresh: bool = False, **params) -> ChatResponse:
+    """
+    llm.chat z cache odpowiedzi (model, temperatura, pełna lista wiadomości, parametry).
+    Cache działa tylko dla modeli z temperaturą 0 (np. lazy_llm(MODEL, temperature=0)) - przy wyższej
+    temperaturze jedna losowa odpowiedź byłaby powtarzana przez cały TTL, więc zapytanie idzie do modelu.
+    use_cache=False wyłącza cache dla danego wywołania, refresh=True pomija odczyt,
+    ale zapisuje nową odpowiedź.
+    """
+    if not (use_cache and LLM_CACHE_ENABLED and is_deterministic(llm)):
+        return llm.chat(messages=messages, **params)
+
+    model, key = _cache_key(llm, messages, params)
+    cache = get_llm_cache()
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=cached))
+
+    response = llm.chat(messages=messages, **params)
+    if response.message.content:
+        cache.put(key, model, response.message.content)
+    return response
+
+def forget_cached(llm, messages: list, **params):
+    """Usuwa odpowiedź z cache - np. gdy nie dała się sparsować i ponowienie ma zapytać model."""
+    if LLM_CACHE_ENABLED:
+        get_llm_cache().forget(_cache_key(llm, messages, params)[1])
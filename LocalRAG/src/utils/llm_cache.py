@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from ..config import LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+
+
+class LLMResponseCache:
+    """
+    Cache odpowiedzi LLM dla deterministycznych wywołań pomocniczych (tagi, streszczenia, parsowanie JSON).
+    Klucz to sha256 z (model, temperatura, pełna lista wiadomości, dodatkowe parametry),
+    wartość to tekst odpowiedzi. Wpisy starsze niż ttl są pomijane i usuwane, a powyżej
+    max_entries usuwane są najdawniej używane.
+    """
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._counters = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_accessed ON llm_responses (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, temperature, messages: list, params: dict = None) -> str:
+        payload = json.dumps({
+            'model': model,
+            'temperature': temperature,
+            'messages': messages,
+            'params': params or {},
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                self._counters['misses'] += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._counters['hits'] += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            self._counters['stored'] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def forget(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        evicted = 0
+        if self.ttl:
+            evicted += self._conn.execute(
+                "DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        if self.max_entries and count > self.max_entries:
+            evicted += self._conn.execute(
+                "DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+        self._counters['evicted'] += evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': self._counters['hits'] / lookups if lookups else 0,
+                'entries': self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0],
+                'path': self.path,
+            }
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """Zwraca wspólny dla procesu LLMResponseCache (tworzony przy pierwszym użyciu)."""
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache()
+        return _llm_cache
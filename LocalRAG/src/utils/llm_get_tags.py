@@ -1,11 +1,12 @@
 import json, re
 
-from .llm import LLMProvider
+from .llm import lazy_llm, chat_cached, forget_cached
 from ..config import MODEL
 from llama_index.core.chat_engine.types import ChatMessage
 
 # Get LLM from LLMProvider
-llm, _ = LLMProvider.getLLM(MODEL)
+# Temperatura 0 - tagi mają być powtarzalne i mogą pochodzić z cache odpowiedzi
+llm = lazy_llm(MODEL, temperature=0)
 
 def clean_json_string(text: str):
     # Usuń prefiksy Markdown / formatowania
@@ -40,12 +41,13 @@ def llmGetTags(text: str):
     """
     
     prompt_user = f"TEXT TO ANALYZE:\n{text}"
+    messages = [
+        ChatMessage(role="system", content=prompt_system),
+        ChatMessage(role="user", content=prompt_user)
+    ]
     
     try:
-        response = llm.chat(messages=[
-            ChatMessage(role="system", content=prompt_system),
-            ChatMessage(role="user", content=prompt_user)
-        ])
+        response = chat_cached(llm, messages)
         
         # Clean the string before parsing
         cleaned_response = clean_json_string(response.message.content)
@@ -55,6 +57,8 @@ def llmGetTags(text: str):
         
     except Exception as e:
         print(f"Error in llmGetTags: {e}")
+        # Niepoprawna odpowiedź nie może zostać w cache - ponowienie ma zapytać model
+        forget_cached(llm, messages)
         # Return a default structure in case of error
         return [{
             "chunk": None,
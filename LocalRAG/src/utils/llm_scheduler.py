@@ -0,0 +1,163 @@
+import time
+import itertools
+import threading
+import contextvars
+from typing import ClassVar
+from contextlib import contextmanager
+
+from ..config import LLM_SCHEDULER_LIMITS, LLM_SCHEDULER_DEFAULT_LIMIT, LLM_SCHEDULER_AGING
+
+# Priorytety zapytań do LLM - mniejsza liczba oznacza wcześniejszą obsługę
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 5
+PRIORITY_BACKGROUND = 10
+
+_priority = contextvars.ContextVar('llm_priority', default=PRIORITY_NORMAL)
+
+def current_priority() -> int:
+    return _priority.get()
+
+@contextmanager
+def llm_priority(priority: int):
+    """Ustawia priorytet wszystkich wywołań LLM w danym kontekście (wątku / żądaniu)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Waiter:
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.event = threading.Event()
+
+
+class _Backend:
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.waiters = []
+        self.granted = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class LLMScheduler:
+    """
+    Ogranicza liczbę równoczesnych wywołań LLM na backend (np. jedna lokalna instancja Ollama)
+    i wydaje wolne miejsca według priorytetu: interaktywne /chat przed ingestią w tle.
+    Przy równym priorytecie obowiązuje kolejność zgłoszeń, a czekające zapytania "starzeją się"
+    (priorytet poprawia się o 1 co aging sekund), więc praca w tle nie jest głodzona.
+    """
+    def __init__(self, limits: dict = LLM_SCHEDULER_LIMITS, default_limit: int = LLM_SCHEDULER_DEFAULT_LIMIT,
+                 aging: float = LLM_SCHEDULER_AGING):
+        self.limits = dict(limits)
+        self.default_limit = default_limit
+        self.aging = aging
+        self._backends = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _backend(self, name: str) -> _Backend:
+        backend = self._backends.get(name)
+        if backend is None:
+            backend = self._backends[name] = _Backend(self.limits.get(name, self.default_limit))
+        return backend
+
+    def _acquire(self, name: str, priority: int):
+        with self._lock:
+            backend = self._backend(name)
+            if backend.in_flight < backend.limit and not backend.waiters:
+                backend.in_flight += 1
+                backend.granted += 1
+                return
+            waiter = _Waiter(priority, next(self._seq))
+            backend.waiters.append(waiter)
+
+        waiter.event.wait()
+        waited = time.time() - waiter.enqueued_at
+        with self._lock:
+            backend.waited += 1
+            backend.total_wait += waited
+            backend.max_wait = max(backend.max_wait, waited)
+
+    def _release(self, name: str):
+        with self._lock:
+            backend = self._backend(name)
+            if not backend.waiters:
+                backend.in_flight -= 1
+                return
+            now = time.time()
+            aging = self.aging
+            waiter = min(backend.waiters, key=lambda w: (
+                w.priority - ((now - w.enqueued_at) / aging if aging else 0), w.seq
+            ))
+            backend.waiters.remove(waiter)
+            # Miejsce przechodzi bezpośrednio na czekającego - in_flight się nie zmienia
+            backend.granted += 1
+            waiter.event.set()
+
+    @contextmanager
+    def slot(self, name: str, priority: int = None):
+        """Blokuje do czasu zwolnienia miejsca na backendzie name."""
+        self._acquire(name, current_priority() if priority is None else priority)
+        try:
+            yield
+        finally:
+            self._release(name)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            result = {}
+            for name, backend in self._backends.items():
+                queued_by_priority = {}
+                for waiter in backend.waiters:
+                    queued_by_priority[waiter.priority] = queued_by_priority.get(waiter.priority, 0) + 1
+                result[name] = {
+                    'limit': backend.limit,
+                    'in_flight': backend.in_flight,
+                    'queued': len(backend.waiters),
+                    'queued_by_priority': queued_by_priority,
+                    'oldest_wait': round(max((now - w.enqueued_at for w in backend.waiters), default=0.0), 3),
+                    'granted': backend.granted,
+                    'avg_wait': round(backend.total_wait / backend.waited, 3) if backend.waited else 0,
+                    'max_wait': round(backend.max_wait, 3),
+                }
+            return result
+
+
+llm_scheduler = LLMScheduler()
+
+
+class ScheduledLLMMixin:
+    """
+    Domieszka do klas LLM z llama_index: chat/complete (także strumieniowe) przechodzą
+    przez llm_scheduler. Przy strumieniach miejsce jest zajęte do końca odczytu odpowiedzi.
+    Klasa musi być pierwsza w MRO, np. class ScheduledOllama(ScheduledLLMMixin, Ollama).
+    """
+    scheduler_backend: ClassVar[str] = 'default'
+
+    def chat(self, messages, **kwargs):
+        with llm_scheduler.slot(self.scheduler_backend):
+            return super().chat(messages, **kwargs)
+
+    def complete(self, prompt, formatted: bool = False, **kwargs):
+        with llm_scheduler.slot(self.scheduler_backend):
+            return super().complete(prompt, formatted=formatted, **kwargs)
+
+    def stream_chat(self, messages, **kwargs):
+        return self._scheduled_stream(super().stream_chat(messages, **kwargs), current_priority())
+
+    def stream_complete(self, prompt, formatted: bool = False, **kwargs):
+        return self._scheduled_stream(super().stream_complete(prompt, formatted=formatted, **kwargs), current_priority())
+
+    def _scheduled_stream(self, stream, priority: int):
+        # Generatory llama_index wysyłają zapytanie dopiero przy pierwszym odczycie;
+        # priorytet jest brany z kontekstu wywołania, nie z miejsca odczytu strumienia
+        with llm_scheduler.slot(self.scheduler_backend, priority):
+            yield from stream
@@ -1,14 +1,20 @@
 import json
 import os
 
-from .llm import LLMProvider
+from .llm import lazy_llm, chat_cached, forget_cached
 from ..config import MODEL
 from llama_index.core.chat_engine.types import ChatMessage
 
 # Get LLM from LLMProvider
-llm, _ = LLMProvider.getLLM(MODEL)
+# Temperatura 0 - streszczenia mają być powtarzalne i mogą pochodzić z cache odpowiedzi;
+# ponowienie po odrzuconej walidacji (refresh) używa domyślnej temperatury, żeby dostać inną odpowiedź
+llm = lazy_llm(MODEL, temperature=0)
+retry_llm = lazy_llm(MODEL)
 
-def llmSummary(text: str):
+def _llm(refresh: bool):
+    return retry_llm if refresh else llm
+
+def llmSummary(text: str, refresh: bool = False):
     prompt_system = """
     Your main objective is to condense the content of the document into a concise summary, capturing the main points and themes.
 
@@ -29,16 +35,17 @@ def llmSummary(text: str):
     prompt_user = f"========= summarizations ==========\n{text}"
     
     try:
-        response = llm.chat(messages=[
+        response = chat_cached(_llm(refresh), [
             ChatMessage(role="system", content=prompt_system),
             ChatMessage(role="user", content=prompt_user)
-        ])
+        ], refresh=refresh)
         return response.message.content
     except Exception as e:
         print(f"Error in llmSummary: {e}")
         return "Error generating summary"
 
-def llmSummarizeText(text: str):
+def llmSummarizeText(text: str, refresh: bool = False):
+    """refresh=True pomija odpowiedzi z cache (ponowienie po odrzuconej walidacji)."""
     prompt_system = """
     Your main objective is to condense the content of the document into a concise summary, capturing the main points and themes.
 
@@ -64,13 +71,13 @@ def llmSummarizeText(text: str):
     prompt_user = f"===== DOCUMENT ====\n{text}"
     
     try:
-        response = llm.chat(messages=[
+        response = chat_cached(_llm(refresh), [
             ChatMessage(role="system", content=prompt_system),
             ChatMessage(role="user", content=prompt_user)
-        ])
+        ], refresh=refresh)
         
         chapters = response.message.content
-        summary = llmSummary(chapters)
+        summary = llmSummary(chapters, refresh=refresh)
         
         return (chapters, summary)
         
@@ -78,7 +85,7 @@ def llmSummarizeText(text: str):
         print(f"Error in llmSummarizeText: {e}")
         return ("Error generating chapters", "Error generating summary")
 
-def llmCheckSummarizeText(texts: list[str], summaries: list[str]):
+def llmCheckSummarizeText(texts: list[str], summaries: list[str], refresh: bool = False):
     prompt_system = """
     Using only "yes" or "no" do the following instructions. Answering only "yes" and "no" and "maybe" and number is mandatory; using other words is prohibited ! Return values using json array.
     Given an original document1 and its summary1 and original document2 and its summary2 Evaluate the provided data based on the following criteria:
@@ -105,11 +112,13 @@ def llmCheckSummarizeText(texts: list[str], summaries: list[str]):
     {summaries[1]}
     """
     
+    messages = [
+        ChatMessage(role="system", content=prompt_system),
+        ChatMessage(role="user", content=prompt_user)
+    ]
+
     try:
-        response = llm.chat(messages=[
-            ChatMessage(role="system", content=prompt_system),
-            ChatMessage(role="user", content=prompt_user)
-        ])
+        response = chat_cached(llm, messages, refresh=refresh)
 
         #print("llmCheckSummarizeText: ",response.message.content)
         
@@ -123,4 +132,5 @@ def llmCheckSummarizeText(texts: list[str], summaries: list[str]):
         
     except Exception as e:
         print(f"Error in llmCheckSummarizeText: {e}")
+        forget_cached(llm, messages)
         return 'no'
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import threading
+
+import requests
+
+from ..config import OPENAI_API_KEY, OLLAMA_BASE_URL, OPENAI_API_BASE, MODEL_CATALOG_PATH, MODEL_CATALOG_TTL, MODEL_CATALOG_TIMEOUT
+
+
+def fetch_ollama_models(timeout: float, base_url: str = OLLAMA_BASE_URL) -> list[str]:
+    response = requests.get(f"{base_url}/api/tags", timeout=timeout)
+    response.raise_for_status()
+    return [model["name"] for model in response.json().get("models", [])]
+
+
+def fetch_openai_models(timeout: float, api_base: str = OPENAI_API_BASE) -> list[str]:
+    # Bez klucza API zapytanie i tak skończy się 401 - nie czekamy na nie
+    if not OPENAI_API_KEY:
+        return []
+    response = requests.get(
+        f"{api_base}/models",
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return [model["id"] for model in response.json().get("data", [])]
+
+
+class ModelCatalog:
+    """
+    Lista dostępnych modeli (Ollama, OpenAI) trzymana w pamięci.
+    - listy są odświeżane co ttl sekund: przez wątek w tle albo, gdy są przeterminowane,
+      w tle przy pierwszym odczycie - odczyt nigdy nie czeka na sieć, jeśli jest już jakaś lista,
+    - zapytania mają timeout, a błąd nie kasuje poprzedniej listy,
+    - ostatnie poprawne listy są zapisywane na dysk i wczytywane przy starcie, więc serwer
+      zna modele nawet wtedy, gdy dostawca jest chwilowo niedostępny.
+    """
+    # Nieznany model powoduje synchroniczne odświeżenie najwyżej raz na tyle sekund
+    MISS_REFRESH_INTERVAL = 30
+
+    def __init__(self, fetchers: dict = None, path: str = MODEL_CATALOG_PATH,
+                 ttl: float = MODEL_CATALOG_TTL, timeout: float = MODEL_CATALOG_TIMEOUT):
+        self.fetchers = fetchers or {
+            'ollama': fetch_ollama_models,
+            'openai': fetch_openai_models,
+        }
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._models = {provider: [] for provider in self.fetchers}
+        self._fetched_at = {provider: 0.0 for provider in self.fetchers}
+        self._errors = {}
+        self._loaded = False
+        self._refreshing = set()
+        self._lock = threading.RLock()
+        self._refresher = None
+        self._counters = {'refreshes': 0, 'failures': 0, 'miss_refreshes': 0}
+
+    def _load(self):
+        """Wczytuje ostatnie poprawne listy z dysku (raz, przy pierwszym odczycie)."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+            except Exception as e:
+                print(f"Model catalog {self.path} is unreadable: {e}")
+                return
+            for provider, entry in saved.items():
+                if provider in self._models:
+                    self._models[provider] = entry.get('models', [])
+                    # Listy z dysku są traktowane jak przeterminowane - zostaną odświeżone w tle
+                    self._fetched_at[provider] = 0.0
+
+    def _persist(self):
+        with self._lock:
+            snapshot = {
+                provider: {'models': models, 'fetched_at': self._fetched_at[provider]}
+                for provider, models in self._models.items()
+            }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, provider: str = None) -> dict:
+        """Pobiera listy modeli (wszystkich albo jednego dostawcy); przy błędzie zostaje poprzednia lista."""
+        self._load()
+        providers = [provider] if provider else list(self.fetchers)
+        changed = False
+
+        for name in providers:
+            with self._lock:
+                if name in self._refreshing:
+                    continue
+                self._refreshing.add(name)
+            try:
+                models = self.fetchers[name](self.timeout)
+                with self._lock:
+                    self._models[name] = models
+                    self._fetched_at[name] = time.time()
+                    self._errors.pop(name, None)
+                    self._counters['refreshes'] += 1
+                changed = True
+            except Exception as e:
+                print(f"Error fetching {name} models: {e}")
+                with self._lock:
+                    self._errors[name] = str(e)
+                    self._counters['failures'] += 1
+                    # Kolejna próba dopiero po ttl - bez tego każdy odczyt pytałby niedostępnego dostawcę
+                    self._fetched_at[name] = time.time()
+            finally:
+                with self._lock:
+                    self._refreshing.discard(name)
+
+        if changed:
+            try:
+                self._persist()
+            except Exception as e:
+                print(f"Error saving model catalog: {e}")
+
+        with self._lock:
+            return {name: list(self._models[name]) for name in providers}
+
+    def _ensure_fresh(self):
+        self._load()
+        now = time.time()
+        with self._lock:
+            empty = [name for name, fetched_at in self._fetched_at.items()
+                     if fetched_at == 0.0 and not self._models[name]]
+            stale = [name for name, fetched_at in self._fetched_at.items()
+                     if name not in empty and now - fetched_at > self.ttl and name not in self._refreshing]
+
+        # Nic nie wiadomo o dostawcy - pierwsze pobranie musi być synchroniczne
+        for name in empty:
+            self.refresh(name)
+        for name in stale:
+            threading.Thread(target=self.refresh, args=(name,), daemon=True, name=f"model-catalog-{name}").start()
+
+    def models(self, provider: str = None) -> list[str]:
+        self._ensure_fresh()
+        with self._lock:
+            if provider:
+                return list(self._models.get(provider, []))
+            return [model for models in self._models.values() for model in models]
+
+    def _find(self, model: str):
+        with self._lock:
+            for provider, models in self._models.items():
+                if model in models or (model + ':latest') in models:
+                    return provider
+        return None
+
+    def provider_of(self, model: str):
+        """Dostawca modelu ('ollama', 'openai') albo None; zwykle tylko odczyt z pamięci."""
+        self._ensure_fresh()
+        provider = self._find(model)
+        if provider is not None:
+            return provider
+
+        # Model mógł zostać właśnie pobrany (ollama pull) - odśwież, ale nie częściej niż co MISS_REFRESH_INTERVAL
+        with self._lock:
+            oldest = min(self._fetched_at.values(), default=0.0)
+        if time.time() - oldest > self.MISS_REFRESH_INTERVAL:
+            with self._lock:
+                self._counters['miss_refreshes'] += 1
+            self.refresh()
+            provider = self._find(model)
+        return provider
+
+    def start_refresher(self, interval: float = None):
+        """Wątek w tle odświeżający listy co interval (domyślnie ttl) sekund."""
+        interval = interval or self.ttl
+
+        def worker():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error in model catalog refresher: {e}")
+                time.sleep(interval)
+
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=worker, daemon=True, name="model-catalog")
+                self._refresher.start()
+        return self._refresher
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                **self._counters,
+                'providers': {
+                    provider: {
+                        'models': len(models),
+                        'age': round(now - self._fetched_at[provider], 1) if self._fetched_at[provider] else None,
+                        'error': self._errors.get(provider),
+                    }
+                    for provider, models in self._models.items()
+                },
+            }
+
+
+model_catalog = ModelCatalog()
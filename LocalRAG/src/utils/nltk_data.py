@@ -0,0 +1,29 @@
+import threading
+
+# Zasoby NLTK potrzebne do parsowania dokumentów: (ścieżka w nltk.data, nazwa pakietu do pobrania)
+NLTK_RESOURCES = [
+    ('tokenizers/punkt_tab', 'punkt_tab'),
+    ('taggers/averaged_perceptron_tagger_eng', 'averaged_perceptron_tagger_eng'),
+]
+
+_checked = False
+_lock = threading.Lock()
+
+def ensure_nltk_data():
+    """Pobiera brakujące zasoby NLTK; sprawdzenie wykonuje się raz na proces."""
+    global _checked
+    if _checked:
+        return
+
+    with _lock:
+        if _checked:
+            return
+
+        import nltk
+
+        for resource, package in NLTK_RESOURCES:
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                nltk.download(package)
+        _checked = True
@@ -3,17 +3,22 @@ from datetime import datetime
 
 from werkzeug.utils import secure_filename
 
+from .document_ids import file_hash
+
 TEMP_FOLDER = os.getenv('TEMP_FOLDER', './_temp')
 FILES_FOLDER = os.getenv('TEMP_FOLDER', './_files')
 
 
 def saveFile(file, data: list[str]):
-    # Save the uploaded file with a secure filename and return the file path
+    # Save the uploaded file under its content hash, so re-uploading the same file reuses it
     print("Loading file ... " + os.path.join(TEMP_FOLDER) + "/__" + "__".join(data) + "__" + secure_filename(file.filename))
     ct = datetime.now()
     ts = ct.timestamp()
-    filename = str(ts) + "__" + "__".join(data) + "__" + secure_filename(file.filename)
+    temp_path = os.path.join(TEMP_FOLDER, str(ts) + ".upload")
+    file.save(temp_path)
+
+    filename = file_hash(temp_path) + "__" + "__".join(data) + "__" + secure_filename(file.filename)
     file_path = os.path.join(TEMP_FOLDER, filename)
-    file.save(file_path)
+    os.replace(temp_path, file_path)
 
-    return file_path
\ No newline at end of file
+    return file_path
@@ -6,6 +6,8 @@ Prosty logged agent - przechwytuje output i zapisuje do pliku
 import sys
 import io
 from llama_index.core.agent.react.base import ReActAgent
+from llama_index.core.agent.react.types import ActionReasoningStep, ObservationReasoningStep, ResponseReasoningStep
+from llama_index.core.chat_engine.types import StreamingAgentChatResponse
 from llama_index.core.base.llms.types import ChatMessage, MessageRole
 from .simple_agent_logger import simple_logger
 
@@ -162,6 +164,75 @@ class SimpleLoggedAgent:
         
         return f"Potrzebuję więcej informacji aby odpowiedzieć na: {query}"
     
+    def _build_agent(self):
+        return ReActAgent.from_tools(
+            tools=self.tools,
+            llm=self.llm,
+            system_prompt=self.system_prompt,
+            max_iterations=self.max_iterations,
+            verbose=self.verbose
+        )
+
+    @staticmethod
+    def _step_event(step):
+        """Zamienia krok rozumowania ReAct na zdarzenie dla klienta."""
+        if isinstance(step, ActionReasoningStep):
+            return {'type': 'tool_start', 'thought': step.thought, 'tool': step.action, 'input': step.action_input}
+        if isinstance(step, ObservationReasoningStep):
+            return {'type': 'tool_end', 'observation': step.observation}
+        if isinstance(step, ResponseReasoningStep):
+            return {'type': 'thought', 'thought': step.thought}
+        return {'type': 'thought', 'thought': step.get_content()}
+
+    def stream_query(self, query):
+        """
+        Generator zdarzeń dla /chat/stream: kroki agenta (thought, tool_start, tool_end) zaraz po ich
+        wykonaniu, potem tokeny odpowiedzi końcowej (token) z llm.stream_chat i na koniec answer.
+        """
+        simple_logger.start_session(query)
+
+        try:
+            agent = self._build_agent()
+            task = agent.create_task(query)
+            emitted = 0
+
+            while True:
+                step_output = agent.stream_step(task.task_id)
+
+                reasoning = task.extra_state.get("current_reasoning", [])
+                for step in reasoning[emitted:]:
+                    event = self._step_event(step)
+                    simple_logger.log_step(
+                        thought=event.get('thought', ''),
+                        action=f"{event['tool']}({event['input']})" if event['type'] == 'tool_start' else '',
+                        observation=event.get('observation', '')
+                    )
+                    yield event
+                emitted = len(reasoning)
+
+                if step_output.is_last:
+                    break
+
+            output = step_output.output
+            if isinstance(output, StreamingAgentChatResponse) and not output.is_dummy_stream:
+                answer = ""
+                for token in output.response_gen:
+                    answer += token
+                    yield {'type': 'token', 'text': token}
+            else:
+                answer = str(output.response)
+                agent.finalize_response(task.task_id, step_output)
+                yield {'type': 'token', 'text': answer}
+
+            simple_logger.log_step(final_answer=answer)
+            simple_logger.end_session(answer)
+            yield {'type': 'answer', 'text': answer}
+
+        except Exception as e:
+            simple_logger.log_error(f"Błąd agenta: {str(e)}")
+            simple_logger.end_session(f"Błąd: {str(e)}")
+            yield {'type': 'error', 'error': str(e)}
+
     def query(self, query):
         """Główna metoda do zadawania pytań"""
         # Rozpocznij sesję logowania
@@ -170,13 +241,7 @@ class SimpleLoggedAgent:
         
         try:
             # Stwórz agenta
-            agent = ReActAgent.from_tools(
-                tools=self.tools,
-                llm=self.llm,
-                system_prompt=self.system_prompt,
-                max_iterations=self.max_iterations,
-                verbose=self.verbose
-            )
+            agent = self._build_agent()
             
             # Wykonaj zapytanie z przechwytywaniem
             response = self._capture_verbose_output(agent, query)
@@ -0,0 +1,56 @@
+import threading
+
+from ..config import TOKENIZER_ENCODING
+
+# Gdy tiktoken nie jest dostępny (albo nie może pobrać pliku kodowania offline),
+# liczba tokenów jest szacowana z długości tekstu
+_CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                print(f"Tokenizer '{TOKENIZER_ENCODING}' unavailable, estimating tokens from text length: {e}")
+                _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Liczba tokenów tekstu (tiktoken, TOKENIZER_ENCODING). Tokenizery modeli Ollama różnią się od
+    kodowań OpenAI, więc wynik traktujemy jako przybliżenie do budżetowania promptów.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "...") -> str:
+    """Skraca tekst do max_tokens tokenów (razem z suffix); krótsze teksty zwraca bez zmian."""
+    if not text or max_tokens is None or count_tokens(text) <= max_tokens:
+        return text or ""
+    if max_tokens <= 0:
+        return ""
+
+    budget = max(0, max_tokens - count_tokens(suffix))
+    encoding = _get_encoding()
+    if encoding is None:
+        truncated = text[:budget * _CHARS_PER_TOKEN]
+    else:
+        truncated = encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    return truncated.rstrip() + suffix
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# Magazyny SQLite tworzone przy imporcie modułów (singletony) trafiają do katalogu tymczasowego,
+# a nie do chroma/ w repozytorium - zmienne muszą być ustawione przed importem src.config
+_data_dir = tempfile.mkdtemp(prefix="localrag-tests-")
+for _name, _file in (
+    ('EMBEDDING_PENDING_PATH', 'embedding_pending.sqlite3'),
+    ('EMBEDDING_CACHE_PATH', 'embedding_cache.sqlite3'),
+    ('INGEST_JOBS_PATH', 'ingest_jobs.sqlite3'),
+    ('LLM_CACHE_PATH', 'llm_cache.sqlite3'),
+    ('BM25_INDEX_PATH', 'bm25.sqlite3'),
+    ('MODEL_CATALOG_PATH', 'model_catalog.json'),
+):
+    os.environ.setdefault(_name, os.path.join(_data_dir, _file))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,89 @@
+import chromadb
+import pytest
+from chromadb.config import Settings
+
+from src.utils.bm25_index import BM25Index, tokenize, reciprocal_rank_fusion, get_bm25_index
+from src.utils.advanced_chroma import DynamicChunkingChromaDB
+
+DOCUMENTS = {
+    'r1': "§5.2 Zakaz reklamowania innych serwerów na kanałach publicznych",
+    'r2': "Spam i flood są karane wyciszeniem",
+    'r3': "Reklama PKN-ORLEN i innych spółek w kanale #gielda jest dozwolona",
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.sqlite3"))
+    index.add('rules', list(DOCUMENTS), list(DOCUMENTS.values()))
+    return index
+
+
+@pytest.fixture
+def client(tmp_path):
+    return chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+
+
+def test_tokenize_keeps_compound_tokens_and_their_parts():
+    assert tokenize("§5.2 PKN-ORLEN") == ['5.2', '5', '2', 'pkn-orlen', 'pkn', 'orlen']
+
+
+def test_reciprocal_rank_fusion_orders_by_summed_reciprocal_ranks():
+    fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'c', 'a'], ['b']], k=60)
+
+    assert [doc_id for doc_id, _ in fused] == ['b', 'a', 'c']
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61 + 1 / 61)
+
+
+def test_reciprocal_rank_fusion_tie_keeps_earlier_ranking_first():
+    assert [doc_id for doc_id, _ in reciprocal_rank_fusion([['a', 'b'], ['b', 'a']])] == ['a', 'b']
+
+
+def test_search_finds_exact_terms(index):
+    assert index.search('rules', "5.2")[0][0] == 'r1'
+    assert index.search('rules', "orlen")[0][0] == 'r3'
+    assert index.search('rules', "nieznane słowo") == []
+
+
+def test_delete_removes_documents_from_results(index):
+    index.delete('rules', ['r3'])
+
+    assert index.count('rules') == 2
+    assert [doc_id for doc_id, _ in index.search('rules', "reklama orlen innych")] == ['r1']
+
+
+def test_add_replaces_existing_document(index):
+    index.add('rules', ['r2'], ["Nowa treść bez starych słów"])
+
+    assert index.search('rules', "spam") == []
+    assert index.search('rules', "treść")[0][0] == 'r2'
+
+
+def test_sync_rebuilds_index_when_collection_differs(tmp_path, client):
+    collection = client.create_collection("rules")
+    collection.add(ids=['r1', 'r2'], documents=[DOCUMENTS['r1'], DOCUMENTS['r2']], embeddings=[[1.0, 0.0], [0.0, 1.0]])
+    index = BM25Index(path=str(tmp_path / "stale.sqlite3"))
+    index.add('rules', list(DOCUMENTS), list(DOCUMENTS.values()))
+
+    assert index.sync('rules', collection) is True
+    assert index.count('rules') == 2
+    assert index.search('rules', "orlen") == []
+    # Raz na proces - kolejne wywołanie nie sprawdza kolekcji ponownie
+    assert index.sync('rules', collection) is False
+
+
+def test_dynamic_chunking_delete_keeps_bm25_in_sync(client):
+    # Bez modelu embeddingów: kolekcja z gotowymi wektorami podstawiona bezpośrednio
+    store = DynamicChunkingChromaDB.__new__(DynamicChunkingChromaDB)
+    store.collection = client.create_collection("chunks")
+    store.index_key = "test-dynamic-chunking/chunks"
+    store.collection.add(ids=list(DOCUMENTS), documents=list(DOCUMENTS.values()),
+                         embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+                         metadatas=[{'source': 'rules.pdf'}, {'source': 'rules.pdf'}, {'source': 'other.pdf'}])
+    get_bm25_index().add(store.index_key, list(DOCUMENTS), list(DOCUMENTS.values()))
+
+    assert store.delete(where={'source': 'rules.pdf'}) == 2
+
+    assert store.collection.count() == 1
+    assert get_bm25_index().count(store.index_key) == 1
+    assert [doc_id for doc_id, _ in get_bm25_index().search(store.index_key, "reklama innych serwerów")] == ['r3']
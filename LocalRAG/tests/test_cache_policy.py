@@ -0,0 +1,83 @@
+import pytest
+
+from src.utils import cache_policy
+from src.utils.cache_policy import BoundedTTLCache, CachePolicy
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_policy.time, 'time', clock.time)
+    return clock
+
+
+def test_bounded_cache_evicts_least_recently_used(clock):
+    cache = BoundedTTLCache(max_items=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    assert cache['a'] == 1
+    cache['c'] = 3
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_bounded_cache_entries_expire(clock):
+    cache = BoundedTTLCache(max_items=10, ttl=30)
+    cache['a'] = 1
+
+    clock.now += 30
+    assert cache['a'] == 1
+    clock.now += 1
+    assert cache.get('a', 'missing') == 'missing'
+    with pytest.raises(KeyError):
+        cache['a']
+
+
+def test_expired_entries_are_evicted():
+    policy = CachePolicy(max_entries=10, ttl=100, eviction='lru')
+    entries = [
+        ('old', {'expires_at': policy.expires_at(now=50), 'last_used': 50}),
+        ('fresh', {'expires_at': policy.expires_at(now=500), 'last_used': 500}),
+        ('legacy', {'last_used': 10}),
+    ]
+
+    assert policy.select_evictions(entries, now=200) == ['old']
+
+
+def test_lru_evicts_least_recently_used_over_limit():
+    policy = CachePolicy(max_entries=2, ttl=100, eviction='lru')
+    entries = [
+        ('a', {'last_used': 30, 'usage_count': 1}),
+        ('b', {'last_used': 10, 'usage_count': 9}),
+        ('c', {'last_used': 20, 'usage_count': 5}),
+    ]
+
+    assert policy.select_evictions(entries, now=50) == ['b']
+
+
+def test_lfu_evicts_least_frequently_used_over_limit():
+    policy = CachePolicy(max_entries=2, ttl=100, eviction='lfu')
+    entries = [
+        ('a', {'last_used': 30, 'usage_count': 1}),
+        ('b', {'last_used': 10, 'usage_count': 9}),
+        ('c', {'last_used': 20, 'usage_count': 1}),
+    ]
+
+    # Przy remisie usage_count decyduje last_used
+    assert policy.select_evictions(entries, now=50) == ['c']
+
+
+def test_unknown_eviction_strategy():
+    with pytest.raises(ValueError):
+        CachePolicy(eviction='fifo')
@@ -0,0 +1,68 @@
+import chromadb
+import pytest
+from chromadb.config import Settings
+
+from src.utils.collection_spec import CollectionSpec, DEFAULT_SPEC, COLLECTION_SPECS, spec_for_path, migrate_collection
+
+
+@pytest.fixture
+def client(tmp_path):
+    return chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+
+
+def test_replace_rejects_unknown_fields():
+    assert DEFAULT_SPEC.replace(M=32).M == 32
+    assert DEFAULT_SPEC.M == 16
+    with pytest.raises(ValueError):
+        DEFAULT_SPEC.replace(ef=10)
+
+
+def test_differences_treat_missing_space_as_l2():
+    spec = CollectionSpec(space='cosine', M=16)
+
+    assert spec.differences({})['space'] == ('l2', 'cosine')
+    assert spec.differences(spec.metadata()) == {}
+    assert spec.differences({**spec.metadata(), 'hnsw:M': 8}) == {'M': (8, 16)}
+
+
+def test_spec_for_path_uses_last_path_component():
+    assert spec_for_path('chroma/db/documents/') is COLLECTION_SPECS['documents']
+    assert spec_for_path('chroma/db/unknown') is DEFAULT_SPEC
+
+
+def test_migrate_collection_copies_records_and_keeps_name(client):
+    old = client.create_collection("rules", metadata={'owner': 'bot'})
+    ids = [f"id-{i}" for i in range(7)]
+    old.add(
+        ids=ids,
+        embeddings=[[float(i), 1.0, 0.0] for i in range(7)],
+        documents=[f"Zasada {i}" for i in range(7)],
+        metadatas=[{'index': i} for i in range(7)],
+    )
+    spec = DEFAULT_SPEC.replace(M=32, search_ef=80)
+
+    copied = migrate_collection(client, old, spec, batch_size=3)
+
+    assert copied == 7
+    assert [collection.name for collection in client.list_collections()] == ["rules"]
+    migrated = client.get_collection("rules")
+    assert migrated.metadata['owner'] == 'bot'
+    assert spec.differences(migrated.metadata) == {}
+
+    records = migrated.get(ids=ids, include=['embeddings', 'documents', 'metadatas'])
+    by_id = {
+        record_id: (list(embedding), document, metadata)
+        for record_id, embedding, document, metadata
+        in zip(records['ids'], records['embeddings'], records['documents'], records['metadatas'])
+    }
+    assert by_id["id-4"] == ([4.0, 1.0, 0.0], "Zasada 4", {'index': 4})
+    assert len(by_id) == 7
+
+
+def test_migrate_collection_replaces_leftover_temporary_collection(client):
+    client.create_collection("rules-migrating")
+    old = client.create_collection("rules")
+    old.add(ids=["a"], embeddings=[[1.0, 0.0]], documents=["Zasada"])
+
+    assert migrate_collection(client, old, DEFAULT_SPEC) == 1
+    assert [collection.name for collection in client.list_collections()] == ["rules"]
@@ -0,0 +1,66 @@
+import pytest
+
+from src.utils.context_packer import ContextPacker, MESSAGE_OVERHEAD, NO_CONTEXT_NOTE
+from src.utils.tokens import count_tokens
+
+SYSTEM = "You are a helpful assistant answering questions about the server rules."
+QUERY = "Czy można reklamować własny serwer na kanale ogólnym?"
+
+
+def prompt_tokens(packed, query: str = QUERY) -> int:
+    """Tokeny promptu w postaci wysyłanej do modelu - razem z nagłówkami sekcji i narzutem wiadomości."""
+    return sum(count_tokens(message['content']) + MESSAGE_OVERHEAD for message in packed.messages(query))
+
+
+def chunk(index: int, words: int = 120) -> str:
+    return f"Paragraf {index}. " + " ".join(f"zasada{index}_{word}" for word in range(words))
+
+
+@pytest.mark.parametrize('budget', [200, 400, 800, 1500])
+def test_packed_prompt_fits_budget(budget):
+    packer = ContextPacker(budget, min_chunk_tokens=16)
+    history = [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': chunk(100 + i, 40)} for i in range(6)]
+
+    packed = packer.pack(SYSTEM, QUERY, chunks=[chunk(i) for i in range(10)],
+                         feedback=chunk(99, 80), history=history)
+
+    assert prompt_tokens(packed) <= budget
+    assert packed.report['total'] <= budget
+
+
+def test_chunk_headers_are_counted():
+    chunks = [chunk(i, 30) for i in range(20)]
+    budget = 600
+    packed = ContextPacker(budget, feedback_share=0, history_share=0).pack(SYSTEM, QUERY, chunks=chunks)
+
+    # Bez nagłówków "Context i:" zmieściłoby się więcej chunków, a prompt przekroczyłby budżet
+    assert 0 < len(packed.chunks) < len(chunks)
+    assert prompt_tokens(packed) <= budget
+    assert packed.context_prompt().count("Context ") == len(packed.chunks)
+
+
+def test_chunks_are_kept_in_rank_order_and_last_one_truncated():
+    chunks = [chunk(i) for i in range(5)]
+    packed = ContextPacker(700, feedback_share=0, history_share=0, min_chunk_tokens=16).pack(SYSTEM, QUERY, chunks=chunks)
+
+    assert packed.chunks[:-1] == chunks[:len(packed.chunks) - 1]
+    assert packed.report['truncated_chunks'] == 1
+    assert packed.chunks[-1].endswith("...")
+
+
+def test_newest_history_is_kept():
+    history = [{'role': 'user', 'content': f"Pytanie {i}: " + chunk(i, 30)} for i in range(10)]
+    packed = ContextPacker(500, history_share=0.5).pack(SYSTEM, QUERY, history=history)
+
+    assert packed.history
+    assert packed.history == history[-len(packed.history):]
+    assert packed.report['dropped_history'] == len(history) - len(packed.history)
+    assert prompt_tokens(packed) <= 500
+
+
+def test_without_chunks_the_note_is_sent_and_counted():
+    packed = ContextPacker(300).pack(SYSTEM, QUERY, feedback=chunk(1, 200))
+
+    assert packed.context_prompt() == NO_CONTEXT_NOTE
+    assert packed.report['feedback_truncated'] is True
+    assert prompt_tokens(packed) <= 300
@@ -0,0 +1,82 @@
+import pytest
+
+from src.utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+
+class CountingEmbeddings:
+    """Deterministyczne wektory zależne od długości tekstu; zapisuje teksty wysłane do modelu."""
+    def __init__(self):
+        self.model = 'fake-embed'
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3"), max_memory_items=2)
+
+
+def test_text_hash_ignores_unicode_form_and_whitespace():
+    composed = "Zakaz reklam na kanale ogólnym"
+    decomposed = "Zakaz  reklam na kanale\nogo\u0301lnym "
+
+    assert EmbeddingCache.text_hash(composed) == EmbeddingCache.text_hash(decomposed)
+    assert EmbeddingCache.text_hash(composed) != EmbeddingCache.text_hash("Zakaz reklam")
+
+
+def test_vectors_are_cached_per_model(cache):
+    cache.put_many('nomic-embed-text', ["a", "b"], [[1.0, 2.0], [3.0, 4.0]])
+
+    assert cache.get_many('nomic-embed-text', ["b", "c", "a"]) == [[3.0, 4.0], None, [1.0, 2.0]]
+    assert cache.get_many('mxbai-embed-large', ["a"]) == [None]
+
+
+def test_vectors_survive_reopening_and_memory_eviction(cache, tmp_path):
+    cache.put_many('nomic-embed-text', ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    # W pamięci zostają tylko 2 ostatnie wektory - "a" jest czytane z SQLite
+    assert cache.get_many('nomic-embed-text', ["a", "c"]) == [[1.0], [3.0]]
+    assert (cache.stats()['memory_hits'], cache.stats()['disk_hits']) == (1, 1)
+
+    reopened = EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3"))
+    assert reopened.get_many('nomic-embed-text', ["b"]) == [[2.0]]
+    assert reopened.stats()['disk_hits'] == 1
+
+
+def test_cached_embeddings_send_only_unique_missing_texts(cache):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, 'fake-embed', cache)
+
+    first = embeddings.embed_documents(["ab", "abc", "ab"])
+    second = embeddings.embed_documents(["abc", "abcd", "ab"])
+
+    assert model.batches == [["ab", "abc"], ["abcd"]]
+    assert first == [[2.0, 1.0, 0.5], [3.0, 1.0, 0.5], [2.0, 1.0, 0.5]]
+    assert second == [[3.0, 1.0, 0.5], [4.0, 1.0, 0.5], [2.0, 1.0, 0.5]]
+
+
+def test_cached_embeddings_query_uses_cache(cache):
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, 'fake-embed', cache)
+    embeddings.embed_documents(["Czy można reklamować serwer?"])
+
+    assert embeddings.embed_query("Czy można  reklamować serwer?") == [28.0, 1.0, 0.5]
+    assert len(model.batches) == 1
+    # Atrybuty modelu są dostępne przez wrapper
+    assert embeddings.model == 'fake-embed'
+
+
+def test_failed_model_call_is_not_cached(cache):
+    class FailingEmbeddings:
+        def embed_documents(self, texts):
+            raise ConnectionError("model offline")
+
+    with pytest.raises(ConnectionError):
+        CachedEmbeddings(FailingEmbeddings(), 'fake-embed', cache).embed_documents(["a"])
+
+    assert cache.get_many('fake-embed', ["a"]) == [None]
@@ -0,0 +1,113 @@
+import chromadb
+import pytest
+from chromadb.config import Settings
+
+from src.utils.embedding_policy import EmbeddingFailurePolicy
+
+
+class FailingEmbeddings:
+    def embed_documents(self, texts):
+        raise ConnectionError("model offline")
+
+    def embed_query(self, text):
+        raise ConnectionError("model offline")
+
+
+class FakeEmbeddings:
+    """Deterministyczne wektory 3-wymiarowe zależne od długości tekstu."""
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def policy(tmp_path):
+    policy = EmbeddingFailurePolicy(path=str(tmp_path / "pending.sqlite3"), retries=1, backoff=0)
+    # Wymiar modelu znany z wcześniejszego udanego zapytania - wektory zastępcze mają 3 wymiary
+    policy.dimension('fake-embed', FakeEmbeddings())
+    return policy
+
+
+@pytest.fixture
+def client(tmp_path):
+    return chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+
+
+def write_with_placeholders(policy, client, path, name, ids, texts):
+    collection = client.get_or_create_collection(name)
+    with policy.writing(path, name, ids):
+        vectors = policy.embed('fake-embed', FailingEmbeddings(), texts)
+    collection.add(ids=ids, documents=texts, embeddings=vectors)
+    return collection
+
+
+def test_query_embedding_failure_is_raised(policy):
+    # Poza blokiem writing nie ma wektorów zastępczych - zapytanie trafiałoby w dokumenty zastępcze
+    with pytest.raises(ConnectionError):
+        policy.embed('fake-embed', FailingEmbeddings(), ["what are the rules?"])
+    assert policy.pending_count() == 0
+
+
+def test_write_failure_returns_placeholders_and_queues_texts(policy):
+    with policy.writing("db", "docs", ["a", "b"]):
+        vectors = policy.embed('nomic-embed-text', FailingEmbeddings(), ["first", "second"])
+
+    assert vectors == [EmbeddingFailurePolicy.placeholder(768)] * 2
+    assert policy.pending_count('nomic-embed-text') == 2
+
+
+def test_write_with_mismatched_ids_is_raised(policy):
+    with policy.writing("db", "docs", ["a"]):
+        with pytest.raises(ConnectionError):
+            policy.embed('fake-embed', FailingEmbeddings(), ["first", "second"])
+
+
+def test_reembed_pending_repairs_recorded_targets(policy, client):
+    collection = write_with_placeholders(policy, client, "db", "docs", ["a", "b"], ["short", "longer text"])
+
+    repaired = policy.reembed_pending('fake-embed', FakeEmbeddings(), lambda path, name: client.get_collection(name))
+
+    assert repaired == 2
+    assert policy.pending_count() == 0
+    stored = collection.get(ids=["a", "b"], include=["embeddings"])
+    vectors = dict(zip(stored['ids'], (list(vector) for vector in stored['embeddings'])))
+    assert vectors == {"a": [5.0, 1.0, 0.0], "b": [11.0, 1.0, 0.0]}
+
+
+def test_reembed_pending_keeps_texts_when_collection_cannot_be_opened(policy, client):
+    write_with_placeholders(policy, client, "db", "docs", ["a"], ["short"])
+
+    def unavailable(path, name):
+        raise RuntimeError("database is locked")
+
+    assert policy.reembed_pending('fake-embed', FakeEmbeddings(), unavailable) == 0
+    assert policy.pending_count() == 1
+
+    # Przy następnym przebiegu kolekcja jest dostępna i tekst opuszcza kolejkę
+    assert policy.reembed_pending('fake-embed', FakeEmbeddings(), lambda path, name: client.get_collection(name)) == 1
+    assert policy.pending_count() == 0
+
+
+def test_reembed_pending_drops_targets_of_deleted_collection(policy, client):
+    write_with_placeholders(policy, client, "db", "docs", ["a"], ["short"])
+    client.delete_collection("docs")
+
+    assert policy.reembed_pending('fake-embed', FakeEmbeddings(), lambda path, name: client.get_collection(name)) == 0
+    assert policy.pending_count() == 0
+
+
+def test_shared_text_leaves_queue_after_all_targets_are_repaired(policy, client):
+    write_with_placeholders(policy, client, "db", "docs", ["a"], ["same text"])
+    write_with_placeholders(policy, client, "db", "other", ["b"], ["same text"])
+
+    def only_docs(path, name):
+        if name != "docs":
+            raise RuntimeError("temporarily unavailable")
+        return client.get_collection(name)
+
+    assert policy.reembed_pending('fake-embed', FakeEmbeddings(), only_docs) == 1
+    assert policy.pending_count() == 1
+    assert policy.reembed_pending('fake-embed', FakeEmbeddings(), lambda path, name: client.get_collection(name)) == 1
+    assert policy.pending_count() == 0
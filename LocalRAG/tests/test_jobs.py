@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from src import jobs
+from src.jobs import JobStore, JobCheckpoint, IngestionJobQueue, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(path=str(tmp_path / "jobs.sqlite3"))
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = tmp_path / "rules.txt"
+    path.write_text("Regulamin serwera", encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def job_queue(store, monkeypatch):
+    job_queue = IngestionJobQueue(store)
+    # Bez wątku w tle - zadania są przetwarzane w teście przez _process
+    monkeypatch.setattr(job_queue, 'start', lambda: None)
+    return job_queue
+
+
+def fake_ingest(total: int, written: int, result=True):
+    def ingest(file_path, model, pdf_reader, namespace, source_file=None, checkpoint=None, on_progress=None):
+        class Progress:
+            def to_dict(self):
+                return {'total': total, 'written': written, 'skipped': 0, 'failed': total - written}
+        on_progress(Progress())
+        return result
+    return ingest
+
+
+def test_checkpoints_survive_reopening_the_store(store, document, tmp_path):
+    job_id = store.create(document, 'llama3.1', 'pypdf', 'rules')
+    checkpoint = JobCheckpoint(store, job_id, store.get(job_id)['file_hash'])
+    checkpoint.save_summary(0, "Rozdział 1", "Streszczenie")
+    checkpoint.save_tags(0, ["regulamin"])
+    checkpoint.save_summary(1, "Rozdział 2", "Streszczenie 2")
+    checkpoint.mark_written([0])
+
+    reopened = JobStore(path=str(tmp_path / "jobs.sqlite3"))
+    assert reopened.get_checkpoint(job_id, 0) == {
+        'chapters': "Rozdział 1", 'summary': "Streszczenie", 'tags': ["regulamin"], 'written': True,
+    }
+    assert reopened.get_checkpoint(job_id, 1)['written'] is False
+    assert reopened.get_checkpoint(job_id, 2) is None
+    assert reopened.get(job_id)['checkpoints'] == {'summarized': 2, 'tagged': 1, 'written': 1}
+
+
+def test_unfinished_jobs_are_resumed(store, document):
+    queued = store.create(document, 'llama3.1', 'pypdf', 'rules')
+    running = store.create(document, 'llama3.1', 'pypdf', 'rules')
+    done = store.create(document, 'llama3.1', 'pypdf', 'rules')
+    store.update(running, status=JOB_RUNNING)
+    store.update(done, status=JOB_DONE)
+
+    assert store.unfinished() == [queued, running]
+
+
+def test_missing_chunks_from_progress(store, document):
+    job_id = store.create(document, 'llama3.1', 'pypdf', 'rules')
+    assert store.missing_chunks(job_id) == 0
+
+    store.update(job_id, progress={'total': 10, 'written': 6, 'skipped': 2, 'failed': 2})
+    assert store.missing_chunks(job_id) == 2
+
+
+def test_job_is_done_when_every_chunk_was_written(job_queue, document, monkeypatch):
+    monkeypatch.setattr(jobs, 'ingestFile', fake_ingest(total=3, written=3))
+    job_id = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+
+    job_queue._process(job_id)
+
+    assert job_queue.get(job_id)['status'] == JOB_DONE
+
+
+def test_job_with_missing_chunks_fails_and_can_be_retried(job_queue, document, monkeypatch):
+    monkeypatch.setattr(jobs, 'ingestFile', fake_ingest(total=3, written=2))
+    job_id = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+
+    job_queue._process(job_id)
+    job = job_queue.get(job_id)
+    assert job['status'] == JOB_FAILED
+    assert job['error'] == "1 chunks were not written"
+
+    assert job_queue.retry(job_id) is True
+    assert job_queue.get(job_id)['status'] == JOB_QUEUED
+
+    monkeypatch.setattr(jobs, 'ingestFile', fake_ingest(total=3, written=3))
+    job_queue._process(job_id)
+    assert job_queue.get(job_id)['status'] == JOB_DONE
+
+
+def test_job_failed_with_message(job_queue, document, monkeypatch):
+    monkeypatch.setattr(jobs, 'ingestFile', fake_ingest(total=3, written=2, result="Partially embedded: 1 of 3 chunks failed"))
+    job_id = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+
+    job_queue._process(job_id)
+
+    job = job_queue.get(job_id)
+    assert job['status'] == JOB_FAILED
+    assert job['error'] == "Partially embedded: 1 of 3 chunks failed"
+
+
+def test_retry_only_failed_jobs(job_queue, document):
+    job_id = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+
+    assert job_queue.retry(job_id) is False
+    assert job_queue.retry("missing-job") is False
+
+
+def test_uploaded_file_is_removed_after_success(job_queue, document, monkeypatch):
+    monkeypatch.setattr(jobs, 'ingestFile', fake_ingest(total=3, written=3))
+    job_id = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+
+    job_queue._process(job_id)
+
+    assert not os.path.exists(document)
+
+
+def test_uploaded_file_is_kept_for_retry(job_queue, document, monkeypatch):
+    monkeypatch.setattr(jobs, 'ingestFile', fake_ingest(total=3, written=2))
+    job_id = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+
+    job_queue._process(job_id)
+
+    assert os.path.exists(document)
+
+
+def test_uploaded_file_shared_with_waiting_job_is_kept(job_queue, document, monkeypatch):
+    monkeypatch.setattr(jobs, 'ingestFile', fake_ingest(total=3, written=3))
+    job_id = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+    waiting = job_queue.submit(document, 'llama3.1', 'pypdf', 'rules')
+
+    job_queue._process(job_id)
+    assert os.path.exists(document)
+
+    job_queue._process(waiting)
+    assert not os.path.exists(document)
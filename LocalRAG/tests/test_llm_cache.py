@@ -0,0 +1,116 @@
+import uuid
+
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+
+from src.utils import llm_cache
+from src.utils.llm import chat_cached
+from src.utils.llm_cache import LLMResponseCache
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, 'time', clock.time)
+    return clock
+
+
+def make_cache(tmp_path, **options):
+    return LLMResponseCache(path=str(tmp_path / "llm_cache.sqlite3"), **options)
+
+
+def test_key_depends_on_model_temperature_and_messages():
+    messages = [{'role': 'user', 'content': 'Podsumuj tekst'}]
+    key = LLMResponseCache.key('llama3.1', 0, messages)
+
+    assert key == LLMResponseCache.key('llama3.1', 0, [dict(message) for message in messages])
+    assert key != LLMResponseCache.key('mistral', 0, messages)
+    assert key != LLMResponseCache.key('llama3.1', 0.7, messages)
+    assert key != LLMResponseCache.key('llama3.1', 0, messages, {'format': 'json'})
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60, max_entries=10)
+    cache.put('a', 'llama3.1', 'odpowiedź')
+
+    clock.now += 59
+    assert cache.get('a') == 'odpowiedź'
+    clock.now += 2
+    assert cache.get('a') is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=0, max_entries=2)
+    cache.put('a', 'llama3.1', 'A')
+    clock.now += 1
+    cache.put('b', 'llama3.1', 'B')
+    clock.now += 1
+    assert cache.get('a') == 'A'
+    clock.now += 1
+    cache.put('c', 'llama3.1', 'C')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    assert cache.get('c') == 'C'
+    assert cache.stats()['evicted'] == 1
+
+
+def test_forget_removes_entry(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put('a', 'llama3.1', 'A')
+    cache.forget('a')
+
+    assert cache.get('a') is None
+
+
+class CountingLLM:
+    """Model, który przy każdym wywołaniu odpowiada inaczej (jak próbkowanie z temperaturą > 0)."""
+    def __init__(self, temperature):
+        self.model = f"counting-{uuid.uuid4()}"
+        self.temperature = temperature
+        self.calls = 0
+
+    def chat(self, messages, **params):
+        self.calls += 1
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=f"sample {self.calls}"))
+
+
+MESSAGES = [ChatMessage(role=MessageRole.USER, content="Podaj tagi dla tekstu")]
+
+
+def test_chat_cached_reuses_responses_at_temperature_zero():
+    llm = CountingLLM(temperature=0)
+
+    first = chat_cached(llm, MESSAGES)
+    second = chat_cached(llm, MESSAGES)
+
+    assert llm.calls == 1
+    assert second.message.content == first.message.content == "sample 1"
+
+
+@pytest.mark.parametrize('temperature', [0.75, None])
+def test_chat_cached_bypasses_cache_for_sampling_models(temperature):
+    llm = CountingLLM(temperature=temperature)
+
+    first = chat_cached(llm, MESSAGES)
+    second = chat_cached(llm, MESSAGES)
+
+    assert llm.calls == 2
+    assert (first.message.content, second.message.content) == ("sample 1", "sample 2")
+
+
+def test_chat_cached_refresh_replaces_cached_response():
+    llm = CountingLLM(temperature=0)
+    chat_cached(llm, MESSAGES)
+
+    assert chat_cached(llm, MESSAGES, refresh=True).message.content == "sample 2"
+    assert chat_cached(llm, MESSAGES).message.content == "sample 2"
+    assert llm.calls == 2
@@ -0,0 +1,150 @@
+import time
+import threading
+
+import pytest
+
+from src.utils import llm_scheduler
+from src.utils.llm_scheduler import LLMScheduler, llm_priority, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND
+
+BACKEND = 'ollama'
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_scheduler.time, 'time', clock.time)
+    return clock
+
+
+def wait_until_queued(scheduler: LLMScheduler, count: int):
+    deadline = time.monotonic() + 5
+    while scheduler.stats()[BACKEND]['queued'] < count:
+        assert time.monotonic() < deadline, "waiter was not queued"
+        time.sleep(0.005)
+
+
+class Calls:
+    """Zgłasza wywołania czekające na zajęty backend i zapisuje kolejność, w jakiej dostały miejsce."""
+    def __init__(self, scheduler: LLMScheduler):
+        self.scheduler = scheduler
+        self.order = []
+        self.threads = []
+
+    def queue(self, name: str, priority: int):
+        def call():
+            # Priorytet ustawiony w kontekście wątku, tak jak w trasach Flask
+            with llm_priority(priority), self.scheduler.slot(BACKEND):
+                self.order.append(name)
+        thread = threading.Thread(target=call, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        wait_until_queued(self.scheduler, len(self.threads))
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(timeout=5)
+        return self.order
+
+
+def run_queued(scheduler: LLMScheduler, *waiters):
+    """Zajmuje jedyne miejsce, ustawia w kolejce waiters (nazwa, priorytet) i zwalnia miejsce."""
+    calls = Calls(scheduler)
+    with scheduler.slot(BACKEND, PRIORITY_NORMAL):
+        for name, priority in waiters:
+            calls.queue(name, priority)
+    return calls.join()
+
+
+def test_slots_are_limited_per_backend():
+    scheduler = LLMScheduler(limits={BACKEND: 2}, default_limit=1)
+
+    with scheduler.slot(BACKEND), scheduler.slot(BACKEND), scheduler.slot('other'):
+        stats = scheduler.stats()
+        assert stats[BACKEND]['in_flight'] == 2
+        assert stats['other'] == {**stats['other'], 'limit': 1, 'in_flight': 1}
+
+    assert scheduler.stats()[BACKEND]['in_flight'] == 0
+    assert scheduler.stats()[BACKEND]['granted'] == 2
+
+
+def test_higher_priority_is_served_first(clock):
+    scheduler = LLMScheduler(limits={BACKEND: 1}, aging=0)
+
+    order = run_queued(scheduler, ('background', PRIORITY_BACKGROUND), ('normal', PRIORITY_NORMAL),
+                       ('interactive', PRIORITY_INTERACTIVE))
+
+    assert order == ['interactive', 'normal', 'background']
+
+
+def test_equal_priority_keeps_submission_order(clock):
+    scheduler = LLMScheduler(limits={BACKEND: 1}, aging=0)
+
+    order = run_queued(scheduler, *[(f"call{i}", PRIORITY_NORMAL) for i in range(4)])
+
+    assert order == ['call0', 'call1', 'call2', 'call3']
+
+
+def test_explicit_priority_overrides_context(clock):
+    scheduler = LLMScheduler(limits={BACKEND: 1}, aging=0)
+    calls = Calls(scheduler)
+
+    def explicit_background():
+        with llm_priority(PRIORITY_INTERACTIVE), scheduler.slot(BACKEND, PRIORITY_BACKGROUND):
+            calls.order.append('explicit')
+
+    with scheduler.slot(BACKEND):
+        thread = threading.Thread(target=explicit_background, daemon=True)
+        thread.start()
+        wait_until_queued(scheduler, 1)
+        calls.threads.append(thread)
+        calls.queue('normal', PRIORITY_NORMAL)
+        assert scheduler.stats()[BACKEND]['queued_by_priority'] == {PRIORITY_BACKGROUND: 1, PRIORITY_NORMAL: 1}
+
+    assert calls.join() == ['normal', 'explicit']
+
+
+def test_without_aging_background_waits_behind_interactive(clock):
+    scheduler = LLMScheduler(limits={BACKEND: 1}, aging=0)
+    calls = Calls(scheduler)
+
+    with scheduler.slot(BACKEND):
+        calls.queue('background', PRIORITY_BACKGROUND)
+        clock.now += 60
+        calls.queue('interactive', PRIORITY_INTERACTIVE)
+
+    assert calls.join() == ['interactive', 'background']
+
+
+def test_aging_prevents_starvation_of_background_work(clock):
+    # Priorytet poprawia się o 1 co 2 s: po 30 s czekania tło (10 - 15) wyprzedza świeże /chat (0)
+    scheduler = LLMScheduler(limits={BACKEND: 1}, aging=2)
+    calls = Calls(scheduler)
+
+    with scheduler.slot(BACKEND):
+        calls.queue('background', PRIORITY_BACKGROUND)
+        clock.now += 30
+        calls.queue('interactive', PRIORITY_INTERACTIVE)
+        assert scheduler.stats()[BACKEND]['oldest_wait'] == 30
+
+    assert calls.join() == ['background', 'interactive']
+
+
+def test_aging_does_not_reorder_recent_waiters(clock):
+    scheduler = LLMScheduler(limits={BACKEND: 1}, aging=2)
+    calls = Calls(scheduler)
+
+    with scheduler.slot(BACKEND):
+        calls.queue('background', PRIORITY_BACKGROUND)
+        clock.now += 10
+        calls.queue('interactive', PRIORITY_INTERACTIVE)
+
+    assert calls.join() == ['interactive', 'background']
+    assert scheduler.stats()[BACKEND]['in_flight'] == 0
@@ -0,0 +1,122 @@
+import time
+import threading
+
+import pytest
+
+from src.utils import model_catalog
+from src.utils.model_catalog import ModelCatalog
+
+TTL = 300
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class Provider:
+    """Dostawca modeli podstawiany za zapytanie HTTP; release pozwala wstrzymać pobieranie."""
+    def __init__(self, *models):
+        self.models = list(models)
+        self.error = None
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, timeout):
+        assert self.release.wait(5)
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return list(self.models)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_catalog.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def ollama():
+    return Provider('llama3.1:latest', 'nomic-embed-text:latest')
+
+
+@pytest.fixture
+def catalog(tmp_path, ollama, clock):
+    return ModelCatalog({'ollama': ollama}, path=str(tmp_path / "models.json"), ttl=TTL)
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "background refresh did not finish"
+        time.sleep(0.005)
+
+
+def test_first_read_fetches_and_later_reads_use_memory(catalog, ollama, clock):
+    assert catalog.models('ollama') == ['llama3.1:latest', 'nomic-embed-text:latest']
+    clock.now += TTL - 1
+    ollama.models.append('mistral:latest')
+
+    assert catalog.models('ollama') == ['llama3.1:latest', 'nomic-embed-text:latest']
+    assert ollama.calls == 1
+
+
+def test_stale_list_is_served_while_refreshing_in_background(catalog, ollama, clock):
+    catalog.models()
+    clock.now += TTL + 1
+    ollama.models.append('mistral:latest')
+    ollama.release.clear()
+
+    # Odczyt nie czeka na wstrzymanego dostawcę - zwraca poprzednią listę
+    assert catalog.models('ollama') == ['llama3.1:latest', 'nomic-embed-text:latest']
+
+    ollama.release.set()
+    wait_for(lambda: catalog.stats()['refreshes'] == 2)
+    assert 'mistral:latest' in catalog.models('ollama')
+    assert ollama.calls == 2
+
+
+def test_failed_refresh_keeps_previous_list_until_next_ttl(catalog, ollama, clock):
+    catalog.models()
+    clock.now += TTL + 1
+    ollama.error = ConnectionError("ollama is down")
+
+    catalog.models()
+    wait_for(lambda: catalog.stats()['failures'] == 1)
+
+    assert catalog.models('ollama') == ['llama3.1:latest', 'nomic-embed-text:latest']
+    assert catalog.stats()['providers']['ollama']['error'] == "ollama is down"
+    # Kolejna próba dopiero po ttl od nieudanej
+    clock.now += TTL - 1
+    catalog.models()
+    assert ollama.calls == 2
+
+
+def test_saved_lists_are_used_when_provider_is_unavailable(catalog, ollama, tmp_path, clock):
+    catalog.models()
+    down = Provider()
+    down.error = ConnectionError("ollama is down")
+
+    restarted = ModelCatalog({'ollama': down}, path=str(tmp_path / "models.json"), ttl=TTL)
+
+    assert restarted.models('ollama') == ['llama3.1:latest', 'nomic-embed-text:latest']
+    # Lista z dysku jest przeterminowana - odświeżenie w tle
+    wait_for(lambda: restarted.stats()['failures'] == 1)
+
+
+def test_provider_of_refreshes_unknown_model_at_most_every_interval(catalog, ollama, clock):
+    assert catalog.provider_of('llama3.1') == 'ollama'
+    assert catalog.provider_of('mistral') is None
+    assert ollama.calls == 1
+
+    ollama.models.append('mistral:latest')
+    clock.now += ModelCatalog.MISS_REFRESH_INTERVAL + 1
+
+    assert catalog.provider_of('mistral') == 'ollama'
+    assert catalog.stats()['miss_refreshes'] == 1
@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+
+from src.utils import advanced_chroma
+from src.utils.advanced_chroma import RerankingChromaDB
+
+QUERY = "Czy można reklamować inne serwery?"
+
+# Podobieństwo kosinusowe do zapytania [1, 0]: 1.0, 0.8, 0.6, 0.0
+CANDIDATES = [
+    {'id': 'r1', 'text': "Zakaz reklamowania innych serwerów", 'embedding': [1.0, 0.0]},
+    {'id': 'r2', 'text': "Reklama spółek w kanale #gielda", 'embedding': [0.8, 0.6]},
+    {'id': 'r3', 'text': "Reklamy w wiadomościach prywatnych", 'embedding': [0.6, 0.8]},
+    {'id': 'r4', 'text': "Spam i flood są karane wyciszeniem", 'embedding': [0.0, 1.0]},
+]
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.documents = []
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+    def embed_documents(self, texts):
+        self.documents.extend(texts)
+        return [[0.0, 1.0] for _ in texts]
+
+
+class JudgeLLM:
+    """Odpowiada na zapytanie zbiorcze batch_reply, a na pojedyncze "1" dla tekstów z relevant."""
+    def __init__(self, batch_reply: str = None, relevant: tuple = ()):
+        self.batch_reply = batch_reply
+        self.relevant = relevant
+        self.calls = []
+
+    def chat(self, messages, **kwargs):
+        system, user = messages[0].content, messages[1].content
+        batch = system == RerankingChromaDB.batch_relevance_prompt_system
+        self.calls.append('batch' if batch else 'single')
+        if batch:
+            content = self.batch_reply
+        else:
+            content = "1" if any(text in user for text in self.relevant) else "0"
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=content))
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(advanced_chroma, 'model_embedding', embeddings)
+    monkeypatch.setattr(advanced_chroma, 'RERANK_DECISIVE_SIMILARITY', 0.95)
+    return embeddings
+
+
+def reranker(llm) -> RerankingChromaDB:
+    # Bez kolekcji Chroma - rerank_results korzysta tylko z embeddingów i LLM
+    db = RerankingChromaDB.__new__(RerankingChromaDB)
+    db.llm = llm
+    return db
+
+
+def test_ambiguous_candidates_are_judged_in_one_call(embeddings):
+    llm = JudgeLLM(batch_reply=json.dumps([{'id': 1, 'score': 0}, {'id': 2, 'score': 1}]))
+
+    reranked = reranker(llm).rerank_results(QUERY, CANDIDATES, top_k=3, llm_filter='batch')
+
+    # r1 ma decydujące podobieństwo i nie trafia do LLM; z r2 i r3 zostaje tylko r3
+    assert reranked == [CANDIDATES[0]['text'], CANDIDATES[2]['text']]
+    assert llm.calls == ['batch']
+    # Zapisane wektory kandydatów są używane ponownie
+    assert embeddings.documents == []
+
+
+def test_unreadable_batch_reply_falls_back_to_single_calls(embeddings):
+    llm = JudgeLLM(batch_reply="Both texts are relevant.", relevant=(CANDIDATES[1]['text'],))
+
+    reranked = reranker(llm).rerank_results(QUERY, CANDIDATES, top_k=3, llm_filter='batch')
+
+    assert reranked == [CANDIDATES[0]['text'], CANDIDATES[1]['text']]
+    assert llm.calls == ['batch', 'single', 'single']
+
+
+def test_texts_missing_from_batch_reply_are_judged_separately(embeddings):
+    llm = JudgeLLM(batch_reply=json.dumps([{'id': 2, 'score': 1}]), relevant=(CANDIDATES[1]['text'],))
+
+    reranked = reranker(llm).rerank_results(QUERY, CANDIDATES, top_k=3, llm_filter='batch')
+
+    assert reranked == [candidate['text'] for candidate in CANDIDATES[:3]]
+    assert llm.calls == ['batch', 'single']
+
+
+def test_parallel_mode_judges_each_ambiguous_candidate(embeddings):
+    llm = JudgeLLM(relevant=(CANDIDATES[2]['text'],))
+
+    reranked = reranker(llm).rerank_results(QUERY, CANDIDATES, top_k=3, llm_filter='parallel')
+
+    assert reranked == [CANDIDATES[0]['text'], CANDIDATES[2]['text']]
+    assert llm.calls == ['single', 'single']
+
+
+def test_decisive_similarity_skips_llm(embeddings, monkeypatch):
+    monkeypatch.setattr(advanced_chroma, 'RERANK_DECISIVE_SIMILARITY', 0.5)
+    llm = JudgeLLM()
+
+    reranked = reranker(llm).rerank_results(QUERY, CANDIDATES, top_k=3, llm_filter='batch')
+
+    assert reranked == [candidate['text'] for candidate in CANDIDATES[:3]]
+    assert llm.calls == []
+
+
+def test_filter_off_orders_plain_texts_by_similarity(embeddings):
+    llm = JudgeLLM()
+
+    reranked = reranker(llm).rerank_results(QUERY, [CANDIDATES[3]['text'], CANDIDATES[1]], top_k=5, llm_filter='off')
+
+    # Teksty bez wektora są embeddowane jednym wywołaniem
+    assert reranked == [CANDIDATES[1]['text'], CANDIDATES[3]['text']]
+    assert embeddings.documents == [CANDIDATES[3]['text']]
+    assert llm.calls == []
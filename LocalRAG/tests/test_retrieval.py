@@ -0,0 +1,106 @@
+import chromadb
+import pytest
+from chromadb.config import Settings
+
+from src.advanced_rag import RetrievalCoordinator
+from src.utils.advanced_chroma import DynamicChunkingChromaDB
+
+CHUNKS = {
+    'c1': ("Zakaz reklamowania innych serwerów", [1.0, 0.0]),
+    'c2': ("Reklama spółek PKN-ORLEN w kanale #gielda", [0.9, 0.1]),
+    'c3': ("Spam i flood są karane wyciszeniem", [0.0, 1.0]),
+    'c4': ("Zasada 7.3: boty muzyczne tylko na kanale #muzyka", [-1.0, 0.0]),
+}
+
+# Wektory wariantów zapytania zwracane przez podstawioną funkcję embeddingów
+QUERY_VECTORS = {
+    "reklama serwerów": [1.0, 0.0],
+    "spam": [0.0, 1.0],
+    "zasada 7.3": [1.0, 0.0],
+}
+
+
+class CountingEmbeddingFunction:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(list(input))
+        return [QUERY_VECTORS[text] for text in input]
+
+
+class CountingCollection:
+    """Kolekcja Chroma zliczająca zapytania collection.query."""
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        return self.collection.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+class RecordingReranker:
+    def __init__(self):
+        self.calls = []
+
+    def rerank_results(self, query, results, top_k=5):
+        self.calls.append((query, [candidate['id'] for candidate in results]))
+        return [candidate['text'] for candidate in results][:top_k]
+
+
+@pytest.fixture
+def store(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection("chunks")
+    collection.add(ids=list(CHUNKS), documents=[text for text, _ in CHUNKS.values()],
+                   embeddings=[vector for _, vector in CHUNKS.values()])
+
+    # Bez modelu embeddingów: kolekcja z gotowymi wektorami podstawiona bezpośrednio
+    store = DynamicChunkingChromaDB.__new__(DynamicChunkingChromaDB)
+    store.collection = CountingCollection(collection)
+    store.ef = CountingEmbeddingFunction()
+    # Indeks BM25 jest wspólny dla procesu - osobny klucz dla każdego testu
+    store.index_key = str(tmp_path / "chunks")
+    return store
+
+
+def test_all_variants_are_embedded_and_queried_once(store):
+    coordinator = RetrievalCoordinator(store, RecordingReranker())
+
+    candidates = coordinator.retrieve(["reklama serwerów", " spam ", "spam", ""], n_results=4)
+
+    assert store.ef.calls == [["reklama serwerów", "spam"]]
+    assert len(store.collection.queries) == 1
+    assert store.collection.queries[0]['query_embeddings'] == [[1.0, 0.0], [0.0, 1.0]]
+
+    ids = [candidate['id'] for candidate in candidates]
+    assert len(ids) == len(set(ids)) == 4
+    # Najlepsze trafienia obu wariantów są na początku listy
+    assert set(ids[:2]) == {'c1', 'c3'}
+    assert all(candidate['embedding'] is not None for candidate in candidates)
+
+
+def test_hybrid_query_adds_chunks_found_only_by_bm25(store):
+    candidates = store.hybrid_query(["zasada 7.3"], n_results=2, candidates=1, query_embeddings=[[1.0, 0.0]])
+
+    by_id = {candidate['id']: candidate for candidate in candidates}
+    assert set(by_id) == {'c1', 'c4'}
+    assert by_id['c4']['text'] == CHUNKS['c4'][0]
+    assert list(by_id['c4']['embedding']) == CHUNKS['c4'][1]
+
+
+def test_search_reranks_the_union_once_against_original_query(store):
+    reranker = RecordingReranker()
+    coordinator = RetrievalCoordinator(store, reranker)
+
+    results = coordinator.search("Czy można reklamować serwery?", ["reklama serwerów", "spam"], n_results=3, top_k=2)
+
+    assert len(reranker.calls) == 1
+    query, ids = reranker.calls[0]
+    assert query == "Czy można reklamować serwery?"
+    assert len(ids) == len(set(ids)) == 3
+    assert len(results) == 2
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from src import task_queue as task_queue_module
+from src.task_queue import TaskQueue, QueueFullError
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def queue():
+    queue = TaskQueue(max_workers=1, max_pending=1, ttl=60)
+    yield queue
+    queue._executor.shutdown(wait=True)
+
+
+def blocked(event: threading.Event, result=None):
+    def run():
+        assert event.wait(5)
+        return result
+    return run
+
+
+def test_task_result_is_available_after_wait(queue):
+    task = queue.submit('sum', sum, [1, 2, 3])
+
+    assert task.wait(5)
+    assert task.to_dict() == {**task.to_dict(), 'status': 'done', 'result': 6, 'error': None}
+    assert queue.get(task.id) is task
+
+
+def test_failed_task_keeps_error(queue):
+    def fail():
+        raise ValueError("model not found")
+
+    task = queue.submit('fail', fail)
+
+    assert task.wait(5)
+    assert (task.status, task.error) == ('failed', "model not found")
+    assert queue.stats()['failed'] == 1
+
+
+def test_full_queue_rejects_new_tasks(queue):
+    release = threading.Event()
+    running = queue.submit('running', blocked(release, 'first'))
+    pending = queue.submit('pending', blocked(release, 'second'))
+
+    # max_workers + max_pending zadań jest już aktywnych - trasa odpowiada 429
+    with pytest.raises(QueueFullError):
+        queue.submit('rejected', blocked(release))
+
+    assert queue.stats() == {'submitted': 2, 'rejected': 1, 'completed': 0, 'failed': 0,
+                             'active': 2, 'capacity': 2, 'tracked': 2}
+
+    release.set()
+    assert running.wait(5) and pending.wait(5)
+    assert (running.result, pending.result) == ('first', 'second')
+
+    # Po zwolnieniu miejsca kolejka znów przyjmuje zadania
+    assert queue.submit('after', blocked(release, 'third')).wait(5)
+    assert queue.stats()['completed'] == 3
+
+
+def test_finished_tasks_are_forgotten_after_ttl(queue, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(task_queue_module.time, 'time', clock.time)
+    old = queue.submit('old', sum, [1])
+    assert old.wait(5)
+
+    clock.now += 61
+    new = queue.submit('new', sum, [2])
+    assert new.wait(5)
+
+    assert queue.get(old.id) is None
+    assert queue.get(new.id) is new
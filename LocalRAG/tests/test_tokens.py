@@ -0,0 +1,55 @@
+import pytest
+
+from src.utils import tokens
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+TEXT = " ".join(f"Zasada {i}: zakaz spamu i reklamowania innych serwerów." for i in range(50))
+
+
+@pytest.fixture
+def estimated(monkeypatch):
+    """Liczenie bez tiktoken - szacowanie z długości tekstu."""
+    monkeypatch.setattr(tokens, '_encoding', None)
+    monkeypatch.setattr(tokens, '_encoding_loaded', True)
+
+
+def test_empty_text_has_no_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens(None) == 0
+    assert truncate_to_tokens(None, 10) == ""
+
+
+def test_count_grows_with_text():
+    assert 0 < count_tokens("Zasada 1") < count_tokens(TEXT)
+
+
+def test_estimate_rounds_up(estimated):
+    assert count_tokens("abcd") == 1
+    assert count_tokens("abcde") == 2
+
+
+def test_short_text_is_not_truncated():
+    assert truncate_to_tokens("Zasada 1", 100) == "Zasada 1"
+    assert truncate_to_tokens(TEXT, None) == TEXT
+
+
+@pytest.mark.parametrize('max_tokens', [1, 5, 20, 100])
+def test_truncated_text_fits_limit(max_tokens):
+    truncated = truncate_to_tokens(TEXT, max_tokens)
+
+    assert count_tokens(truncated) <= max_tokens
+    assert truncated.endswith("...")
+    assert TEXT.startswith(truncated[:-3])
+
+
+@pytest.mark.parametrize('max_tokens', [5, 20])
+def test_truncated_estimate_fits_limit(estimated, max_tokens):
+    truncated = truncate_to_tokens(TEXT, max_tokens, suffix=" [...]")
+
+    assert count_tokens(truncated) <= max_tokens
+    assert truncated.endswith(" [...]")
+
+
+def test_non_positive_limit_returns_empty_text():
+    assert truncate_to_tokens(TEXT, 0) == ""
+    assert truncate_to_tokens(TEXT, -3) == ""